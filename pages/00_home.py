@@ -1,97 +1,73 @@
+import functools
 import solara
-import leafmap.leafmap as leafmap
-import pandas as pd
 import plotly.graph_objects as go
+import sys
+import pathlib
+
+# 讓頁面可以 import 專案根目錄的 penghu 共用模組
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from penghu import dem, metrics, zones
+
+# 在 Solara 伺服器上加 /metrics (見 penghu/metrics.py)
+metrics.install()
 
 # ==========================================
 # 1. 資料處理區
 # ==========================================
-# 確保這是正確的 Raw 連結
-csv_url = "https://raw.githubusercontent.com/Jie-Yan094/final_Penghu_coralreef/main/penghuDTM.csv"
-fig_3d = None
-error_msg = None
-
-try:
-    print(f"正在讀取: {csv_url} ...")
-    z_data = pd.read_csv(csv_url)
-    
-    # ⚠️ 請確認你的 CSV 欄位名稱是否真的是小寫 'x', 'y' 和大寫 'VALUE'
-    # 如果是 'X', 'Y', 'GRID_CODE'，請自行修改下面這行
-    col_x = 'x'     # 或 'X'
-    col_y = 'y'     # 或 'Y'
-    col_z = 'VALUE' # 或 'GRID_CODE'
-
-    # 檢查欄位是否存在
-    if col_x in z_data.columns and col_y in z_data.columns and col_z in z_data.columns:
-        
-        # 1. 強制轉為數字
-        z_data[col_x] = pd.to_numeric(z_data[col_x], errors='coerce')
-        z_data[col_y] = pd.to_numeric(z_data[col_y], errors='coerce')
-        z_data[col_z] = pd.to_numeric(z_data[col_z], errors='coerce')
+# penghuDTM.csv 只在第一次轉成 .npy 網格與多解析度金字塔 (見 penghu/dem.py)，
+# 之後啟動直接 memory map 載入；圖表依「細緻度」的頂點預算與範圍挑選金字塔層級
+dem_detail = solara.reactive("中")
+dem_region = solara.reactive("全區")
+
+
+@functools.lru_cache(maxsize=16)
+@metrics.timed("plotly_figure", page="00_home")
+def build_dem_figure(detail, region):
+    """同樣的 (細緻度, 範圍) 所有 session 共用一張圖 (失敗不會被快取，下次重試)"""
+    grid = dem.load()
+    x_data, y_data, z_data_matrix, factor = grid.view(dem.DETAIL_BUDGETS[detail], dem.REGIONS[region])
+    print(f"矩陣形狀: {z_data_matrix.shape} (1/{factor} 解析度)")
+
+    # 建立圖表
+    fig_3d = go.Figure(data=[
+        go.Surface(
+            x=x_data,
+            y=y_data,
+            z=z_data_matrix,
+            colorscale="Earth", # 推薦 Earth 配色，比較像地形
+            colorbar=dict(title="高程 (m)"),
+            connectgaps=True    # 讓破洞連起來
+        )
+    ])
+
+    # 調整外觀與比例
+    fig_3d.update_layout(
+        title="澎湖地形 DEM 3D 模型" if region == "全區" else f"澎湖地形 DEM 3D 模型 ({region})",
+        autosize=True,
+        margin=dict(l=0, r=0, b=0, t=50),
+        scene=dict(
+            xaxis_title='經度',
+            yaxis_title='緯度',
+            zaxis_title='高程',
+            # 📷 設定相機視角
+            camera=dict(eye=dict(x=1.5, y=1.5, z=0.5)),
+            # 📐 關鍵修正：壓縮 Z 軸比例
+            aspectmode='manual',
+            aspectratio=dict(x=1, y=1, z=0.1) # 改成 0.1 避免變成針山
+        )
+    )
+    print("✅ 3D 圖表建立成功！")
+    return fig_3d
 
-        # 2. 移除髒資料並排序
-        z_data = z_data.dropna()
-        z_data = z_data.sort_values(by=[col_y, col_x])
 
-        # 3. 轉換為矩陣 (Pivot)
-        z_matrix = z_data.pivot(index=col_y, columns=col_x, values=col_z)
-        
-        # 4. 填補空洞 (優化視覺)
-        # 改用「最小值」填補，而不是 0，這樣海底看起來比較自然
-        min_val = z_matrix.min().min()
-        z_matrix = z_matrix.fillna(min_val)
-
-        # 5. 降低解析度 (Downsample) - 每 5 點取 1 點
-        step = 5 
-        z_matrix_small = z_matrix.iloc[::step, ::step]
-        
-        print(f"矩陣形狀: {z_matrix_small.shape}")
-
-        if z_matrix_small.size == 0:
-            raise ValueError("矩陣為空，可能是因為座標無法對齊")
-
-        # 準備繪圖數據
-        x_data = z_matrix_small.columns
-        y_data = z_matrix_small.index
-        z_data_matrix = z_matrix_small.values
-
-        # 6. 建立圖表
-        fig_3d = go.Figure(data=[
-            go.Surface(
-                x=x_data,
-                y=y_data,
-                z=z_data_matrix,
-                colorscale="Earth", # 推薦 Earth 配色，比較像地形
-                colorbar=dict(title="高程 (m)"),
-                connectgaps=True    # 讓破洞連起來
-            )
-        ])
-
-        # 7. 調整外觀與比例
-        fig_3d.update_layout(
-            title="澎湖地形 DEM 3D 模型",
-            autosize=True,
-            margin=dict(l=0, r=0, b=0, t=50),
-            scene=dict(
-                xaxis_title='經度',
-                yaxis_title='緯度',
-                zaxis_title='高程',
-                # 📷 設定相機視角
-                camera=dict(eye=dict(x=1.5, y=1.5, z=0.5)),
-                # 📐 關鍵修正：壓縮 Z 軸比例
-                aspectmode='manual',
-                aspectratio=dict(x=1, y=1, z=0.1) # 改成 0.1 避免變成針山
-            )
-        )
-        print("✅ 3D 圖表建立成功！")
-        
-    else:
-        error_msg = f"❌ 欄位名稱錯誤！CSV 內的欄位是: {list(z_data.columns)}"
+def dem_figure(detail, region):
+    """回傳 (fig_3d, error_msg)"""
+    try:
+        return build_dem_figure(detail, region), None
+    except Exception as e:
+        error_msg = f"❌ 資料讀取發生錯誤: {e}"
         print(error_msg)
-
-except Exception as e:
-    error_msg = f"❌ 資料讀取發生錯誤: {e}"
-    print(error_msg)
+        return None, error_msg
 
 
 # ==========================================
@@ -119,9 +95,11 @@ def Page():
         # --- 地圖區塊 ---
         solara.Markdown("### 1. 研究區域概覽")
         with solara.Column(style={"height": "600px", "width": "90%", "max-width": "1000px"}):
+            # leafmap 很重，第一次顯示時才 import
+            import leafmap.leafmap as leafmap
             m = leafmap.Map(center=[23.52, 119.54], zoom=11, google_map="HYBRID")
-            bounds = [119.2741441721767, 23.169481136848866, 119.81144310766382, 23.87924197009108]
-            m.add_bbox(bounds, color="red", weight=3, opacity=0.8, fill=False)
+            # 研究範圍見 data/zones.geojson (penghu/zones.py)
+            m.add_geojson(zones.geojson(zones.ROI_KIND, 11), layer_name="研究範圍", style=zones.STYLES[zones.ROI_KIND])
             solara.display(m)
 
         solara.Markdown("---")
@@ -137,6 +115,11 @@ def Page():
                         * 復育區: 忘憂島等地設有珊瑚復育區，透過旅遊結合復育，種植幼小珊瑚，監控生長. 
                         """)
 
+        with solara.Row(justify="center"):
+            solara.ToggleButtonsSingle(value=dem_detail, values=list(dem.DETAIL_BUDGETS))
+            solara.ToggleButtonsSingle(value=dem_region, values=list(dem.REGIONS))
+
+        fig_3d, error_msg = dem_figure(dem_detail.value, dem_region.value)
         with solara.Column(style={"width": "90%", "max-width": "1000px", "height": "700px"}):
             if fig_3d:
                 solara.FigurePlotly(fig_3d)
@@ -1,55 +1,30 @@
 import solara
-import geemap.foliumap as geemap
-import ee
-import os
-import json
-import tempfile
-import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from google.oauth2.service_account import Credentials
+import sys
+import pathlib
+
+# 讓頁面可以 import 專案根目錄的 penghu 共用模組
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from penghu import metrics, series, session, stats, timeseries, warm, zones
+from penghu.asyncmap import AsyncMap
+from penghu.config import CLASS_LEGEND, ROI_CENTER
+from penghu.lazy import LazyModule
+
+# ee / geemap / ipyleaflet 等重量級套件在第一次畫地圖時才載入 (伺服器啟動時不 import)
+maps = LazyModule("penghu.maps")
+
+# 在 Solara 伺服器上加 /metrics (見 penghu/metrics.py)
+metrics.install()
 
 # ==========================================
-# 0. GEE 驗證與初始化
+# 0. GEE 驗證與初始化 (見 penghu/session.py)
 # ==========================================
-ee_initialized = False
-try:
-    key_content = os.environ.get('EARTHENGINE_TOKEN')
-    if key_content and key_content.strip():
-        try:
-            clean_content = key_content.replace("'", '"')
-            service_account_info = json.loads(clean_content)
-            my_project_id = service_account_info.get("project_id")
-            creds = Credentials.from_service_account_info(
-                service_account_info,
-                scopes=['https://www.googleapis.com/auth/earthengine']
-            )
-            ee.Initialize(credentials=creds, project=my_project_id)
-            print(f"✅ 雲端環境：GEE 驗證成功！(Project: {my_project_id})")
-            ee_initialized = True
-        except Exception as e:
-            print(f"⚠️ Token 解析失敗: {e}，嘗試本機驗證...")
-            try:
-                ee.Initialize()
-                ee_initialized = True
-            except:
-                pass
-    else:
-        print("⚠️ 無 Token，嘗試本機驗證...")
-        try:
-            ee.Initialize()
-            ee_initialized = True
-        except:
-            pass
-except Exception as e:
-    print(f"⚠️ GEE 初始化遭遇問題 ({e})")
+# 頁面第一次顯示時才在背景驗證 (import 頁面不連網)；地圖組件需要時才等待結果
 
 # ==========================================
 # 1. 全域設定與資料準備
 # ==========================================
-ROI_RECT = ee.Geometry.Rectangle([119.2741, 23.1695, 119.8114, 23.8792])
-ROI_CENTER = [23.5, 119.5]
-
 # Reactive 變數
 sst_year = solara.reactive(2024)
 sst_type = solara.reactive("夏季均溫")
@@ -58,296 +33,191 @@ selected_island = solara.reactive("七美嶼")
 
 # --- 全區總表 ---
 years_list = [2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025]
+# GEE 匯出的數值；有 penghu/series.py 的歷年序列時改用序列
 sst_values = [28.16, 27.75, 28.62, 28.37, 28.29, 28.02, 28.95, 28.43]
-# 這裡對應 ACA Class 15 (Coral/Algae)
+ndci_values = [-0.063422, 0.041270, 0.041549, 0.041954, 0.093461, 0.107500, 0.108534, 0.066040]
+# 這裡對應 ACA Class 15 (Coral/Algae)；GEE 匯出的數值，有本機分類結果時改用 penghu/stats.py 的統計
 coral_algae_values = [6146.81,7185.07 , 741.91, 793.3,1043.67, 2006.07, 2367.72, 9170.3]
+CORAL = "珊瑚/藻類"
 
-df_mixed = pd.DataFrame({
-    'Year': years_list, 'SST_Summer': sst_values,
-    'Coral_Algae': coral_algae_values
-})
-ndci_data = {'Year': years_list, 'NDCI_Mean': [-0.063422, 0.041270, 0.041549, 0.041954, 0.093461, 0.107500, 0.108534, 0.066040]}
-df_ndci = pd.DataFrame(ndci_data)
 
 # ==============================================================================
-# 📊 真實數據注入區
+# 📊 真實數據注入區 (GEE 匯出的各警戒區面積 (m²)，年份同 years_list；有本機分類結果時改用分區統計)
 # ==============================================================================
-island_data = {
-    '七美嶼': pd.DataFrame({
-        'Year': [ 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025],
-        'Hard_Coral': [ 39278.9, 16399.05, 12258.98, 12282.06, 11824.55, 17199.29, 15003.7, 14271.65]
-    }),
-    '東吉嶼': pd.DataFrame({
-        'Year': [2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025],
-        'Hard_Coral': [1737.59, 3718.63, 1280.33, 731.61, 1188.87, 1005.98, 1097.42, 1097.42]
-    }),
-    '西吉嶼': pd.DataFrame({
-        'Year': [ 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025],
-        'Hard_Coral': [ 2012.05, 457.28, 1463.3, 1188.94, 914.57, 457.28, 365.83, 640.19]
-    }),
-    '東嶼坪': pd.DataFrame({
-        'Year': [ 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025],
-        'Hard_Coral': [2834.94, 1188.84, 1371.73, 1005.94, 1920.44, 2194.79, 914.5, 1097.4]
-    }),
-    '西嶼坪': pd.DataFrame({
-        'Year': [ 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025],
-        'Hard_Coral': [ 0, 0, 0, 0, 0, 0, 0, 182.89]
-    }),
+island_fallback = {
+    '七美嶼': [39278.9, 16399.05, 12258.98, 12282.06, 11824.55, 17199.29, 15003.7, 14271.65],
+    '東吉嶼': [1737.59, 3718.63, 1280.33, 731.61, 1188.87, 1005.98, 1097.42, 1097.42],
+    '西吉嶼': [2012.05, 457.28, 1463.3, 1188.94, 914.57, 457.28, 365.83, 640.19],
+    '東嶼坪': [2834.94, 1188.84, 1371.73, 1005.94, 1920.44, 2194.79, 914.5, 1097.4],
+    '西嶼坪': [0, 0, 0, 0, 0, 0, 0, 182.89],
 }
-island_names = list(island_data.keys())
+# 海星地圖產生前的底圖與圖例 (與 maps.starfish_map_html 相同)
+STARFISH_CENTER = [23.25, 119.55]
+STARFISH_LEGEND = {"海星警戒區": "#FF0000", "珊瑚/藻類 (食物來源)": "#FF6161"}
+# 海溫切換鈕 -> 統計 / 歷年序列的季節；本頁沒有平滑滑桿，面積統計固定用 STATS_RADIUS
+SST_PERIODS = {"夏季均溫": "夏季平均", "全年平均": "全年平均"}
+STATS_RADIUS = 30
+# 上面的匯出數值是「夏季平均」、半徑 30 m 的結果，只在這組參數下拿來補缺
+FALLBACK_PERIOD, FALLBACK_RADIUS = "夏季平均", 30
+
+
+def load_store(period=FALLBACK_PERIOD, radius=STATS_RADIUS):
+    """
+    海溫 / NDCI (全區) + 全區與各警戒區的珊瑚/藻類面積 (m²)，全部放在同一個 SeriesStore (見 penghu/timeseries.py)；
+    本機統計 / 歷年序列年份齊全的序列用計算結果，否則用上面的匯出數值 (同一組參數時)
+    """
+    store = timeseries.load(years_list, period, radius)
+    if (period, radius) != (FALLBACK_PERIOD, FALLBACK_RADIUS):
+        return store
+    total = timeseries.TOTAL_ZONE
+    fallback = {
+        ("sst", total, timeseries.ALL_CLASS): sst_values,
+        ("ndci", total, timeseries.ALL_CLASS): ndci_values,
+        ("area_m2", total, CORAL): coral_algae_values,
+    }
+    fallback.update({("area_m2", name, CORAL): values for name, values in island_fallback.items()})
+    return store.fill(timeseries.SeriesStore.from_series(years_list, fallback))
+
+
+def load_sst_store(period):
+    """
+    海溫 vs 珊瑚/藻類面積圖用的 (SeriesStore, 缺少的序列名稱)：
+    選到的季節還沒有完整的海溫 / 面積序列時，改用匯出數值那一組 (夏季平均、半徑 30 m)
+    """
+    store = load_store(period)
+    missing = [name for name, spec in (("海溫", ('sst',)), ("珊瑚/藻類面積", ('area_m2', timeseries.TOTAL_ZONE, CORAL)))
+               if not store.covers(*spec)]
+    return (load_store(), missing) if missing else (store, missing)
+
+
+def sst_request(year, period_type):
+    """(快取 key, HTML 運算, 圖磚網址運算)：SSTSplitMap 與預先產生相鄰年份共用"""
+    return (("sst", year, period_type),
+            lambda: maps.sst_map_html(year, period_type), lambda: maps.sst_tiles(year, period_type))
+
+
+def ndci_request(year):
+    return ("ndci", year), lambda: maps.ndci_map_html(year), lambda: maps.ndci_tiles(year)
+
+
+def neighbour_years(year):
+    return [y for y in (year - 1, year + 1) if y in years_list]
 
 # ==========================================
-# 2. 共用函式
-# ==========================================
-def save_map_to_html(m):
-    try:
-        with tempfile.NamedTemporaryFile(suffix='.html', delete=False) as tmp:
-            temp_path = tmp.name
-        m.to_html(filename=temp_path)
-        with open(temp_path, 'r', encoding='utf-8') as f:
-            html_content = f.read()
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        return html_content
-    except Exception as e:
-        return f"<div style='color:red'>地圖錯誤: {str(e)}</div>"
-
-def get_benthic_layer(year):
-    start_date, end_date = f'{year}-06-01', f'{year}-09-30'
-    if year >= 2019:
-        s2_col = "COPERNICUS/S2_SR_HARMONIZED"
-    else:
-        s2_col = "COPERNICUS/S2_HARMONIZED"
-
-    try:
-        depth_raw = ee.Image('projects/ee-s1243041/assets/bathymetry_0')
-        actual_band = depth_raw.bandNames().get(0)
-        depth_img = depth_raw.select([actual_band]).rename('depth').clip(ROI_RECT)
-        depth_mask = depth_img.lt(30).And(depth_img.gt(0))
-    except:
-        depth_mask = ee.Image(1).clip(ROI_RECT)
-
-    img_train = (ee.ImageCollection(s2_col)
-                    .filterBounds(ROI_RECT).filterDate('2018-01-01', '2018-12-31')
-                    .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20))
-                    .median().clip(ROI_RECT).select(['B2','B3','B4','B8']))
-    
-    mask_train = img_train.normalizedDifference(['B3', 'B8']).gt(0.1).And(depth_mask).focal_mode(radius=10, kernelType='circle', units='meters')
-    
-    # ACA Remap (Class 15 -> 3 "Coral/Algae")
-    label_img = ee.Image('ACA/reef_habitat/v2_0').clip(ROI_RECT).remap(
-        [0, 11, 12, 13, 14, 15, 18], 
-        [0,  1,  2,  3,  4,  5,  6], 
-        0
-    ).rename('benthic').toByte()
-    
-    sample = img_train.updateMask(mask_train).addBands(label_img).stratifiedSample(
-        numPoints=1000, classBand='benthic', region=ROI_RECT, scale=30, tileScale=8, geometries=False
-    )
-    classifier = ee.Classifier.smileRandomForest(50).train(sample, 'benthic', img_train.bandNames())
-
-    target_img = (ee.ImageCollection(s2_col)
-                  .filterBounds(ROI_RECT).filterDate(start_date, end_date)
-                  .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20))
-                  .median().clip(ROI_RECT).select(['B2','B3','B4','B8']))
-    
-    target_mask = target_img.normalizedDifference(['B3', 'B8']).gt(0.1).And(depth_mask)
-    classified = target_img.updateMask(target_mask).classify(classifier).focal_mode(radius=30, kernelType='circle', units='meters')
-    
-    # 顏色：3號 (Coral/Algae) 為藍綠色
-    vis = {'min': 0, 'max': 6, 
-           'palette' : [
-                '000000', # 0
-                '#ffffbe', 
-                '#e0d05e', 
-                '#b19c3a', 
-                '#668438',
-                '#ff6161', 
-                '#9bcc4f'  
-            ]
-           }
-    return geemap.ee_tile_layer(classified, vis, f'{year} 棲地分類')
-
-
-# ==========================================
-# 3. 組件：SST vs Benthic Split Map
+# 2. 組件：SST vs Benthic Split Map
 # ==========================================
 @solara.component
 def SSTSplitMap(year, period_type):
-    def get_map_html():
-        m = geemap.Map(center=ROI_CENTER, zoom=10)
-        if not ee_initialized: return save_map_to_html(m)
-
-        def get_sst_image(y):
-            start, end = (f'{y}-06-01', f'{y}-09-30') if period_type == "夏季均溫" else (f'{y}-01-01', f'{y}-12-31')
-            if y < 2018:
-                col = ee.ImageCollection("NASA/OCEANDATA/MODIS-Aqua/L3SMI").select('sst')
-                img = col.filterBounds(ROI_RECT).filterDate(start, end).median().clip(ROI_RECT)
-            else:
-                col = ee.ImageCollection('JAXA/GCOM-C/L3/OCEAN/SST/V3').filter(ee.Filter.eq('SATELLITE_DIRECTION', 'D'))
-                img = col.filterBounds(ROI_RECT).filterDate(start, end).median().clip(ROI_RECT).select('SST_AVE').multiply(0.0012).add(-10)
-            return img
-
-        try:
-            sst_img = get_sst_image(year)
-            sst_vis = {"min": 25, "max": 33, "palette": ['000000', '005aff', '43c8c8', 'fff700', 'ff0000']}
-            left_layer = geemap.ee_tile_layer(sst_img, sst_vis, f'{year} 海溫')
-            right_layer = get_benthic_layer(year)
-            m.split_map(left_layer, right_layer)
-            m.add_colorbar(sst_vis, label="海面溫度 (°C)", layer_name="SST")
-            # [修正] 正名為「珊瑚/藻類」
-            m.add_legend(title="棲地類別", 
-                         labels=["沙地", "碎石", "岩石", "海草床", "珊瑚/藻類", "微藻墊"], 
-                         colors=['#ffffbe', '#e0d05e', '#b19c3a', '#668438', '#ff6161', '#9bcc4f'])
-        except Exception as e:
-            return f"<div>SST 地圖載入失敗: {e}</div>"
-        return save_map_to_html(m)
-
-    map_html = solara.use_memo(get_map_html, dependencies=[year, period_type])
-    return solara.HTML(tag="iframe", attributes={"srcDoc": map_html, "width": "100%", "height": "500px", "style": "border:none;"})
+    # 地圖內容見 penghu/maps.py (左：海溫，右：該年棲地分類，與 NDCI 地圖共用同一年的分類)。
+    # 背景產生，先顯示底圖與圖例；滑桿停住後才送出請求，完成後預先產生前後一年
+    AsyncMap(*sst_request(year, period_type),
+             center=ROI_CENTER, zoom=10, height="500px", legend=CLASS_LEGEND, split=True,
+             error_text="SST 地圖載入失敗: {error}",
+             neighbours=[sst_request(y, period_type) for y in neighbour_years(year)])
 
 @solara.component
-def SSTCoralChart():
+def SSTCoralChart(period_type):
+    period = SST_PERIODS[period_type]
+    store, missing = solara.use_memo(lambda: load_sst_store(period), dependencies=[period])
+    if missing:
+        period_type = "夏季均溫"
     with solara.Card(f"📊 關聯分析：海溫 vs 珊瑚/藻類面積"):
-        fig = go.Figure()
-        # [修正] 正名為「珊瑚/藻類」
-        fig.add_trace(go.Bar(x=df_mixed['Year'], y=coral_algae_values, name='珊瑚/藻類', marker_color='rgba(0, 206, 209, 0.7)', yaxis='y2'))
-        fig.add_trace(go.Scatter(x=df_mixed['Year'], y=df_mixed['SST_Summer'], name='夏季均溫', mode='lines+markers', line=dict(color='#e74c3c', width=4)))
-        fig.update_layout(title='海溫 vs 珊瑚/藻類面積趨勢', xaxis=dict(title='年份'), yaxis=dict(title='海溫 (°C)', side='left'), yaxis2=dict(title='面積 (m²)', overlaying='y', side='right', showgrid=False), legend=dict(orientation="h", y=-0.2), height=400, margin=dict(l=40, r=40, t=40, b=40))
+        if missing:
+            commands = []
+            if "海溫" in missing:
+                commands.append("python -m penghu.series --metrics sst")
+            if "珊瑚/藻類面積" in missing:
+                commands.append(f"python -m penghu.stats --period {period} --radius {STATS_RADIUS} --classify")
+            solara.Warning(f"{period}還沒有完整的{'、'.join(missing)}序列，以下為{FALLBACK_PERIOD}、平滑半徑 "
+                           f"{FALLBACK_RADIUS} m 的 GEE 匯出數值；請先執行 {' 與 '.join(commands)}")
+        with metrics.span("plotly_figure", page="02_crisis", chart="sst_coral"):
+            fig = go.Figure()
+            # [修正] 正名為「珊瑚/藻類」
+            fig.add_trace(go.Bar(x=store.years, y=store.series('area_m2', class_=CORAL), name='珊瑚/藻類', marker_color='rgba(0, 206, 209, 0.7)', yaxis='y2'))
+            fig.add_trace(go.Scatter(x=store.years, y=store.series('sst'), name=period_type, mode='lines+markers', line=dict(color='#e74c3c', width=4)))
+            fig.update_layout(title=f'海溫 ({period_type}) vs 珊瑚/藻類面積趨勢', xaxis=dict(title='年份'), yaxis=dict(title='海溫 (°C)', side='left'), yaxis2=dict(title='面積 (m²)', overlaying='y', side='right', showgrid=False), legend=dict(orientation="h", y=-0.2), height=400, margin=dict(l=40, r=40, t=40, b=40))
         solara.FigurePlotly(fig)
 
 # ==========================================
-# 4. 組件：NDCI vs Benthic Split Map
+# 3. 組件：NDCI vs Benthic Split Map
 # ==========================================
 @solara.component
 def NDCISplitMap(year):
-    def get_map_html():
-        m = geemap.Map(center=ROI_CENTER, zoom=11)
-        if not ee_initialized: return save_map_to_html(m)
-
-        def get_ndci_image(y):
-            start, end = f'{y}-05-01', f'{y}-09-30'
-            col = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') if y >= 2019 else ee.ImageCollection('COPERNICUS/S2_HARMONIZED')
-            def mask(img): 
-                return img.updateMask(img.select('SCL').eq(6)).divide(10000) if y >= 2019 else img.divide(10000)
-            s2 = col.filterBounds(ROI_RECT).filterDate(start, end).filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)).map(mask)
-            return s2.median().clip(ROI_RECT).normalizedDifference(['B5', 'B4']).rename('NDCI')
-
-        try:
-            ndci_img = get_ndci_image(year)
-            ndci_vis = {'min': -0.05, 'max': 0.15, 'palette': ['#0011ff', '#00ffff', '#00ff00', '#ffff00', '#ff0000']}
-            left_layer = geemap.ee_tile_layer(ndci_img, ndci_vis, f'{year} NDCI')
-            right_layer = get_benthic_layer(year)
-            m.split_map(left_layer, right_layer)
-            m.add_colorbar(ndci_vis, label="NDCI (優養化)", layer_name="NDCI")
-            # [修正] 正名為「珊瑚/藻類」
-            m.add_legend(title="棲地類別", labels=["沙地", "碎石", "岩石", "海草床", "珊瑚/藻類", "微藻墊"], colors=['#ffffbe', '#e0d05e', '#b19c3a', '#668438', '#ff6161', '#9bcc4f'])
-        except Exception:
-            pass
-        return save_map_to_html(m)
-
-    map_html = solara.use_memo(get_map_html, dependencies=[year])
-    return solara.HTML(tag="iframe", attributes={"srcDoc": map_html, "width": "100%", "height": "500px", "style": "border:none;"})
+    # 地圖內容見 penghu/maps.py (左：NDCI，右：該年棲地分類)
+    AsyncMap(*ndci_request(year),
+             center=ROI_CENTER, zoom=11, height="500px", legend=CLASS_LEGEND, split=True,
+             error_text="NDCI 地圖載入失敗: {error}",
+             neighbours=[ndci_request(y) for y in neighbour_years(year)])
 
 @solara.component
-def NDCIChart():
+def NDCIChart(period=FALLBACK_PERIOD):
+    store = solara.use_memo(lambda: load_store(period), dependencies=[period])
     with solara.Card(f"📊 關聯分析：NDCI vs 珊瑚/藻類面積"):
-        fig = go.Figure()
-        # [修正] 正名為「珊瑚/藻類」
-        fig.add_trace(go.Bar(x=df_ndci['Year'], y=coral_algae_values, name='珊瑚/藻類', marker_color='rgba(0, 206, 209, 0.7)', yaxis='y2'))
-        fig.add_trace(go.Scatter(x=df_ndci['Year'], y=df_ndci['NDCI_Mean'], name='NDCI', mode='lines+markers', line=dict(color='#00CC96', width=3)))
-        fig.update_layout(title='優養化指標 (NDCI) vs 珊瑚/藻類面積', xaxis=dict(title='年份'), yaxis=dict(title='NDCI', side='left'), yaxis2=dict(title='面積 (m²)', overlaying='y', side='right', showgrid=False), legend=dict(orientation="h", y=-0.2), height=450, margin=dict(l=40, r=40, t=40, b=40))
+        with metrics.span("plotly_figure", page="02_crisis", chart="ndci_coral"):
+            fig = go.Figure()
+            # [修正] 正名為「珊瑚/藻類」
+            fig.add_trace(go.Bar(x=store.years, y=store.series('area_m2', class_=CORAL), name='珊瑚/藻類', marker_color='rgba(0, 206, 209, 0.7)', yaxis='y2'))
+            fig.add_trace(go.Scatter(x=store.years, y=store.series('ndci'), name='NDCI', mode='lines+markers', line=dict(color='#00CC96', width=3)))
+            fig.update_layout(title='優養化指標 (NDCI) vs 珊瑚/藻類面積', xaxis=dict(title='年份'), yaxis=dict(title='NDCI', side='left'), yaxis2=dict(title='面積 (m²)', overlaying='y', side='right', showgrid=False), legend=dict(orientation="h", y=-0.2), height=450, margin=dict(l=40, r=40, t=40, b=40))
         solara.FigurePlotly(fig)
 
 # ==========================================
-# 5. 組件：棘冠海星地圖 (生態疊圖)
+# 4. 組件：棘冠海星地圖 (生態疊圖)
 # ==========================================
 @solara.component
 def StarfishHabitatMap():
-    def get_starfish_map_html():
-        m = geemap.Map(center=[23.25, 119.55], zoom=11)
-        m.add_basemap("HYBRID")
-        if not ee_initialized: return save_map_to_html(m)
-
-        zones = [
-            ee.Feature(ee.Geometry.Rectangle([119.408, 23.185, 119.445, 23.215]), {'name': '七美嶼'}),
-            ee.Feature(ee.Geometry.Rectangle([119.658, 23.250, 119.680, 23.265]), {'name': '東吉嶼'}),
-            ee.Feature(ee.Geometry.Rectangle([119.605, 23.245, 119.625, 23.260]), {'name': '西吉嶼'}),
-            ee.Feature(ee.Geometry.Rectangle([119.510, 23.255, 119.525, 23.268]), {'name': '東嶼坪'}),
-            ee.Feature(ee.Geometry.Rectangle([119.500, 23.260, 119.510, 23.272]), {'name': '西嶼坪'})
-        ]
-        outbreak_fc = ee.FeatureCollection(zones)
-
-        try:
-            s2 = ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED").filterBounds(ROI_RECT).filterDate('2024-05-01', '2024-09-30').filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 10)).median().clip(ROI_RECT)
-            
-            label_img = ee.Image('ACA/reef_habitat/v2_0').clip(ROI_RECT).remap(
-                [0, 11, 12, 13, 14, 15, 18], 
-                [0,  1,  2,  3,  4,  5,  6], 
-                0
-            ).rename('benthic')
-            
-            training = s2.select(['B2','B3','B4','B8']).addBands(label_img).stratifiedSample(numPoints=1000, classBand='benthic', region=ROI_RECT, scale=30, tileScale=8, geometries=False)
-            classifier = ee.Classifier.smileRandomForest(30).train(training, 'benthic', ['B2','B3','B4','B8'])
-            classified = s2.classify(classifier)
-
-            # 只顯示「珊瑚/藻類 (Class 5)」
-            coral_mask = classified.eq(5)
-            zone_coral = classified.updateMask(coral_mask).clipToCollection(outbreak_fc)
-            coral_vis = {'palette': ['#ff6161']} 
-
-            m.addLayer(outbreak_fc.style(color='red', width=3, fillColor='00000000'), {}, "海星爆發警戒區")
-            m.addLayer(zone_coral, coral_vis, "警戒區內珊瑚/藻類")
-            # [修正] 正名為「珊瑚/藻類」
-            m.add_legend(title="圖層說明", labels=["海星警戒區", "珊瑚/藻類 (食物來源)"], colors=["#FF0000", "#FF6161"])
-
-        except Exception as e:
-            m.addLayer(outbreak_fc.style(color='red', width=3, fillColor='00000000'), {}, "警戒區")
-
-        return save_map_to_html(m)
-
-    map_html = solara.use_memo(get_starfish_map_html, dependencies=[])
-    return solara.HTML(tag="iframe", attributes={"srcDoc": map_html, "width": "100%", "height": "500px", "style": "border:none;"})
+    # 地圖內容見 penghu/maps.py (警戒區內的珊瑚/藻類)
+    # 警戒區外框是預先簡化的 GeoJSON (見 penghu/zones.py)，地圖產生前就先畫出來
+    vectors = solara.use_memo(lambda: [zones.vector_layer(zones.ALERT_KIND)], dependencies=[])
+    AsyncMap(("starfish",), html=lambda: maps.starfish_map_html(),
+             center=STARFISH_CENTER, zoom=11, height="500px", legend=STARFISH_LEGEND, legend_title="圖層說明",
+             vectors=vectors)
 
 @solara.component
-def IslandTrendChart():
+def IslandTrendChart(period=FALLBACK_PERIOD):
     # 使用真實數據繪製
-    df = island_data[selected_island.value]
+    store = solara.use_memo(lambda: load_store(period), dependencies=[period])
+    # 新增的監測點在有本機統計之前沒有數據 (island_fallback 只有原本五區)
+    island_names = [name for name in solara.use_memo(zones.names, dependencies=[])
+                    if name in store.regions_with("area_m2", CORAL)]
     
     with solara.Card(f"📉 {selected_island.value}：歷年珊瑚/藻類面積變化"):
         solara.ToggleButtonsSingle(value=selected_island, values=island_names)
         
-        fig = go.Figure()
-        # [修正] 正名為「珊瑚/藻類」
-        fig.add_trace(go.Scatter(
-            x=df['Year'], y=df['Hard_Coral'], # 欄位名稱保持 Hard_Coral 方便讀取，但 Label 改掉
-            name='珊瑚/藻類', mode='lines+markers', 
-            line=dict(color='#ff6161', width=4), marker=dict(size=8)
-        ))
+        with metrics.span("plotly_figure", page="02_crisis", chart="island_trend"):
+            fig = go.Figure()
+            # [修正] 正名為「珊瑚/藻類」
+            fig.add_trace(go.Scatter(
+                x=store.years, y=store.series('area_m2', selected_island.value, CORAL),
+                name='珊瑚/藻類', mode='lines+markers', 
+                line=dict(color='#ff6161', width=4), marker=dict(size=8)
+            ))
         
-        fig.update_layout(
-            title=f"珊瑚/藻類群聚變化趨勢 ({selected_island.value})",
-            xaxis=dict(title='年份', tickmode='linear'),
-            yaxis=dict(title='面積 (m²)'),
-            hovermode="x unified",
-            margin=dict(l=40, r=40, t=60, b=40), height=400
-        )
+            fig.update_layout(
+                title=f"珊瑚/藻類群聚變化趨勢 ({selected_island.value})",
+                xaxis=dict(title='年份', tickmode='linear'),
+                yaxis=dict(title='面積 (m²)'),
+                hovermode="x unified",
+                margin=dict(l=40, r=40, t=60, b=40), height=400
+            )
         solara.FigurePlotly(fig)
 
 # ==========================================
-# 6. 組件：相關係數分析
+# 5. 組件：相關係數分析
 # ==========================================
 @solara.component
-def CorrelationAnalysis():
+def CorrelationAnalysis(period=FALLBACK_PERIOD):
+    store = solara.use_memo(lambda: load_store(period), dependencies=[period])
     with solara.Card("📊 統計分析：皮爾森相關係數 (環境 vs 珊瑚/藻類)"):
         with solara.Row(gap="10px", style={"flex-wrap": "wrap", "justify-content": "center"}):
+            @metrics.timed("plotly_figure", page="02_crisis")
             def create_corr_heatmap(df, title, color_icon):
                 corr = df.corr(method='pearson')
                 fig = go.Figure(data=go.Heatmap(z=corr.values, x=corr.columns, y=corr.index, colorscale='RdBu_r', zmin=-1, zmax=1, text=corr.values.round(2), texttemplate="%{text}", showscale=False))
                 fig.update_layout(title=f"{color_icon} {title}", height=280, width=350, margin=dict(l=40, r=10, t=40, b=40))
                 return fig
             
-            df_t = pd.DataFrame({'SST': df_mixed['SST_Summer'], 'NDCI': df_ndci['NDCI_Mean'], 'Coral/Algae': coral_algae_values})
+            df_t = store.table({'SST': ('sst',), 'NDCI': ('ndci',), 'Coral/Algae': ('area_m2', timeseries.TOTAL_ZONE, CORAL)})
             
             with solara.Column(style={"width": "350px"}):
                 # [修正] 正名為「珊瑚/藻類」
@@ -359,10 +229,18 @@ def CorrelationAnalysis():
         """, style="font-size: 0.9em; background-color: #f9f9f9; padding: 10px; border-radius: 5px;")
 
 # ==========================================
-# 7. 主頁面
+# 6. 主頁面
 # ==========================================
 @solara.component
 def Page():
+    session.start()
+    # 伺服器內背景預先渲染所有滑桿狀態 (見 penghu/warm.py)
+    warm.start()
+    # 歷年海溫 / NDCI 序列在背景補齊 (GEE 可用時，見 penghu/series.py)
+    series.refresh_async(years_list)
+    # 已存在的分類圖在背景統計面積 (見 penghu/stats.py)
+    stats.refresh_async(years_list, FALLBACK_PERIOD, STATS_RADIUS)
+    stats.refresh_async(years_list, SST_PERIODS[sst_type.value], STATS_RADIUS)
     with solara.Column(style={"width": "100%", "padding": "20px", "max-width": "100%", "margin": "0 auto"}):
         
         solara.Markdown("# 🌊 危害澎湖珊瑚礁之各項因子監測平台")
@@ -377,7 +255,7 @@ def Page():
                         solara.ToggleButtonsSingle(value=sst_type, values=["全年平均", "夏季均溫"])
                     SSTSplitMap(sst_year.value, sst_type.value)
                 with solara.Column(style={"flex": "1", "min-width": "500px"}):
-                    SSTCoralChart()
+                    SSTCoralChart(sst_type.value)
 
         # --- 2. 優養化區塊 ---
         with solara.Card("2. 海洋優養化 (NDCI) - 環境因子 vs 生態回應"):
@@ -0,0 +1,6 @@
+"""
+澎湖珊瑚礁監測平台的共用模組。
+
+pages/ 底下的各個頁面都從這裡取用 GEE 運算、快取與資料處理等共用功能，
+這裡刻意不在 import 時載入任何重量級套件 (ee、geemap…)，需要時才載入。
+"""
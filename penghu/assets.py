@@ -0,0 +1,139 @@
+"""
+頁面圖片的縮圖與壓縮 (取代把原圖 bytes 直接交給 solara.Image)。
+
+    python -m penghu.assets "2019 healthy coral.jpg" "Ocean debris chart.png" ...
+
+solara.Image(bytes) 會把整張原圖以 base64 塞進每個 session 的 websocket 訊息。
+這裡改成每張原圖只處理一次：縮成 WIDTHS 幾種寬度，各存一份 WebP 與一份 JPEG
+(有透明背景的存 PNG) 到 public/images/，檔名含原圖內容雜湊，網址帶 ?v=<內容雜湊>，
+Solara 的 /static/public 會加上長效快取標頭 (immutable)。
+頁面只輸出 <picture> + srcset，瀏覽器依版面寬度挑一張下載，伺服器不留任何 session 的副本。
+"""
+import argparse
+import hashlib
+import html as html_lib
+import io
+import os
+import sys
+import threading
+
+from penghu.config import ROOT_DIR
+from penghu.render import PUBLIC_DIR, STATIC_URL
+
+SOURCE_DIR = ROOT_DIR
+IMAGE_DIR = PUBLIC_DIR / "images"
+# 產生的寬度 (px)；比原圖寬的不產生
+WIDTHS = tuple(int(w) for w in os.environ.get("PENGHU_IMAGE_WIDTHS", "480,960,1600").split(","))
+WEBP_QUALITY = int(os.environ.get("PENGHU_WEBP_QUALITY", 80))
+JPEG_QUALITY = int(os.environ.get("PENGHU_JPEG_QUALITY", 82))
+# 找不到圖片 (或只是 Git LFS 指標檔) 時顯示的圖
+PLACEHOLDER_URL = "https://via.placeholder.com/300?text=Image+Not+Found"
+
+_lock = threading.Lock()
+_memo = {}
+
+
+def _write(path, data):
+    if not path.exists():
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+    return f"{STATIC_URL}/images/{path.name}?v={hashlib.md5(data).hexdigest()[:12]}"
+
+
+def _encode(img, fmt):
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        img.save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+    elif fmt == "png":
+        img.save(buffer, "PNG", optimize=True)
+    else:
+        img.convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def build(filename):
+    """
+    產生 (或沿用) filename 的所有縮圖，回傳
+    {"width", "height", "webp": [(網址, 寬度), ...], "fallback": [(網址, 寬度), ...]}；
+    找不到或無法讀取時回傳 None。
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    path = SOURCE_DIR / filename
+    if not path.exists():
+        print(f"❌ 找不到圖片: {filename}")
+        return None
+    data = path.read_bytes()
+    try:
+        source = Image.open(io.BytesIO(data))
+        source.load()
+    except (UnidentifiedImageError, OSError) as e:
+        print(f"❌ 無法讀取圖片 {filename}: {e}")
+        return None
+
+    # 壓縮品質改變時也要換檔名
+    digest = hashlib.sha1(data + f"{WEBP_QUALITY},{JPEG_QUALITY}".encode()).hexdigest()[:12]
+    has_alpha = source.mode in ("RGBA", "LA") or (source.mode == "P" and "transparency" in source.info)
+    source = source.convert("RGBA" if has_alpha else "RGB")
+    fallback = "png" if has_alpha else "jpg"
+    widths = sorted({w for w in WIDTHS if w < source.width} | {min(max(WIDTHS), source.width)})
+
+    IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+    result = {"width": source.width, "height": source.height, "webp": [], "fallback": []}
+    for width in widths:
+        height = round(source.height * width / source.width)
+        img = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+        for fmt, key in (("webp", "webp"), (fallback, "fallback")):
+            out_path = IMAGE_DIR / f"{digest}_{width}.{fmt}"
+            payload = out_path.read_bytes() if out_path.exists() else _encode(img, fmt)
+            result[key].append((_write(out_path, payload), width))
+    return result
+
+
+def variants(filename):
+    """build() 的結果；同一個原圖 (修改時間不變) 在程序內只處理一次"""
+    path = SOURCE_DIR / filename
+    stamp = path.stat().st_mtime_ns if path.exists() else None
+    key = (filename, stamp)
+    with _lock:
+        if key not in _memo:
+            _memo[key] = build(filename)
+        return _memo[key]
+
+
+def picture_html(filename, alt="", sizes="(max-width: 1200px) 100vw, 1200px"):
+    """<picture>：WebP 與 JPEG/PNG 各一組 srcset，寬度 100%、延遲載入"""
+    info = variants(filename)
+    alt = html_lib.escape(alt or filename)
+    if info is None:
+        return f'<img src="{PLACEHOLDER_URL}" alt="{alt}" style="width: 100%; height: auto;">'
+
+    def srcset(items):
+        return html_lib.escape(", ".join(f"{url} {width}w" for url, width in items))
+
+    default = info["fallback"][len(info["fallback"]) // 2][0]
+    return (f'<picture><source type="image/webp" srcset="{srcset(info["webp"])}" sizes="{sizes}">'
+            f'<img src="{html_lib.escape(default)}" srcset="{srcset(info["fallback"])}" sizes="{sizes}" alt="{alt}" '
+            f'width="{info["width"]}" height="{info["height"]}" loading="lazy" decoding="async" '
+            f'style="width: 100%; height: auto;"></picture>')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="預先產生頁面圖片的縮圖 (WebP + JPEG/PNG)")
+    parser.add_argument("files", nargs="+", help="專案根目錄下的圖片檔名")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for filename in args.files:
+        info = variants(filename)
+        if info is None:
+            failed += 1
+            continue
+        sizes = ", ".join(f"{width}w" for _, width in info["webp"])
+        print(f"✅ {filename} ({info['width']}x{info['height']}) -> {sizes}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
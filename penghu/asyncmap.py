@@ -0,0 +1,146 @@
+import os
+import threading
+from concurrent.futures import TimeoutError
+
+import solara
+import solara.lab
+
+from penghu import htmlcache, render
+from penghu.config import MAP_MODE, env_flag
+from penghu.lazy import LazyModule
+
+livemap = LazyModule("penghu.livemap")
+
+# ==========================================
+# 非同步地圖組件 (不在 render 中等待 GEE)
+# ==========================================
+# 地圖交給 htmlcache 的背景執行緒池產生 (solara.lab.use_task 只負責等待結果)，
+# 產生期間先顯示只有底圖與圖例的地圖，完成後換上分類圖層。
+# 參數變動時舊的請求若還在排隊就直接取消；已經在算的會算完放進快取 (不浪費)，只是不再顯示。
+#
+# 拖動滑桿時每個中間值都會讓 key 變動：key 停住 DEBOUNCE_S 秒後才真的送出請求
+# (快取裡已經有的直接顯示，不等)，一次拖動只算使用者最後停下的那一組。
+# 地圖完成後，有空閒執行緒時順便預先產生相鄰的年份 (neighbours)。
+
+# 等待結果時多久檢查一次是否已被新的請求取代 (秒)
+POLL_S = 0.1
+DEBOUNCE_S = float(os.environ.get("PENGHU_SLIDER_DEBOUNCE_S", 0.4))
+PREFETCH_NEIGHBOURS = env_flag("PENGHU_PREFETCH_NEIGHBOURS", True)
+
+_idle = threading.Condition()
+_running = 0
+
+
+def wait_idle(timeout=None):
+    """等所有組件的地圖請求結束 (量測與測試用)"""
+    with _idle:
+        return _idle.wait_for(lambda: _running == 0, timeout)
+
+
+def _track(delta):
+    global _running
+    with _idle:
+        _running += delta
+        _idle.notify_all()
+
+
+def use_debounced(value, delay=DEBOUNCE_S):
+    """回傳 value 最後一次停住超過 delay 秒的值 (第一次 render 直接回傳 value)"""
+    settled, set_settled = solara.use_state(value)
+
+    def schedule():
+        if value == settled:
+            return
+        timer = threading.Timer(delay, lambda: set_settled(value))
+        timer.daemon = True
+        timer.start()
+        # value 在 delay 內又變動時取消，中間值不會生效
+        return timer.cancel
+
+    solara.use_effect(schedule, [value])
+    return settled
+
+
+def _source(html, tiles):
+    """(fetch, compute)：即時圖磚模式 (且有 tiles) 取 cached_tiles，否則取 cached_map_html"""
+    if MAP_MODE == "live" and tiles:
+        return htmlcache.cached_tiles, tiles
+    return htmlcache.cached_map_html, html
+
+
+def use_map(key, html, tiles=None, debounce=DEBOUNCE_S):
+    """
+    回傳 (地圖 HTML 或圖磚網址, 是否產生中, 錯誤訊息)。
+    記憶體快取已有的直接回傳，不必等背景執行緒；沒有的等 key 停住 debounce 秒才送出請求。
+    """
+    fetch, compute = _source(html, tiles)
+    key = tuple(key)
+    cached = solara.use_memo(lambda: htmlcache.peek(key, fetch), dependencies=[key])
+    settled = use_debounced(key, debounce)
+    # 還在拖動 (key 尚未停住) 時不送出請求
+    request = key if cached is not None or settled == key else None
+
+    def run():
+        if request is None:
+            return None
+        if cached is not None:
+            return cached
+        _track(1)
+        try:
+            future = htmlcache.submit(fetch, key, compute)
+            while True:
+                try:
+                    return future.result(timeout=POLL_S)
+                except TimeoutError:
+                    if not task.is_current():
+                        # 已被新的參數取代：還沒開始的就取消
+                        future.cancel()
+                        return None
+        finally:
+            _track(-1)
+
+    task = solara.lab.use_task(run, dependencies=[request], raise_error=False)
+    if cached is not None:
+        return cached, False, None
+    if request is None:
+        return None, True, None
+    if task.error:
+        return None, False, str(task.exception)
+    if task.finished:
+        return task.value, False, None
+    return None, True, None
+
+
+def prefetch_neighbours(neighbours):
+    """[(key, html, tiles), ...] 中快取還沒有的，在有空閒執行緒時送出"""
+    for key, html, tiles in neighbours:
+        fetch, compute = _source(html, tiles)
+        if htmlcache.peek(key, fetch) is None:
+            htmlcache.prefetch(tuple(key), compute, fetch, idle_only=True)
+
+
+@solara.component
+def AsyncMap(key, html, tiles=None, center=None, zoom=11, height="500px", legend=None, legend_title="棲地類別",
+             split=False, error_text="地圖載入失敗: {error}", neighbours=(), vectors=()):
+    """
+    key / html / tiles 同 use_map；產生中先顯示底圖與圖例 (加上進度條)，完成後換上完整地圖。
+    iframe 模式的錯誤由 maps.*_map_html 畫在地圖內；即時圖磚模式的錯誤以 error_text 顯示。
+    neighbours: 這張地圖完成後預先產生的 [(key, html, tiles), ...] (例如前後一年)。
+    vectors: 產生期間先畫在底圖上的向量圖層 (見 render.leaflet_html)。
+    """
+    value, pending, error = use_map(key, html, tiles)
+
+    def prefetch():
+        if PREFETCH_NEIGHBOURS and value is not None:
+            prefetch_neighbours(neighbours)
+
+    solara.use_effect(prefetch, [tuple(key), value is not None])
+    solara.ProgressLinear(pending)
+    if MAP_MODE == "live" and tiles:
+        livemap.LiveTileMap(value or {}, center, zoom, height=height, legend=legend, legend_title=legend_title,
+                            split=split)
+    else:
+        src = value if value else render.leaflet_html(center, zoom, legend, legend_title, vectors=vectors)
+        solara.HTML(tag="iframe", attributes={"srcDoc": src, "width": "100%", "height": height, "style": "border: none;"})
+    if error:
+        solara.Error(error_text.format(error=error))
@@ -0,0 +1,323 @@
+"""
+離線效能量測 (不連 GEE)。
+
+    python -m penghu.bench --out bench.json
+    python -m penghu.bench --fixtures .cache/maps --mode live --out live.json
+    python -m penghu.bench --baseline bench.json          # 與上次比較，退步超過容許值回傳 1
+
+後端換成 OfflineBackend，地圖從 fixture 目錄 (mapstore 格式，warm 的輸出可直接拿來用) 讀取；
+沒有指定時自動產生假的地圖與 DEM。量測項目：
+  - imports：各頁面模組的 import 時間 (每頁一個新的 python 程序，冷啟動)
+  - first_render：各頁面 Page() 第一次 render 的時間
+  - interactions：四個地圖組件每次參數變動的延遲 (cold = 第一次看到這組參數，warm = 再看一次)；
+    關閉相鄰年份的預先產生，cold 才是真的沒有快取
+  - interactions_prefetch：同上但開啟預先產生 (清空快取後重量)，cold 顯示預先產生省下多少
+  - payload_bytes：送到瀏覽器的地圖資料量 (iframe 的 HTML 或即時模式的圖磚網址)
+  - memory：各階段結束時的最大常駐記憶體 (ru_maxrss)
+"""
+import argparse
+import json
+import os
+import pathlib
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+PAGES_DIR = ROOT_DIR / "pages"
+
+# 各地圖組件：(頁面檔, 組件名稱, 快取 key 前綴)
+COMPONENTS = [
+    ("01_benthic.py", "ReefHabitatMap", "benthic"),
+    ("02_crisis.py", "SSTSplitMap", "sst"),
+    ("02_crisis.py", "NDCISplitMap", "ndci"),
+    ("02_crisis.py", "StarfishHabitatMap", "starfish"),
+]
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _summary(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        "n": len(values),
+        "mean": statistics.fmean(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+    }
+
+
+# ==========================================
+# 1. 假資料 (沒有指定 fixture 時使用)
+# ==========================================
+def make_fixtures(fixtures_dir, html_kb=300):
+    """為 warm 的每個 key 產生一張大小接近真實地圖的假 HTML，以及圖磚網址"""
+    from penghu import mapstore, warm
+
+    body = "<script>" + ("var x = 0;\n" * (html_kb * 1024 // 11)) + "</script>"
+    for key in warm.job_keys():
+        key = tuple(key) + (True,)
+        label = "_".join(str(k) for k in key)
+        html = f"<!DOCTYPE html><html><head><title>{label}</title></head><body>{body}</body></html>"
+        tiles = {f"{label}_{i}": f"https://earthengine.googleapis.com/v1/fake/{label}/{i}/tiles/{{z}}/{{x}}/{{y}}"
+                 for i in range(3)}
+        mapstore.save(key, html, tiles, 0.0, fixtures_dir)
+
+
+def make_dem(path, step=0.002):
+    import numpy as np
+    import pandas as pd
+
+    xs = np.round(np.arange(119.27, 119.81, step), 5)
+    ys = np.round(np.arange(23.17, 23.88, step), 5)
+    x, y = np.meshgrid(xs, ys)
+    z = np.sin(x * 50) * 30 + np.cos(y * 40) * 20
+    pd.DataFrame({'x': x.ravel(), 'y': y.ravel(), 'VALUE': z.ravel()}).to_csv(path, index=False)
+
+
+# ==========================================
+# 2. 量測
+# ==========================================
+def measure_imports(env):
+    """每頁一個新程序：先 import solara (另計)，再執行頁面模組"""
+    code = (
+        "import json, pathlib, sys, time\n"
+        "t = time.perf_counter(); import solara; solara_s = time.perf_counter() - t\n"
+        "from penghu import startup\n"
+        "t = time.perf_counter(); startup.import_page(pathlib.Path(sys.argv[1])); page_s = time.perf_counter() - t\n"
+        "print(json.dumps({'solara': solara_s, 'page': page_s}))\n"
+    )
+    results = {}
+    for path in sorted(PAGES_DIR.glob("[!_]*.py")):
+        out = subprocess.run([sys.executable, "-c", code, str(path)], env=env, cwd=ROOT_DIR,
+                             capture_output=True, text=True)
+        lines = out.stdout.strip().splitlines()
+        if out.returncode != 0 or not lines:
+            results[path.name] = {"error": out.stderr.strip().splitlines()[-1:]}
+            continue
+        results[path.name] = json.loads(lines[-1])
+    return results
+
+
+def measure_first_render(modules):
+    import solara
+
+    results = {}
+    for name, module in modules.items():
+        start = time.perf_counter()
+        try:
+            box, rc = solara.render(module.Page(), handle_error=False)
+            results[name] = time.perf_counter() - start
+            rc.close()
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def _payload(prefix, params):
+    from penghu import htmlcache
+    from penghu.config import MAP_MODE
+
+    key = htmlcache.session_key((prefix,) + tuple(params))
+    if MAP_MODE == "live":
+        value = htmlcache.tile_cache.get(key)
+        return len(json.dumps(value).encode('utf-8')) if value else 0
+    value = htmlcache.map_cache.get(key)
+    return len(value.encode('utf-8')) if value else 0
+
+
+def _params(prefix, keys):
+    return [key[1:] for key in keys if key[0] == prefix]
+
+
+def _wait_loaded(prefix, params, timeout=60):
+    """等到這組參數的地圖進了快取、且組件的背景請求都結束"""
+    from penghu import asyncmap
+
+    deadline = time.perf_counter() + timeout
+    while not _payload(prefix, params) and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    asyncmap.wait_idle(max(0, deadline - time.perf_counter()))
+
+
+def measure_interactions(modules, keys):
+    import solara
+
+    latency, payload = {}, {}
+    for page, component_name, prefix in COMPONENTS:
+        component = getattr(modules[page], component_name)
+        combos = _params(prefix, keys)
+        params = solara.reactive(combos[0])
+
+        @solara.component
+        def Harness():
+            component(*params.value)
+
+        # 第一次 render 算第一組參數的 cold；之後每組參數切換兩輪 (第一輪 cold，第二輪 warm)
+        # 地圖在背景產生 (penghu/asyncmap.py)，計時到背景請求結束為止
+        start = time.perf_counter()
+        box, rc = solara.render(Harness(), handle_error=False)
+        _wait_loaded(prefix, combos[0])
+        cold, warm_ = [time.perf_counter() - start], []
+        order = combos[1:] + combos[:1] if len(combos) > 1 else []
+        for i, combo in enumerate(order + order):
+            start = time.perf_counter()
+            params.value = combo
+            _wait_loaded(prefix, combo)
+            (cold if i < len(order) else warm_).append(time.perf_counter() - start)
+        sizes = [_payload(prefix, combo) for combo in combos]
+        rc.close()
+        latency[component_name] = {"cold": _summary(cold), "warm": _summary(warm_)}
+        payload[component_name] = {"mean": statistics.fmean(sizes), "max": max(sizes)} if sizes else {}
+    return latency, payload
+
+
+def run(fixtures=None, mode=None, html_kb=300, dem=None):
+    """在目前程序中設定離線環境後量測，回傳結果 dict"""
+    work = pathlib.Path(tempfile.mkdtemp(prefix="penghu-bench-"))
+    env = dict(os.environ)
+    env.update({
+        "PENGHU_BACKEND": "offline",
+        "PENGHU_CACHE_DIR": str(work / "cache"),
+        "PENGHU_FIXTURES_DIR": str(fixtures or work / "fixtures"),
+        "PENGHU_DEM_SOURCE": str(dem or work / "penghuDTM.csv"),
+        "PENGHU_SPLIT_MAP_ASSETS": "0",
+        # 預先產生 / 預先渲染 / 背景序列都會在量測前把快取填好，cold 就不是 cold 了
+        "PENGHU_PREFETCH_NEIGHBOURS": "0",
+        "PENGHU_WARM": "0",
+        "PENGHU_SERIES_AUTO_REFRESH": "0",
+        "PYTHONPATH": str(ROOT_DIR) + os.pathsep + env.get("PYTHONPATH", ""),
+    })
+    if mode:
+        env["PENGHU_MAP_MODE"] = mode
+    # penghu.config 在 import 時讀環境變數，所以要先設好再 import
+    os.environ.update(env)
+    sys.path.insert(0, str(ROOT_DIR))
+
+    from penghu import startup, warm
+    from penghu.config import MAP_MODE
+
+    memory = {}
+    if fixtures is None:
+        make_fixtures(work / "fixtures", html_kb)
+    if dem is None:
+        make_dem(work / "penghuDTM.csv")
+    memory["fixtures"] = _peak_rss_mb()
+
+    imports = measure_imports(env)
+
+    modules = {}
+    for path in sorted(PAGES_DIR.glob("[!_]*.py")):
+        modules[path.name] = startup.import_page(path)
+    memory["import"] = _peak_rss_mb()
+
+    first_render = measure_first_render(modules)
+    memory["first_render"] = _peak_rss_mb()
+
+    interactions, payload = measure_interactions(modules, warm.job_keys())
+    memory["interactions"] = _peak_rss_mb()
+
+    from penghu import asyncmap, htmlcache
+
+    htmlcache.map_cache.clear()
+    htmlcache.tile_cache.clear()
+    asyncmap.PREFETCH_NEIGHBOURS = True
+    try:
+        interactions_prefetch, _ = measure_interactions(modules, warm.job_keys())
+    finally:
+        asyncmap.PREFETCH_NEIGHBOURS = False
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "map_mode": MAP_MODE,
+            "fixtures": str(fixtures) if fixtures else f"synthetic ({html_kb} KB)",
+        },
+        "imports": imports,
+        "first_render": first_render,
+        "interactions": interactions,
+        "interactions_prefetch": interactions_prefetch,
+        "payload_bytes": payload,
+        "memory_peak_mb": memory,
+    }
+
+
+# ==========================================
+# 3. 與上次結果比較
+# ==========================================
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield from _flatten(v, f"{prefix}.{k}" if prefix else k)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(result, baseline, tolerance=0.2, min_seconds=0.005):
+    """回傳退步超過 tolerance (比例) 的項目；兩次都很短的時間 (雜訊) 不比"""
+    old = dict(_flatten({k: v for k, v in baseline.items() if k != "meta"}))
+    regressions = []
+    for name, value in _flatten({k: v for k, v in result.items() if k != "meta"}):
+        before = old.get(name)
+        if before is None or before <= 0 or name.endswith(".n"):
+            continue
+        is_time = not name.startswith(("payload_bytes", "memory_peak_mb"))
+        if is_time and max(value, before) < min_seconds:
+            continue
+        if value > before * (1 + tolerance):
+            regressions.append({"metric": name, "before": before, "after": value, "ratio": value / before})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="離線量測各頁面的啟動與互動延遲")
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--fixtures", help="mapstore 格式的地圖目錄 (例如 warm 的輸出)；不給就產生假資料")
+    parser.add_argument("--dem", help="DEM CSV；不給就產生假資料")
+    parser.add_argument("--mode", choices=["iframe", "live"], help="地圖模式 (預設依 PENGHU_MAP_MODE)")
+    parser.add_argument("--html-kb", type=int, default=300, help="假地圖 HTML 的大小")
+    parser.add_argument("--baseline", help="上次的結果 JSON，比較是否退步")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允許退步的比例")
+    args = parser.parse_args(argv)
+
+    result = run(pathlib.Path(args.fixtures) if args.fixtures else None, args.mode, args.html_kb,
+                 pathlib.Path(args.dem) if args.dem else None)
+    pathlib.Path(args.out).write_text(json.dumps(result, ensure_ascii=False, indent=1), encoding='utf-8')
+    print(f"✅ 結果已寫入 {args.out}")
+
+    for section in ("interactions", "interactions_prefetch"):
+        print(f"  {section}")
+        for name, r in result[section].items():
+            print(f"  {name:<20} cold p50 {r['cold'].get('p50', 0) * 1000:7.1f} ms   "
+                  f"warm p50 {r['warm'].get('p50', 0) * 1000:7.1f} ms")
+
+    if args.baseline:
+        baseline = json.loads(pathlib.Path(args.baseline).read_text(encoding='utf-8'))
+        regressions = compare(result, baseline, args.tolerance)
+        for r in regressions:
+            print(f"❌ {r['metric']}: {r['before']:.4g} -> {r['after']:.4g} (x{r['ratio']:.2f})")
+        if regressions:
+            return 1
+        print("✅ 沒有超過容許值的退步")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+兩年之間的棲地變化 (例如 珊瑚/藻類 -> 碎石)。
+
+    python -m penghu.change --years 2016 2017 ... 2025 --period 夏季平均 --radius 30 [--classify]
+
+讀取本機分類結果 (penghu/local/pipeline.py)，對每一對年份 (前, 後) 分條掃描一次，同時產生：
+  - 變化圖 .cache/change/<季節>_r<半徑>/<前>_<後>.tif：uint8，前類別 x 類別數 + 後類別 (255 為遮罩)
+  - 轉移矩陣 .cache/change/transitions.parquet：每一對年份每個 (前, 後) 類別組合的像素數與面積
+新的年份只需要與已有的年份配對，已算過的組合不會重算。
+頁面選兩個年份時直接讀這裡的結果 (不必即時跑兩次分類)。
+"""
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from penghu.config import CACHE_DIR, CLASS_LABELS, CLASS_PALETTE, period_dates
+from penghu.render import PUBLIC_DIR, STATIC_URL
+
+CHANGE_DIR = CACHE_DIR / "change"
+TABLE_PATH = CHANGE_DIR / "transitions.parquet"
+# 給瀏覽器的預覽圖 (由 Solara 的 /static/public 提供)
+PREVIEW_DIR = PUBLIC_DIR / "change"
+PREVIEW_MAX_PX = 2048
+N_CLASSES = len(CLASS_LABELS)
+COLUMNS = ["year_from", "year_to", "period", "radius", "from_class", "to_class", "from_label", "to_label",
+           "pixels", "area_m2"]
+
+_lock = threading.Lock()
+_memo = {}
+
+
+def encode(before, after):
+    """(前, 後) 類別 -> 變化代碼 (uint8)；任一邊是遮罩就是 255"""
+    from penghu.local.raster import NODATA_CLASS
+
+    code = before.astype('uint8') * N_CLASSES + after.astype('uint8')
+    code[(before == NODATA_CLASS) | (after == NODATA_CLASS)] = NODATA_CLASS
+    return code
+
+
+def decode(code):
+    return code // N_CLASSES, code % N_CLASSES
+
+
+def change_path(year_from, year_to, period, radius):
+    return CHANGE_DIR / f"{period}_r{radius}" / f"{year_from}_{year_to}.tif"
+
+
+# ==========================================
+# 1. 變化圖與轉移矩陣 (一次掃描)
+# ==========================================
+def transition_raster(path_from, path_to, out_path, memory_mb=None):
+    """
+    兩張同網格的分類圖 -> 變化圖，回傳 (pixels, area_m2)，形狀都是 [類別數, 類別數] (列 = 前，欄 = 後)。
+    """
+    import rasterio
+
+    from penghu.local.raster import MEMORY_MB, NODATA_CLASS, open_output, strips
+    from penghu.stats import row_area
+
+    size = N_CLASSES * N_CLASSES
+    pixels = np.zeros(size, dtype='int64')
+    area = np.zeros(size, dtype='float64')
+    with rasterio.open(path_from) as a, rasterio.open(path_to) as b:
+        if (a.crs, a.transform, a.shape) != (b.crs, b.transform, b.shape):
+            raise ValueError(f"分類圖網格不一致: {path_from} / {path_to}")
+        grid = {"crs": a.crs, "transform": a.transform, "width": a.width, "height": a.height}
+        tmp_path = out_path.with_suffix('.tmp.tif')
+        with open_output(tmp_path, grid) as dst:
+            for _, window, _ in strips(a.height, a.width, 24, memory_mb or MEMORY_MB):
+                code = encode(a.read(1, window=window), b.read(1, window=window))
+                dst.write(code, 1, window=window)
+                valid = code != NODATA_CLASS
+                pixels += np.bincount(code[valid], minlength=size)
+                weights = np.broadcast_to(row_area(a.transform, window, a.crs)[:, None], code.shape)
+                area += np.bincount(code[valid], weights=weights[valid], minlength=size)
+        tmp_path.replace(out_path)
+    return pixels.reshape(N_CLASSES, N_CLASSES), area.reshape(N_CLASSES, N_CLASSES)
+
+
+def compute(year_from, year_to, period, radius, path_from, path_to):
+    """一對年份 -> 長表格 (每個 (前, 後) 類別組合一列)"""
+    out_path = change_path(year_from, year_to, period, radius)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    pixels, area = transition_raster(path_from, path_to, out_path)
+    rows = []
+    for i, from_label in enumerate(CLASS_LABELS):
+        for j, to_label in enumerate(CLASS_LABELS):
+            rows.append((year_from, year_to, period, radius, i, j, from_label, to_label,
+                         int(pixels[i, j]), float(area[i, j])))
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+# ==========================================
+# 2. Parquet 快取 (增量更新)
+# ==========================================
+def load():
+    if not TABLE_PATH.exists():
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.read_parquet(TABLE_PATH)
+
+
+def _save(df):
+    TABLE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = TABLE_PATH.with_suffix('.tmp')
+    df.to_parquet(tmp_path, index=False)
+    tmp_path.replace(TABLE_PATH)
+
+
+def update(years, period, radius, classify=False, catalog=None):
+    """
+    補齊缺少的年份組合後回傳整張長表格 (每一對 前 < 後 的年份)。
+    classify=False 時只用已存在的分類圖；True 時缺的分類圖會先跑本機分類。
+    """
+    from penghu.local import pipeline
+
+    with _lock:
+        df = load()
+        if len(df):
+            df = df[[change_path(a, b, p, r).exists() for a, b, p, r in
+                     zip(df["year_from"], df["year_to"], df["period"], df["radius"])]]
+        same = df[(df["period"] == period) & (df["radius"] == radius)] if len(df) else df
+        done = set(zip(same["year_from"], same["year_to"])) if len(same) else set()
+
+        paths = {}
+        for year in sorted(set(years)):
+            start, end = period_dates(year, period)
+            path = pipeline.benthic_path(year, start, end, radius)
+            if not path.exists():
+                if not classify:
+                    continue
+                path = pipeline.benthic_classification(year, start, end, radius, catalog)
+            paths[year] = path
+
+        added = []
+        ready = sorted(paths)
+        for i, year_to in enumerate(ready):
+            # 新的年份只跟之前的年份配對
+            for year_from in ready[:i]:
+                if (year_from, year_to) in done:
+                    continue
+                print(f"🔀 變化 {year_from} -> {year_to} {period} r{radius}")
+                added.append(compute(year_from, year_to, period, radius, paths[year_from], paths[year_to]))
+        if added:
+            df = pd.concat([df] + added, ignore_index=True) if len(df) else pd.concat(added, ignore_index=True)
+            _save(df)
+            _memo.clear()
+        return df
+
+
+# ==========================================
+# 3. 頁面使用 (只讀已算好的結果，不觸發運算)
+# ==========================================
+def _pairs():
+    """變化統計表；其他程序 (python -m penghu.change) 更新檔案後自動重讀"""
+    stamp = TABLE_PATH.stat().st_mtime_ns if TABLE_PATH.exists() else None
+    with _lock:
+        if "table" not in _memo or _memo.get("stamp") != stamp:
+            try:
+                table = load()
+            except (ImportError, OSError) as e:
+                print(f"⚠️ 無法讀取變化統計: {e}")
+                table = pd.DataFrame(columns=COLUMNS)
+            _memo.update(table=table, stamp=stamp)
+        return _memo["table"]
+
+
+def available(period="夏季平均", radius=30):
+    """已算好的年份組合 [(前, 後), ...]"""
+    df = _pairs()
+    if len(df) == 0:
+        return []
+    df = df[(df["period"] == period) & (df["radius"] == radius)]
+    return sorted(set(zip(df["year_from"].astype(int), df["year_to"].astype(int))))
+
+
+def transition_matrix(year_from, year_to, period="夏季平均", radius=30):
+    """方陣 DataFrame (列 = 前類別，欄 = 後類別，面積 ha)，不含「無數據」；沒有結果時回傳 None"""
+    df = _pairs()
+    if len(df) == 0:
+        return None
+    df = df[(df["year_from"] == year_from) & (df["year_to"] == year_to)
+            & (df["period"] == period) & (df["radius"] == radius)]
+    if len(df) == 0:
+        return None
+    matrix = df.pivot_table(index="from_label", columns="to_label", values="area_m2", aggfunc="sum") / 10000
+    labels = CLASS_LABELS[1:]
+    return matrix.reindex(index=labels, columns=labels, fill_value=0).round(2)
+
+
+def preview(year_from, year_to, period="夏季平均", radius=30, from_class=None, to_class=None):
+    """
+    變化圖的預覽 PNG (Web Mercator，長邊不超過 PREVIEW_MAX_PX)：有變化的像素以「後」類別的顏色顯示，
+    沒變化的透明；可只顯示特定的 前 / 後 類別。回傳 (檔名, [[south, west], [north, east]])，沒有結果時回傳 None。
+    """
+    import rasterio
+    import rasterio.errors
+    from rasterio.enums import Resampling
+    from rasterio.warp import calculate_default_transform, reproject, transform_bounds
+
+    from penghu.local.raster import NODATA_CLASS
+
+    path = change_path(year_from, year_to, period, radius)
+    if not path.exists():
+        return None
+    # 檔名只用 ASCII (網址不必跳脫)；變化圖重算後 mtime 不同，自動換新檔名
+    params = (year_from, year_to, period, radius, from_class, to_class, path.stat().st_mtime_ns)
+    name = hashlib.sha1(json.dumps(params, ensure_ascii=False).encode('utf-8')).hexdigest()[:16] + ".png"
+    with rasterio.open(path) as src:
+        west, south, east, north = transform_bounds(src.crs, "EPSG:4326", *src.bounds)
+        bounds = [[south, west], [north, east]]
+        out_path = PREVIEW_DIR / name
+        if out_path.exists():
+            return name, bounds
+
+        scale = max(src.width, src.height) / PREVIEW_MAX_PX
+        height, width = (src.height, src.width) if scale <= 1 else (int(src.height / scale), int(src.width / scale))
+        code = src.read(1, out_shape=(height, width), resampling=Resampling.nearest)
+        transform = src.transform * src.transform.scale(src.width / width, src.height / height)
+        dst_transform, dst_width, dst_height = calculate_default_transform(
+            src.crs, "EPSG:3857", width, height, *src.bounds, dst_width=width, dst_height=height)
+        merc = np.full((dst_height, dst_width), NODATA_CLASS, dtype='uint8')
+        reproject(code, merc, src_transform=transform, src_crs=src.crs, src_nodata=NODATA_CLASS,
+                  dst_transform=dst_transform, dst_crs="EPSG:3857", dst_nodata=NODATA_CLASS,
+                  resampling=Resampling.nearest)
+
+    before, after = decode(merc)
+    show = (merc != NODATA_CLASS) & (before != after)
+    if from_class is not None:
+        show &= before == from_class
+    if to_class is not None:
+        show &= after == to_class
+    palette = np.array([[int(c.lstrip('#')[k:k + 2], 16) for k in (0, 2, 4)] for c in CLASS_PALETTE], dtype='uint8')
+    rgba = np.zeros((4, dst_height, dst_width), dtype='uint8')
+    rgba[:3] = np.moveaxis(palette[np.where(show, after, 0)], -1, 0)
+    rgba[3] = np.where(show, 255, 0)
+
+    PREVIEW_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix('.tmp.png')
+    with warnings.catch_warnings():
+        # PNG 沒有地理參照 (範圍另外回傳給 Leaflet)
+        warnings.simplefilter("ignore", rasterio.errors.NotGeoreferencedWarning)
+        with rasterio.open(tmp_path, "w", driver="PNG", width=dst_width, height=dst_height, count=4,
+                           dtype='uint8') as dst:
+            dst.write(rgba)
+    tmp_path.replace(out_path)
+    return name, bounds
+
+
+def preview_url(name):
+    return f"{STATIC_URL}/change/{name}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="由本機分類結果計算兩年之間的棲地變化")
+    parser.add_argument("--years", type=int, nargs="+", default=list(range(2016, 2026)))
+    parser.add_argument("--period", default="夏季平均")
+    parser.add_argument("--radius", type=int, default=30)
+    parser.add_argument("--classify", action="store_true", help="缺少的分類圖先跑本機分類")
+    args = parser.parse_args(argv)
+
+    df = update(args.years, args.period, args.radius, classify=args.classify)
+    pairs = available(args.period, args.radius)
+    print(f"✅ {TABLE_PATH} ({len(df)} 列，{args.period} r{args.radius} 共 {len(pairs)} 組年份)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import threading
+
+import ee
+
+from penghu import gee, metrics, scheduler
+from penghu.config import CACHE_DIR, S2_BANDS, env_flag
+
+# ==========================================
+# 隨機森林分類器快取 (整個程序共用)
+# ==========================================
+# 訓練資料 (2018 中位數影像 + ACA 標籤) 不會隨年份、季節或平滑半徑改變，
+# 所以同一組參數只需要抽樣、訓練一次，所有 Solara session 共用同一個分類器。
+# 抽到的訓練樣本第一次會匯出成 GEE 的表格資產 (TRAINING_ASSET_ROOT 底下)，
+# 之後的分類請求只引用資產 ID，不必再跑 stratifiedSample，也不會把上千個樣本點寫進每個請求。
+# 匯出完成前先用雲端上的 stratifiedSample 訓練；已送出的匯出工作記在 .cache/training，重啟後不重複送出。
+
+TRAINING_DIR = CACHE_DIR / "training"
+TRAINING_ASSET_ROOT = os.environ.get("PENGHU_TRAINING_ASSET_ROOT", "projects/ee-s1243041/assets/penghu_training")
+PERSIST_TRAINING = env_flag("PENGHU_PERSIST_TRAINING", True)
+# 還在排隊 / 執行中的匯出工作 (其他狀態：完成、失敗、取消、未知)
+ACTIVE_STATES = ('UNSUBMITTED', 'READY', 'RUNNING', 'CANCEL_REQUESTED')
+
+_classifiers = {}
+_key_locks = {}
+_lock = threading.Lock()
+
+
+def classifier_key(collection_id, bands=S2_BANDS, n_trees=50, num_points=1000, scale=30,
+                   train_dates=('2018-01-01', '2018-12-31'), cloud_max=20, water_mask=True):
+    return (collection_id, tuple(bands), n_trees, num_points, scale, tuple(train_dates), cloud_max, water_mask)
+
+
+def _key_lock(key):
+    with _lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _digest(key):
+    return hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()[:16]
+
+
+def _training_asset(key):
+    return f"{TRAINING_ASSET_ROOT}/samples_{_digest(key)}"
+
+
+def _task_path(key):
+    return TRAINING_DIR / f"{_digest(key)}.json"
+
+
+def _load_training(key):
+    """已匯出的樣本資產 (ee.FeatureCollection)；資產不存在 (還沒匯出、還在匯出或已被刪除) 時回傳 None，其他錯誤往外丟"""
+    asset_id = _training_asset(key)
+    try:
+        scheduler.call(ee.data.getAsset, asset_id, name="getAsset")
+    except ee.EEException as e:
+        message = str(e).lower()
+        if "not found" not in message and "does not exist" not in message:
+            raise
+        return None
+    return ee.FeatureCollection(asset_id)
+
+
+def _export_training(key, sample):
+    """
+    把 stratifiedSample 的結果匯出成表格資產 (背景的 GEE 工作)；只在資產不存在時呼叫。
+    上次送出的工作還在排隊 / 執行時不重複送出；已失敗，或已完成但資產不見了 (被刪除或改名) 時刪掉紀錄重新匯出。
+    """
+    path = _task_path(key)
+    if path.exists():
+        task_id = json.loads(path.read_text(encoding='utf-8'))['task']
+        state = scheduler.call(ee.data.getTaskStatus, task_id, name="getTaskStatus")[0].get('state')
+        if state in ACTIVE_STATES:
+            return
+        if state == 'COMPLETED':
+            print(f"⚠️ 上次匯出的訓練樣本資產已不存在 ({_training_asset(key)})，重新匯出")
+        else:
+            print(f"⚠️ 上次的訓練樣本匯出沒有完成 ({state})，重新送出")
+        path.unlink()
+    asset_id = _training_asset(key)
+    try:
+        scheduler.call(ee.data.createAsset, {'type': 'FOLDER'}, TRAINING_ASSET_ROOT, name="createAsset")
+    except ee.EEException:
+        # 資料夾已存在 (沒有權限時下面的匯出會再報錯)
+        pass
+    task = ee.batch.Export.table.toAsset(collection=sample, description=f"penghu_training_{_digest(key)}",
+                                         assetId=asset_id)
+    scheduler.call(task.start, name="exportTable")
+    TRAINING_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps({'key': key, 'asset': asset_id, 'task': task.id}), encoding='utf-8')
+    tmp_path.replace(path)
+    print(f"💾 訓練樣本匯出中: {asset_id} (工作 {task.id})")
+
+
+def _build_training(key):
+    collection_id, bands, n_trees, num_points, scale, train_dates, cloud_max, water_mask = key
+    region = gee.roi()
+    img_train = gee.s2_median(collection_id, train_dates[0], train_dates[1], cloud_max, region, bands)
+    if water_mask:
+        mask_train = (img_train.normalizedDifference(['B3', 'B8']).gt(0.1)
+                      .And(gee.depth_mask(region))
+                      .focal_mode(radius=10, kernelType='circle', units='meters'))
+        img_train = img_train.updateMask(mask_train)
+
+    return img_train.addBands(gee.aca_labels(region)).stratifiedSample(
+        numPoints=num_points,
+        classBand='benthic',
+        region=region,
+        scale=scale,
+        tileScale=8,
+        geometries=False
+    )
+
+
+def get_classifier(collection_id, bands=S2_BANDS, n_trees=50, num_points=1000, scale=30,
+                   train_dates=('2018-01-01', '2018-12-31'), cloud_max=20, water_mask=True):
+    """
+    取得 (或第一次建立) 指定參數的隨機森林分類器。
+    同一組參數在多個 session 同時要求時，只有一個會去訓練，其餘等待並共用結果。
+    """
+    key = classifier_key(collection_id, bands, n_trees, num_points, scale, train_dates, cloud_max, water_mask)
+    classifier = _classifiers.get(key)
+    if classifier is not None:
+        return classifier
+
+    with _key_lock(key):
+        classifier = _classifiers.get(key)
+        if classifier is not None:
+            return classifier
+
+        with metrics.span("classifier_train", collection=collection_id, n_trees=n_trees, train_dates=train_dates):
+            training, persist = None, PERSIST_TRAINING
+            if persist:
+                try:
+                    training = _load_training(key)
+                except ee.EEException as e:
+                    # 不確定資產是否存在 (權限、連線)，這次不重新匯出
+                    print(f"⚠️ 訓練樣本資產讀取失敗 ({_training_asset(key)}): {e}")
+                    persist = False
+            if training is None:
+                training = _build_training(key)
+                if persist:
+                    try:
+                        _export_training(key, training)
+                    except (ee.EEException, OSError) as e:
+                        # 匯出失敗也沒關係，直接用雲端上的樣本訓練
+                        print(f"⚠️ 訓練樣本無法匯出，改用雲端樣本: {e}")
+
+            classifier = ee.Classifier.smileRandomForest(n_trees).train(training, 'benthic', list(bands))
+        _classifiers[key] = classifier
+        return classifier
+
+
+def clear():
+    with _lock:
+        _classifiers.clear()
+        _key_locks.clear()
@@ -0,0 +1,62 @@
+import os
+import pathlib
+
+# ==========================================
+# 專案共用設定
+# ==========================================
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+# 快取資料夾 (訓練樣本、地圖等)，可用環境變數 PENGHU_CACHE_DIR 指定
+CACHE_DIR = pathlib.Path(os.environ.get("PENGHU_CACHE_DIR", ROOT_DIR / ".cache"))
+
+# 研究範圍 (澎湖群島) 與海星警戒區的幾何見 data/zones.geojson (penghu/zones.py)
+ROI_CENTER = [23.5, 119.5]
+
+# Google 衛星混合底圖
+HYBRID_URL = "https://mt1.google.com/vt/lyrs=y&x={x}&y={y}&z={z}"
+
+# 地圖顯示模式："iframe" (完整 folium HTML) 或 "live" (ipyleaflet 即時圖磚，只更新圖層網址)
+MAP_MODE = os.environ.get("PENGHU_MAP_MODE", "iframe").strip().lower()
+
+# 平滑半徑滑桿的選項 (m)；預先渲染 (penghu/warm.py) 使用同一組，滑桿只停在已預先渲染的半徑
+SMOOTHING_RADII = list(range(0, 81, 10))
+
+# Sentinel-2 分類使用的波段
+S2_BANDS = ['B2', 'B3', 'B4', 'B8']
+
+# ACA 原始代碼 -> 系統代碼 (0: 無數據, 1~6: 沙地、碎石、岩石、海草床、珊瑚/藻類、微藻墊)
+ACA_CLASSES = [0, 11, 12, 13, 14, 15, 18]
+SYSTEM_CLASSES = [0, 1, 2, 3, 4, 5, 6]
+CLASS_LABELS = ["無數據", "沙地", "碎石", "岩石", "海草床", "珊瑚/藻類", "微藻墊"]
+
+# 棲地分類配色 (依 ACA 圖例)
+CLASS_PALETTE = [
+    '#000000',  # 0: 無數據
+    '#ffffbe',  # 1: 沙地 (11)
+    '#e0d05e',  # 2: 碎石 (12)
+    '#b19c3a',  # 3: 岩石 (13)
+    '#668438',  # 4: 海草床 (14)
+    '#ff6161',  # 5: 珊瑚/藻類 (15)
+    '#9bcc4f'   # 6: 微藻墊 (18)
+]
+CLASS_LEGEND = dict(zip(CLASS_LABELS[1:], CLASS_PALETTE[1:]))
+
+
+def s2_collection_id(year):
+    """2019 年以後使用大氣校正 (SR)，之前只有 TOA 可用 (解決 2016-2018 No bands 問題)"""
+    if year >= 2019:
+        return "COPERNICUS/S2_SR_HARMONIZED"
+    return "COPERNICUS/S2_HARMONIZED"
+
+
+def period_dates(year, period):
+    if period == "夏季平均":
+        return f'{year}-06-01', f'{year}-09-30'
+    return f'{year}-01-01', f'{year}-12-31'
+
+
+def env_flag(name, default=True):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off", "")
@@ -0,0 +1,225 @@
+"""
+首頁 3D 地形用的 DEM。
+
+penghuDTM.csv (x, y, VALUE 三欄的點表) 只在第一次轉檔：依內容雜湊存成
+.cache/dem/<hash>/{x,y,z}.npy，之後以 memory map 開啟 (不複製、幾毫秒)。
+來源可以是本機檔案或網址 (PENGHU_DEM_SOURCE)；來源對應的雜湊記在 sources.json，
+所以網址來源轉檔過一次後，啟動時不必再連網。
+
+同時建立多解析度金字塔 (區塊平均，每層邊長減半，z_2.npy、z_4.npy …)；
+view() 依頂點預算與裁切範圍挑最合適的一層，送到瀏覽器的資料量固定有上限。
+
+    python -m penghu.dem [--source 路徑或網址] [--refresh]
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import urllib.request
+
+import numpy as np
+
+from penghu.config import CACHE_DIR, ROOT_DIR
+
+DEM_URL = "https://raw.githubusercontent.com/Jie-Yan094/final_Penghu_coralreef/main/penghuDTM.csv"
+DEM_DIR = CACHE_DIR / "dem"
+# 專案根目錄有 penghuDTM.csv 時優先使用本機檔案
+DEM_SOURCE = os.environ.get("PENGHU_DEM_SOURCE") or (
+    str(ROOT_DIR / "penghuDTM.csv") if (ROOT_DIR / "penghuDTM.csv").exists() else DEM_URL)
+
+COL_X, COL_Y, COL_Z = 'x', 'y', 'VALUE'
+
+# 金字塔最粗的一層邊長不小於此值
+MIN_LEVEL_SIZE = 64
+# 細緻度 -> 頂點預算 (plotly Surface 的 x * y 點數)
+DETAIL_BUDGETS = {"低": 20_000, "中": 60_000, "高": 200_000}
+# 常用的裁切範圍 [west, south, east, north]
+REGIONS = {
+    "全區": None,
+    "南方四島": [119.49, 23.235, 119.70, 23.29],
+}
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+class DEM:
+    """規則網格：z[row, col] 對應 (y[row], x[col])；y、x 皆為遞增排序"""
+    def __init__(self, x, y, z, key, levels=None):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.key = key
+        # {縮減倍率: (x, y, z)}，1 是原始解析度
+        self.levels = levels or {1: (x, y, z)}
+
+    @property
+    def shape(self):
+        return self.z.shape
+
+    def view(self, max_vertices=DETAIL_BUDGETS["中"], bbox=None):
+        """
+        回傳 (x, y, z, 倍率)：先裁切到 bbox，再挑頂點數不超過 max_vertices 的最細一層。
+        範圍夠小時可以直接用原始解析度。
+        """
+        for factor in sorted(self.levels):
+            x, y, z = self.levels[factor]
+            cols, rows = _crop_slice(x, bbox, 0, 2), _crop_slice(y, bbox, 1, 3)
+            n = (cols.stop - cols.start) * (rows.stop - rows.start)
+            if n <= max_vertices or factor == max(self.levels):
+                return x[cols], y[rows], z[rows, cols], factor
+
+
+def _crop_slice(axis, bbox, lo, hi):
+    if bbox is None:
+        return slice(0, len(axis))
+    start = int(np.searchsorted(axis, bbox[lo], side='left'))
+    stop = int(np.searchsorted(axis, bbox[hi], side='right'))
+    return slice(start, max(stop, start + 1))
+
+
+def block_mean(values, factor, axis):
+    """沿 axis 每 factor 個取平均 (最後一塊不足 factor 也一起平均)，避免直接跳點取樣的鋸齒"""
+    starts = np.arange(0, values.shape[axis], factor)
+    sums = np.add.reduceat(np.asarray(values, dtype='float64'), starts, axis=axis)
+    counts = np.diff(np.append(starts, values.shape[axis]))
+    shape = [1] * values.ndim
+    shape[axis] = len(counts)
+    return sums / counts.reshape(shape)
+
+
+def build_pyramid(x, y, z):
+    """產生 {倍率: (x, y, z)}，倍率 2, 4, 8 … 直到最短邊小於 MIN_LEVEL_SIZE"""
+    levels = {}
+    factor = 2
+    while min(z.shape) // factor >= MIN_LEVEL_SIZE:
+        levels[factor] = (block_mean(x, factor, 0), block_mean(y, factor, 0),
+                          block_mean(block_mean(z, factor, 0), factor, 1).astype('float32'))
+        factor *= 2
+    return levels
+
+
+def _is_url(source):
+    return source.startswith(("http://", "https://"))
+
+
+def _read_source(source):
+    if _is_url(source):
+        print(f"正在讀取: {source} ...")
+        with urllib.request.urlopen(source, timeout=60) as response:
+            return response.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def _source_state(source):
+    """本機檔案用 (大小, 修改時間) 判斷是否變動；網址視為不變 (要更新請 --refresh)"""
+    if _is_url(source):
+        return None
+    stat = os.stat(source)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _read_sources():
+    path = DEM_DIR / "sources.json"
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def _write_sources(sources):
+    DEM_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = DEM_DIR / "sources.json.tmp"
+    tmp_path.write_text(json.dumps(sources, ensure_ascii=False, indent=1), encoding='utf-8')
+    tmp_path.replace(DEM_DIR / "sources.json")
+
+
+def grid_from_points(x, y, z):
+    """點表 -> 規則網格 (以排序後的唯一座標做索引，直接填值，不用 pandas pivot)；空洞填最小值"""
+    xs, ix = np.unique(x, return_inverse=True)
+    ys, iy = np.unique(y, return_inverse=True)
+    grid = np.full((len(ys), len(xs)), np.nan, dtype='float32')
+    grid[iy, ix] = z
+    if np.isnan(grid).any():
+        # 用最小值而不是 0 填補，海底看起來比較自然
+        grid[np.isnan(grid)] = np.nanmin(grid)
+    return xs, ys, grid
+
+
+def parse_csv(content):
+    import pandas as pd
+
+    table = pd.read_csv(io.BytesIO(content))
+    missing = [c for c in (COL_X, COL_Y, COL_Z) if c not in table.columns]
+    if missing:
+        raise ValueError(f"欄位名稱錯誤！CSV 內的欄位是: {list(table.columns)}")
+    values = table[[COL_X, COL_Y, COL_Z]].apply(pd.to_numeric, errors='coerce').dropna().to_numpy()
+    if len(values) == 0:
+        raise ValueError("矩陣為空，可能是因為座標無法對齊")
+    return grid_from_points(values[:, 0], values[:, 1], values[:, 2].astype('float32'))
+
+
+def ingest(source=DEM_SOURCE, refresh=False):
+    """把來源轉成 .npy (已轉過且來源未變動就直接回傳雜湊)"""
+    sources = _read_sources()
+    known = sources.get(source)
+    if known and not refresh and known.get("state") == _source_state(source) \
+            and (DEM_DIR / known["hash"] / "z.npy").exists():
+        return known["hash"]
+
+    content = _read_source(source)
+    digest = hashlib.sha1(content).hexdigest()[:16]
+    out_dir = DEM_DIR / digest
+    if not (out_dir / "z.npy").exists():
+        x, y, z = parse_csv(content)
+        tmp_dir = DEM_DIR / f"{digest}.tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        for name, array in (("x", x), ("y", y), ("z", z)):
+            np.save(tmp_dir / f"{name}.npy", array)
+        for factor, arrays in build_pyramid(x, y, z).items():
+            for name, array in zip(("x", "y", "z"), arrays):
+                np.save(tmp_dir / f"{name}_{factor}.npy", array)
+        tmp_dir.replace(out_dir)
+        print(f"✅ DEM 轉檔完成: {z.shape} -> {out_dir}")
+
+    sources[source] = {"hash": digest, "state": _source_state(source)}
+    _write_sources(sources)
+    return digest
+
+
+def load(source=DEM_SOURCE):
+    """回傳 DEM (memory map，唯讀)；整個程序共用"""
+    with _lock:
+        if source not in _loaded:
+            digest = ingest(source)
+            folder = DEM_DIR / digest
+            if not any(folder.glob("z_*.npy")):
+                # 舊版轉檔沒有金字塔，補建一次
+                for factor, arrays in build_pyramid(*(np.load(folder / f"{n}.npy") for n in ("x", "y", "z"))).items():
+                    for name, array in zip(("x", "y", "z"), arrays):
+                        np.save(folder / f"{name}_{factor}.npy", array)
+            levels = {1: tuple(np.load(folder / f"{name}.npy", mmap_mode='r') for name in ("x", "y", "z"))}
+            for path in sorted(folder.glob("z_*.npy")):
+                factor = int(path.stem.split("_")[1])
+                levels[factor] = tuple(np.load(folder / f"{name}_{factor}.npy", mmap_mode='r')
+                                       for name in ("x", "y", "z"))
+            _loaded[source] = DEM(*levels[1], key=digest, levels=levels)
+        return _loaded[source]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把 DEM 點表 CSV 轉成 memory-map 網格")
+    parser.add_argument("--source", default=DEM_SOURCE, help="本機路徑或網址")
+    parser.add_argument("--refresh", action="store_true", help="重新下載 / 讀取來源")
+    args = parser.parse_args(argv)
+    digest = ingest(args.source, args.refresh)
+    dem = load(args.source)
+    print(f"✅ {DEM_DIR / digest} {dem.shape}，金字塔倍率 {sorted(dem.levels)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
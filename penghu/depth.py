@@ -0,0 +1,282 @@
+"""
+水深遮罩 (只保留 DEPTH_RANGE 之間的淺海) 的共用產品。
+
+    python -m penghu.depth                    # 顯示門檻與水深分布
+    python -m penghu.depth --download         # 把 GEE 上的遮罩存成本機 uint8 GeoTIFF (WORKING_SCALE)
+
+GEE 端：水深圖層直接以波段位置 select([0]) 取用，不必先問 bandNames().get(0)；
+圖層是否存在每個程序只確認一次 (結果也存在 .cache/depth/meta.json；「找不到」過 MISSING_TTL_H 小時後重新確認)，
+遮罩影像依門檻建立一次後所有地圖共用。
+本機端：由 catalog 的水深圖 (或 --download 下載的 GEE 遮罩) 掃一次，
+存成對齊 catalog 網格的 uint8 遮罩，分類時逐條讀取，不再每條重算。
+門檻 PENGHU_DEPTH_RANGE="0,30" (m)；也可以寫成百分位數 (例如 "p5,p95")，
+由快取的水深直方圖換算，不必每次重新統計。
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from penghu import scheduler, zones
+from penghu.config import CACHE_DIR
+
+BATHYMETRY_ASSET = os.environ.get("PENGHU_BATHYMETRY_ASSET", "projects/ee-s1243041/assets/bathymetry_0")
+DEPTH_RANGE = os.environ.get("PENGHU_DEPTH_RANGE", "0,30")
+# 本機遮罩與下載的解析度 (m)，與分類器抽樣的 scale 相同
+WORKING_SCALE = int(os.environ.get("PENGHU_DEPTH_SCALE", 30))
+DEPTH_DIR = CACHE_DIR / "depth"
+META_PATH = DEPTH_DIR / "meta.json"
+# 直方圖範圍 (m) 與分箱數 (1 m 一格)
+HIST_MIN, HIST_MAX = -20, 120
+HIST_BINS = HIST_MAX - HIST_MIN
+# 「找不到水深圖層」的結果多久後重新確認 (小時)；圖層之後才上傳或暫時讀不到時會自動恢復
+MISSING_TTL_H = float(os.environ.get("PENGHU_DEPTH_MISSING_TTL_H", 6))
+
+_lock = threading.Lock()
+_memo = {}
+
+
+# ==========================================
+# 1. 快取的中繼資料 (圖層是否存在、水深直方圖)
+# ==========================================
+def _read_meta():
+    try:
+        meta = json.loads(META_PATH.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+    return meta if meta.get("asset") == BATHYMETRY_ASSET else {}
+
+
+def _write_meta(**fields):
+    meta = dict(_read_meta(), asset=BATHYMETRY_ASSET, **fields)
+    DEPTH_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = META_PATH.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+    tmp_path.replace(META_PATH)
+
+
+def asset_exists():
+    """
+    水深圖層是否存在 (存在時每個程序只問 GEE 一次；找不到時明確記錄，不吞掉其他錯誤)。
+    「存在」會存進 meta.json；「找不到」只在 MISSING_TTL_H 小時內有效，之後 (或重啟後過期時) 重新確認。
+    """
+    import ee
+
+    with _lock:
+        cached = _memo.get("exists")
+        if cached is not None and (cached[0] or time.time() - cached[1] < MISSING_TTL_H * 3600):
+            return cached[0]
+        meta = _read_meta()
+        missing_since = meta.get("missing_since")
+        if meta.get("exists"):
+            found = True
+        elif missing_since and time.time() - missing_since < MISSING_TTL_H * 3600:
+            found = False
+        else:
+            try:
+                scheduler.call(ee.data.getAsset, BATHYMETRY_ASSET, name="getAsset")
+                found = True
+                _write_meta(exists=True, missing_since=None)
+            except ee.EEException as e:
+                message = str(e).lower()
+                if "not found" not in message and "does not exist" not in message:
+                    raise
+                print(f"⚠️ 找不到水深圖層 {BATHYMETRY_ASSET}，水深遮罩暫時改為全部有效: {e}")
+                found, missing_since = False, time.time()
+                _write_meta(exists=False, missing_since=missing_since)
+        _memo["exists"] = (found, missing_since)
+        return found
+
+
+def _histogram_remote():
+    import ee
+
+    depth = ee.Image(BATHYMETRY_ASSET).select([0], ['depth'])
+    stats = depth.reduceRegion(ee.Reducer.fixedHistogram(HIST_MIN, HIST_MAX, HIST_BINS), zones.ee_geometry(),
+                               scale=WORKING_SCALE * 4, maxPixels=1e9, tileScale=4)
+    rows = scheduler.call(stats.get('depth').getInfo, name="depthHistogram") or []
+    return [int(count) for _, count in rows]
+
+
+def _histogram_local(catalog):
+    from penghu.local.catalog import read_float
+    from penghu.local.raster import MEMORY_MB, strips
+
+    counts = np.zeros(HIST_BINS, dtype='int64')
+    with catalog.open(catalog.meta["bathymetry"]) as src:
+        for _, window, _ in strips(src.height, src.width, 4, MEMORY_MB):
+            depth = read_float(src, [1], window)[0]
+            counts += np.histogram(depth[np.isfinite(depth)], bins=HIST_BINS, range=(HIST_MIN, HIST_MAX))[0]
+    return counts.tolist()
+
+
+def histogram(catalog=None):
+    """水深直方圖 (HIST_MIN ~ HIST_MAX，每 1 m 一格的像素數)；第一次算完存進 meta.json"""
+    source = "local" if catalog is not None and catalog.meta.get("bathymetry") else "remote"
+    key = ("histogram", source)
+    with _lock:
+        cached = _memo.get(key) or _read_meta().get("histogram", {}).get(source)
+        if cached is not None:
+            _memo[key] = cached
+            return cached
+    counts = _histogram_local(catalog) if source == "local" else _histogram_remote()
+    with _lock:
+        _write_meta(histogram=dict(_read_meta().get("histogram", {}), **{source: counts}))
+        _memo[key] = counts
+    return counts
+
+
+def thresholds(spec=DEPTH_RANGE, catalog=None):
+    """"lo,hi" -> (lo, hi) 公尺；"p5" 這種百分位數由 histogram() 換算 (只有用到時才統計)"""
+    values = []
+    for token in spec.split(","):
+        token = token.strip()
+        if token.lower().startswith("p"):
+            counts = np.asarray(histogram(catalog), dtype='float64')
+            if counts.sum() == 0:
+                raise ValueError("水深直方圖是空的，無法換算百分位數門檻")
+            cdf = np.cumsum(counts) / counts.sum()
+            index = int(np.searchsorted(cdf, float(token[1:]) / 100))
+            values.append(float(HIST_MIN + index))
+        else:
+            values.append(float(token))
+    lo, hi = values
+    return lo, hi
+
+
+# ==========================================
+# 2. GEE 端的遮罩 (每組門檻建立一次)
+# ==========================================
+def ee_mask(region=None, lo=None, hi=None):
+    """對應原本的 depth.lt(hi).And(depth.gt(lo))；水深圖層不存在時為 ee.Image(1)"""
+    import ee
+
+    region = region or zones.ee_geometry()
+    if lo is None or hi is None:
+        lo, hi = thresholds()
+    key = ("ee", lo, hi)
+    with _lock:
+        mask = _memo.get(key)
+    if mask is None:
+        if not asset_exists():
+            # 不記住替代的遮罩：過了 MISSING_TTL_H 之後重新確認圖層
+            return ee.Image(1).clip(region)
+        depth = ee.Image(BATHYMETRY_ASSET).select([0], ['depth'])
+        mask = depth.lt(hi).And(depth.gt(lo))
+        with _lock:
+            _memo[key] = mask
+    return mask.clip(region)
+
+
+def remote_path(lo, hi, scale=WORKING_SCALE):
+    return DEPTH_DIR / f"mask_{lo:g}_{hi:g}_{scale}m.tif"
+
+
+def download(lo=None, hi=None, scale=WORKING_SCALE):
+    """GEE 遮罩 -> 本機 uint8 GeoTIFF (EPSG:4326，研究範圍，約 scale 公尺一格)"""
+    import ee
+
+    if lo is None or hi is None:
+        lo, hi = thresholds()
+    west, south, east, north = zones.bounds()
+    step = scale / 111320.0
+    width, height = int(np.ceil((east - west) / step)), int(np.ceil((north - south) / step))
+    request = {
+        "expression": ee_mask(lo=lo, hi=hi).unmask(0).toByte(),
+        "fileFormat": "GEO_TIFF",
+        "grid": {
+            "dimensions": {"width": width, "height": height},
+            "affineTransform": {"scaleX": step, "shearX": 0, "translateX": west,
+                                "shearY": 0, "scaleY": -step, "translateY": north},
+            "crsCode": "EPSG:4326",
+        },
+    }
+    data = scheduler.call(ee.data.computePixels, request, name="computePixels")
+    out_path = remote_path(lo, hi, scale)
+    DEPTH_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix('.tmp')
+    tmp_path.write_bytes(data)
+    tmp_path.replace(out_path)
+    return out_path
+
+
+# ==========================================
+# 3. 本機端的遮罩 (對齊 catalog 網格的 uint8，掃一次)
+# ==========================================
+def local_path(catalog, lo, hi):
+    grid = catalog.grid
+    params = (str(catalog.root), catalog.meta.get("bathymetry"), lo, hi, grid["crs"].to_string(),
+              tuple(grid["transform"])[:6], grid["width"], grid["height"])
+    digest = hashlib.sha1(json.dumps(params, default=str).encode('utf-8')).hexdigest()[:12]
+    return DEPTH_DIR / f"local_{digest}.tif"
+
+
+def local_mask(catalog, lo=None, hi=None):
+    """
+    回傳 catalog 網格上的遮罩路徑 (uint8，1 = 保留)：
+    有水深圖時由水深圖算；沒有時改用 download() 存下的 GEE 遮罩；兩者都沒有時回傳 None (全部有效)。
+    """
+    from penghu.local.catalog import read_float
+    from penghu.local.raster import MEMORY_MB, open_output, strips
+
+    if lo is None or hi is None:
+        lo, hi = thresholds(catalog=catalog)
+    out_path = local_path(catalog, lo, hi)
+    with _lock:
+        if out_path.exists():
+            return out_path
+        if catalog.meta.get("bathymetry"):
+            source = catalog.open(catalog.meta["bathymetry"])
+        elif remote_path(lo, hi).exists():
+            source = catalog.open(remote_path(lo, hi))
+        else:
+            return None
+        tmp_path = out_path.with_suffix('.tmp.tif')
+        with source as src, open_output(tmp_path, catalog.grid, nodata=None) as dst:
+            for _, window, _ in strips(src.height, src.width, 5, MEMORY_MB):
+                if catalog.meta.get("bathymetry"):
+                    depth = read_float(src, [1], window)[0]
+                    keep = (depth < hi) & (depth > lo)
+                else:
+                    keep = src.read(1, window=window) == 1
+                dst.write(keep.astype('uint8'), 1, window=window)
+        tmp_path.replace(out_path)
+        print(f"💾 水深遮罩 {lo:g}~{hi:g} m: {out_path.name}")
+        return out_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="水深遮罩：門檻、水深分布與本機遮罩")
+    parser.add_argument("--range", default=DEPTH_RANGE, help='門檻 "lo,hi" (m) 或百分位數 "p5,p95"')
+    parser.add_argument("--download", action="store_true", help="把 GEE 上的遮罩下載成本機 GeoTIFF")
+    parser.add_argument("--local", action="store_true", help="由本機 catalog 建立對齊網格的遮罩")
+    args = parser.parse_args(argv)
+
+    catalog = None
+    if args.local:
+        from penghu.local.catalog import Catalog
+
+        catalog = Catalog()
+    elif args.download or args.range.count("p"):
+        from penghu import gee
+
+        if not gee.initialize():
+            print("❌ 無法連線 Earth Engine")
+            return 1
+
+    lo, hi = thresholds(args.range, catalog)
+    print(f"🌊 水深門檻: {lo:g} ~ {hi:g} m")
+    if args.download:
+        print(f"✅ {download(lo, hi)}")
+    if catalog is not None:
+        print(f"✅ {local_mask(catalog, lo, hi)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
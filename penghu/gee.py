@@ -0,0 +1,73 @@
+import ee
+
+from penghu import depth, session, zones
+from penghu.config import S2_BANDS, ACA_CLASSES, SYSTEM_CLASSES, s2_collection_id
+
+# ==========================================
+# GEE 驗證與初始化 (見 penghu/session.py)
+# ==========================================
+def initialize():
+    """等待共用 session 完成驗證，回傳是否可以呼叫 Earth Engine"""
+    session.wait()
+    return session.is_online()
+
+
+def is_initialized():
+    return session.is_online()
+
+
+# ==========================================
+# GEE 共用影像 (01_benthic 與 02_crisis 共用)
+# ==========================================
+def roi():
+    """研究範圍 (data/zones.geojson 的 roi)"""
+    return zones.ee_geometry()
+
+
+def depth_mask(region=None):
+    """水深遮罩：只保留 PENGHU_DEPTH_RANGE (預設 0 ~ 30 m) 的淺海區域 (見 penghu/depth.py)"""
+    return depth.ee_mask(region or roi())
+
+
+def s2_median(collection_id, start_date, end_date, cloud_max=20, region=None, bands=S2_BANDS):
+    region = region or roi()
+    img = (ee.ImageCollection(collection_id)
+           .filterBounds(region).filterDate(start_date, end_date)
+           .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', cloud_max))
+           .median().clip(region))
+    return img.select(list(bands)) if bands else img
+
+
+def aca_labels(region=None):
+    """ACA 棲地圖層，Remap 成系統代碼 0~6 (見 config.ACA_CLASSES)"""
+    region = region or roi()
+    return ee.Image('ACA/reef_habitat/v2_0').clip(region).remap(
+        ACA_CLASSES,
+        SYSTEM_CLASSES,
+        0
+    ).rename('benthic').toByte()
+
+
+# ==========================================
+# 環境因子 (02_crisis 的地圖與歷年序列共用)
+# ==========================================
+def sst_image(year, start, end, region=None):
+    """海面溫度 (°C)：2018 前用 MODIS L3SMI，之後用 GCOM-C SST_AVE (scale 0.0012、offset -10)"""
+    region = region or roi()
+    if year < 2018:
+        col = ee.ImageCollection("NASA/OCEANDATA/MODIS-Aqua/L3SMI").select('sst')
+        return col.filterBounds(region).filterDate(start, end).median().clip(region)
+    col = ee.ImageCollection('JAXA/GCOM-C/L3/OCEAN/SST/V3').filter(ee.Filter.eq('SATELLITE_DIRECTION', 'D'))
+    return col.filterBounds(region).filterDate(start, end).median().clip(region).select('SST_AVE').multiply(0.0012).add(-10)
+
+
+def ndci_image(year, start, end, region=None):
+    """NDCI = (B5 - B4) / (B5 + B4)；2019 起 SR 影像只保留 SCL = 6 (水體) 的像素"""
+    region = region or roi()
+    col = ee.ImageCollection(s2_collection_id(year))
+
+    def mask(img):
+        return img.updateMask(img.select('SCL').eq(6)).divide(10000) if year >= 2019 else img.divide(10000)
+
+    s2 = col.filterBounds(region).filterDate(start, end).filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)).map(mask)
+    return s2.median().clip(region).normalizedDifference(['B5', 'B4']).rename('NDCI')
@@ -0,0 +1,269 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from penghu import mapstore, metrics, render, scheduler, session
+from penghu.config import env_flag
+
+# ==========================================
+# 地圖 HTML 快取 (整個程序共用，LRU + 單一運算)
+# ==========================================
+# solara.use_memo 只在單一組件實例內有效，每個新的瀏覽器 session 都會重算一次
+# 同樣的 (年份, 季節, 半徑)。這裡把產生好的 HTML 放在伺服器端共用：
+#   - 以位元組數控制記憶體上限，超過時淘汰最久沒用到的項目 (LRU)
+#   - 同一個 key 同時被多個 session 要求時，只有第一個會真的去算，其餘等待同一結果
+#   - 命中 / 未命中 / 淘汰次數可由 stats() 取得
+#   - GEE 圖磚網址會過期，超過 ttl 秒的項目視為未命中
+
+DEFAULT_MAX_MB = float(os.environ.get("PENGHU_MAP_CACHE_MB", 256))
+# 畫地圖前最多等 GEE 驗證多久 (秒)，逾時就先只畫底圖
+READY_TIMEOUT = float(os.environ.get("PENGHU_EE_READY_TIMEOUT", 30))
+# 以 zlib 壓縮後存放 (地圖 HTML 壓縮率約 5~10 倍，同樣的記憶體可以放更多張)
+COMPRESS = env_flag("PENGHU_MAP_CACHE_COMPRESS", True)
+# 背景產生地圖的執行緒數，以及最多可以排隊等待的請求數 (超過時拒絕，避免把伺服器塞滿)
+MAP_WORKERS = int(os.environ.get("PENGHU_MAP_WORKERS", 4))
+MAP_QUEUE = int(os.environ.get("PENGHU_MAP_QUEUE", 32))
+# 快取 key 的第一個元素 -> 所在頁面 (metrics 的 page 標籤)
+KEY_PAGES = {"benthic": "01_benthic", "sst": "02_crisis", "ndci": "02_crisis", "starfish": "02_crisis"}
+
+
+def _size_of(value):
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_size_of(k) + _size_of(v) for k, v in value.items())
+    return 0
+
+
+def is_map_document(html):
+    """只快取完整的地圖頁面，錯誤訊息 (<div>...) 不快取，下次會重試"""
+    return isinstance(html, str) and html.lstrip()[:15].lower() == "<!doctype html>"
+
+
+class MapCache:
+    def __init__(self, max_bytes, ttl=None, compress=False):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.compress = compress
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def _lookup(self, key):
+        # 呼叫端需持有 self._lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        if self.ttl is not None and time.time() - stored_at > self.ttl:
+            del self._entries[key]
+            self._bytes -= _size_of(value)
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def _unpack(self, entry):
+        value = entry[0]
+        return render.decompress(value) if self.compress and isinstance(value, bytes) else value
+
+    def get(self, key):
+        with self._lock:
+            entry = self._lookup(key)
+        return self._unpack(entry) if entry else None
+
+    def put(self, key, value):
+        if self.compress and isinstance(value, str):
+            value = render.compress(value)
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= _size_of(self._entries.pop(key)[0])
+            self._entries[key] = (value, time.time())
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (old, _) = self._entries.popitem(last=False)
+                self._bytes -= _size_of(old)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute, cache_if=is_map_document):
+        """
+        取得 key 對應的 HTML；沒有的話呼叫 compute() 產生。
+        同一個 key 正在運算中時，直接等待那次運算的結果，不重複呼叫 compute()。
+        """
+        with self._lock:
+            entry = self._lookup(key)
+        if entry is not None:
+            return self._unpack(entry)
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        if cache_if is None or cache_if(value):
+            self.put(key, value)
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "inflight": len(self._inflight),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+map_cache = MapCache(max_bytes=int(DEFAULT_MAX_MB * 1024 * 1024), ttl=mapstore.MAX_AGE, compress=COMPRESS)
+
+
+def session_key(key):
+    """快取 key 加上 GEE 是否可用 (連線前畫的只有底圖，連上之後要重算)"""
+    return tuple(key) + (session.wait(READY_TIMEOUT),)
+
+
+def cached_map_html(key, compute):
+    """記憶體快取 -> warm 預先渲染的硬碟檔 -> 由 session 後端呼叫 compute() 去算"""
+    with metrics.span("map_request", page=KEY_PAGES.get(key[0]), key=key):
+        key = session_key(key)
+        return map_cache.get_or_compute(key, lambda: mapstore.load(key) or session.produce("html", key, compute))
+
+
+# 即時圖磚模式 (penghu/livemap.py) 用的圖磚網址快取，{圖層名稱: 網址} 很小，給 8 MB 就很夠
+tile_cache = MapCache(max_bytes=8 * 1024 * 1024, ttl=mapstore.MAX_AGE)
+
+
+def cached_tiles(key, compute):
+    """記憶體快取 -> warm 存下的圖磚網址 -> 真的呼叫 compute() 向 GEE 取得"""
+    with metrics.span("tiles_request", page=KEY_PAGES.get(key[0]), key=key):
+        key = session_key(key)
+        return tile_cache.get_or_compute(key, lambda: mapstore.tiles(key) or session.produce("tiles", key, compute),
+                                         cache_if=bool)
+
+
+def peek(key, fetch=cached_map_html):
+    """不等待也不運算，只看記憶體快取裡有沒有 (GEE 還在連線時一律回傳 None)"""
+    if session.status()["status"] not in ("ready", "failed"):
+        return None
+    cache = tile_cache if fetch is cached_tiles else map_cache
+    return cache.get(tuple(key) + (session.is_ready(),))
+
+
+# ==========================================
+# 背景產生 (有上限的執行緒池)
+# ==========================================
+# 頁面組件不在 render 中直接等 GEE：把 fetch(key, compute) 交給這裡的執行緒，
+# 還沒開始的請求可以取消 (使用者快速拖動滑桿時，中間的年份不必算)。
+class QueueFull(RuntimeError):
+    pass
+
+
+_executor = ThreadPoolExecutor(max_workers=MAP_WORKERS, thread_name_prefix="penghu-map")
+# 已送出但還沒結束 (執行中 + 排隊中) 的請求數
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _release(_):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def pending():
+    with _pending_lock:
+        return _pending
+
+
+def _run(fetch, key, compute, level):
+    with scheduler.priority(level):
+        return fetch(key, compute)
+
+
+def submit(fetch, key, compute, priority=scheduler.INTERACTIVE):
+    """
+    回傳 Future；執行中加排隊的請求已達上限時丟出 QueueFull。
+    priority 是這張地圖的 GEE 請求在 penghu/scheduler.py 排隊時的優先順序。
+    """
+    global _pending
+    with _pending_lock:
+        if _pending >= MAP_WORKERS + MAP_QUEUE:
+            raise QueueFull("地圖請求過多，請稍後再試")
+        _pending += 1
+    try:
+        future = _executor.submit(_run, fetch, key, compute, priority)
+    except BaseException:
+        _release(None)
+        raise
+    # 完成、失敗或取消都會呼叫
+    future.add_done_callback(_release)
+    return future
+
+
+def prefetch(key, compute, fetch=cached_map_html, idle_only=False):
+    """
+    在背景開始 fetch(key, compute) (cached_map_html 或 cached_tiles)，回傳 Future (佇列已滿時回傳 None)。
+    組件之後用同一個 key 取用時會等待這次運算 (單一運算)，所以同一頁的多張地圖可以並行產生。
+    idle_only=True 時只在有空閒執行緒時才送出 (猜測性的預先載入不跟使用者正在等的請求搶位置)；
+    預先載入的 GEE 請求都以 WARM 優先順序排隊。
+    """
+    if idle_only and pending() >= MAP_WORKERS:
+        return None
+    try:
+        return submit(fetch, key, compute, scheduler.WARM)
+    except QueueFull:
+        return None
+
+
+@metrics.register
+def _cache_metrics():
+    samples = []
+    for name, cache in (("map", map_cache), ("tiles", tile_cache)):
+        stats = cache.stats()
+        for field in ("hits", "misses", "evictions", "coalesced"):
+            samples.append((f"penghu_cache_{field}_total", "counter", {"cache": name}, stats[field]))
+        for field in ("entries", "bytes", "inflight"):
+            samples.append((f"penghu_cache_{field}", "gauge", {"cache": name}, stats[field]))
+    samples.append(("penghu_map_queue_free", "gauge", {}, MAP_WORKERS + MAP_QUEUE - pending()))
+    return samples
@@ -0,0 +1,17 @@
+import importlib
+
+# ==========================================
+# 延遲載入 (頁面 import 時不載入 ee / geemap / ipyleaflet)
+# ==========================================
+
+
+class LazyModule:
+    """第一次存取屬性時才 import 真正的模組 (importlib 本身有鎖，多個 session 同時存取也安全)"""
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self):
+        return f"<LazyModule {self._name}>"
@@ -0,0 +1,53 @@
+import ipyleaflet
+import solara
+
+from penghu.config import HYBRID_URL
+
+# ==========================================
+# 即時圖磚地圖 (ipyleaflet)
+# ==========================================
+# iframe srcDoc 模式每次滑桿變動都要把整份 folium HTML 透過 websocket 傳過去，
+# 瀏覽器重新解析後底圖也全部重新載入。這裡改成每個 session 只建立一次 ipyleaflet 地圖，
+# 之後只替換 GEE 圖層的 url (每次只傳幾百 bytes)，使用者的平移 / 縮放也會保留。
+
+
+def _overlay(name, url):
+    return ipyleaflet.TileLayer(url=url or "", name=name, attribution="Google Earth Engine",
+                                max_zoom=24, visible=bool(url))
+
+
+@solara.component
+def LiveTileMap(tiles, center, zoom, height="750px", legend=None, legend_title="棲地類別", split=False, basemap=HYBRID_URL):
+    """
+    tiles: {圖層名稱: GEE 圖磚網址}，順序固定 (例如 [衛星影像, 分類結果] 或 split 時的 [左, 右])。
+    tiles 變動時只更新既有圖層的 url 與名稱，不重建地圖。
+    """
+    n_layers = 2 if split else max(len(tiles), 1)
+
+    def create_map():
+        base = ipyleaflet.TileLayer(url=basemap, name="Google Hybrid", attribution="Google", base=True)
+        m = ipyleaflet.Map(center=center, zoom=zoom, basemap=base, scroll_wheel_zoom=True, layout={"height": height})
+        overlays = [_overlay(f"Layer {i + 1}", None) for i in range(n_layers)]
+        if split:
+            m.add(ipyleaflet.SplitMapControl(left_layer=overlays[0], right_layer=overlays[1]))
+        else:
+            for layer in overlays:
+                m.add(layer)
+        m.add(ipyleaflet.LayersControl(position="topright"))
+        if legend:
+            m.add(ipyleaflet.LegendControl(legend, title=legend_title, position="bottomright"))
+        return m, overlays
+
+    m, overlays = solara.use_memo(create_map, dependencies=[])
+
+    def update_layers():
+        for layer, (name, url) in zip(overlays, tiles.items()):
+            layer.name = name
+            if layer.url != url:
+                layer.url = url
+            layer.visible = True
+        for layer in overlays[len(tiles):]:
+            layer.visible = False
+
+    solara.use_effect(update_layers, [tuple(tiles.items())])
+    solara.display(m)
@@ -0,0 +1,6 @@
+"""
+本機離線運算 (rasterio / numpy)，對應 GEE 上的棲地分類流程。
+
+資料放在 PENGHU_LOCAL_DATA (預設 data/local)，以 catalog.json 描述，
+所有運算都以視窗 (window) 分塊讀寫，記憶體用量固定，不受研究範圍大小影響。
+"""
@@ -0,0 +1,91 @@
+import json
+import os
+import pathlib
+from contextlib import contextmanager
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.vrt import WarpedVRT
+
+from penghu.config import ROOT_DIR
+
+# ==========================================
+# 本機影像目錄 (catalog.json)
+# ==========================================
+# {
+#   "grid": "aca_reef_habitat.tif",            <- 所有運算對齊的網格 (CRS / 解析度 / 範圍)
+#   "aca": "aca_reef_habitat.tif",              <- ACA 棲地原始代碼 (11, 12, ...)
+#   "bathymetry": "bathymetry.tif",             <- 水深 (m)
+#   "scenes": [
+#     {"path": "s2/20200701.tif", "collection": "COPERNICUS/S2_SR_HARMONIZED",
+#      "date": "2020-07-01", "cloud": 5.2, "bands": ["B2", "B3", "B4", "B5", "B8", "SCL"]},
+#     ...
+#   ]
+# }
+# 影像建議存成 Cloud-Optimized GeoTIFF，路徑相對於 catalog.json 所在資料夾。
+
+DATA_DIR = pathlib.Path(os.environ.get("PENGHU_LOCAL_DATA", ROOT_DIR / "data" / "local"))
+
+
+class Catalog:
+    def __init__(self, root=DATA_DIR):
+        self.root = pathlib.Path(root)
+        self.meta = json.loads((self.root / "catalog.json").read_text(encoding='utf-8'))
+        self.grid = self._grid(self.path(self.meta["grid"]))
+
+    def path(self, relative):
+        return self.root / relative
+
+    @staticmethod
+    def _grid(path):
+        with rasterio.open(path) as src:
+            return {
+                "crs": src.crs,
+                "transform": src.transform,
+                "width": src.width,
+                "height": src.height,
+                "res": abs(src.transform.a),
+            }
+
+    def scenes(self, collection_id, start_date, end_date, cloud_max=None):
+        """對應 filterDate(start, end) + filter(CLOUDY_PIXEL_PERCENTAGE < cloud_max)"""
+        found = []
+        for scene in self.meta.get("scenes", []):
+            if scene["collection"] != collection_id:
+                continue
+            if not (start_date <= scene["date"] < end_date):
+                continue
+            if cloud_max is not None and scene.get("cloud", 0) >= cloud_max:
+                continue
+            found.append(scene)
+        return sorted(found, key=lambda s: s["date"])
+
+    @contextmanager
+    def open(self, relative, resampling=Resampling.nearest):
+        """開啟影像並對齊到共用網格 (WarpedVRT，讀取時才重投影，不另存檔)"""
+        with rasterio.open(self.path(relative)) as src:
+            same_grid = (src.crs == self.grid["crs"] and src.transform == self.grid["transform"]
+                         and src.width == self.grid["width"] and src.height == self.grid["height"])
+            if same_grid:
+                yield src
+                return
+            with WarpedVRT(src, crs=self.grid["crs"], transform=self.grid["transform"],
+                           width=self.grid["width"], height=self.grid["height"],
+                           resampling=resampling) as vrt:
+                yield vrt
+
+
+def band_indexes(src, names, fallback=None):
+    """依波段名稱 (GeoTIFF band description 或 catalog 的 bands) 找出 rasterio 的 band index"""
+    descriptions = [d for d in src.descriptions] if any(src.descriptions) else list(fallback or [])
+    try:
+        return [descriptions.index(name) + 1 for name in names]
+    except ValueError:
+        raise KeyError(f"找不到波段 {names}，影像只有 {descriptions}")
+
+
+def read_float(src, indexes, window):
+    """讀取成 float32，nodata 轉成 NaN"""
+    data = src.read(indexes, window=window, masked=True)
+    return np.ma.filled(data.astype('float32'), np.nan)
@@ -0,0 +1,132 @@
+import os
+import pickle
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from penghu.local.raster import MEMORY_MB, NODATA_CLASS, open_output, strips
+
+# ==========================================
+# 多核心分塊分類 (對應 classify(classifier))
+# ==========================================
+# 主程序把合成影像一條一條讀進共享記憶體 (兩塊輪流使用，讀下一條時 worker 仍在算上一條)，
+# 每條再切成 TILE x TILE 的圖塊交給 process pool；worker 直接從共享記憶體取值，
+# 不必 pickle 影像。分類器在每個 worker 啟動時只傳一次。結果依完成順序寫入輸出 GeoTIFF。
+
+WORKERS = int(os.environ.get("PENGHU_LOCAL_WORKERS", 0)) or os.cpu_count() or 1
+TILE = 256
+
+_worker = {"classifier": None, "buffers": {}}
+
+
+def classify_strip(classifier, features, valid):
+    """features: [band, rows, cols]；valid 以外的像素為 NODATA_CLASS"""
+    out = np.full(valid.shape, NODATA_CLASS, dtype='uint8')
+    if valid.any():
+        out[valid] = classifier.predict(features[:, valid].T).astype('uint8')
+    return out
+
+
+def _init_worker(classifier_blob):
+    _worker["classifier"] = pickle.loads(classifier_blob)
+    _worker["buffers"] = {}
+
+
+def _attach(name, shape):
+    if name not in _worker["buffers"]:
+        try:
+            shm = SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13 沒有 track 參數
+            shm = SharedMemory(name=name)
+        _worker["buffers"][name] = (shm, np.ndarray(shape, dtype='float32', buffer=shm.buf))
+    return _worker["buffers"][name][1]
+
+
+def _classify_tile(name, shape, rows, cols):
+    features = _attach(name, shape)[:, rows[0]:rows[1], cols[0]:cols[1]]
+    valid = ~np.isnan(features).any(axis=0)
+    return rows, cols, classify_strip(_worker["classifier"], features, valid)
+
+
+class _Buffer:
+    """一塊 [band, rows, width] float32 的共享記憶體"""
+    def __init__(self, shape):
+        self.shape = shape
+        self.shm = SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+        self.array = np.ndarray(shape, dtype='float32', buffer=self.shm.buf)
+        self.pending = []
+        self.window = None
+
+    def release(self):
+        del self.array
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _tiles(height, width):
+    for r in range(0, height, TILE):
+        for c in range(0, width, TILE):
+            yield (r, min(r + TILE, height)), (c, min(c + TILE, width))
+
+
+def classify_raster(classifier, composite_path, out_path, grid, mask_fn=None, workers=WORKERS, memory_mb=MEMORY_MB):
+    """
+    composite_path: 已對齊網格的特徵影像 (float32，波段順序即分類器的特徵順序)。
+    mask_fn(features, window) -> bool 陣列，False 的像素不分類 (輸出 NODATA_CLASS)。
+    """
+    with rasterio.open(composite_path) as src:
+        bands = src.count
+        # 兩塊共享緩衝區各用一半的記憶體預算
+        windows = list(strips(grid["height"], grid["width"], 4 * bands * 2, memory_mb, min_rows=TILE))
+
+        def read(window):
+            """讀取特徵，遮罩外的像素設為 NaN (worker 只需判斷 NaN)"""
+            features = src.read(window=window, masked=True).filled(np.nan).astype('float32', copy=False)
+            if mask_fn is not None:
+                features[:, ~mask_fn(features, window)] = np.nan
+            return features
+
+        if workers <= 1:
+            with open_output(out_path, grid) as dst:
+                for _, window, _ in windows:
+                    features = read(window)
+                    valid = ~np.isnan(features).any(axis=0)
+                    dst.write(classify_strip(classifier, features, valid), 1, window=window)
+            return out_path
+
+        max_rows = max(w.height for _, w, _ in windows)
+        shape = (bands, max_rows, grid["width"])
+        buffers = [_Buffer(shape), _Buffer(shape)]
+        blob = pickle.dumps(classifier)
+        try:
+            with ProcessPoolExecutor(workers, mp_context=get_context("spawn"),
+                                     initializer=_init_worker, initargs=(blob,)) as pool, \
+                    open_output(out_path, grid) as dst:
+
+                def drain(buffer):
+                    """等這塊緩衝區的圖塊全部算完 (依完成順序寫出)，之後才能重新填入"""
+                    while buffer.pending:
+                        done, _ = wait(buffer.pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            buffer.pending.remove(future)
+                            (r0, r1), (c0, c1), out = future.result()
+                            window = Window(c0, buffer.window.row_off + r0, c1 - c0, r1 - r0)
+                            dst.write(out, 1, window=window)
+
+                for i, (_, window, _) in enumerate(windows):
+                    buffer = buffers[i % 2]
+                    drain(buffer)
+                    buffer.array[:, :window.height, :] = read(window)
+                    buffer.window = window
+                    buffer.pending = [pool.submit(_classify_tile, buffer.shm.name, shape, rows, cols)
+                                      for rows, cols in _tiles(window.height, window.width)]
+                for buffer in buffers:
+                    drain(buffer)
+        finally:
+            for buffer in buffers:
+                buffer.release()
+    return out_path
@@ -0,0 +1,126 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from penghu.local.raster import NODATA_CLASS
+
+# ==========================================
+# 類別圖的眾數濾波 (對應 focal_mode(radius, 'circle', 'meters'))
+# ==========================================
+# 每個類別算出「鄰域內有幾個像素是這個類別」，再逐像素取票數最多的類別。計數有兩種算法：
+#   - 小半徑：圓形核拆成幾條水平帶 (同一條帶內每列的半寬相同)，每個類別建一張積分圖，
+#     每條帶查 4 個角；每個像素的成本與帶數成正比 (帶數隨半徑增加，約為半徑的一半)。
+#   - 帶數超過 FFT_BANDS：以 FFT 卷積計數 (核的頻譜只算一次)，每個像素的成本只跟類別數與
+#     log(圖大小) 有關，不隨半徑增加。計數取整數後與積分圖的結果完全相同。
+# 大圖用 focal_mode_tiled：切成橫條 (上下保留 halo) 交給多執行緒，NumPy / SciPy 運算會釋放 GIL。
+# 頁面的平滑半徑滑桿不在這裡即時運算：滑桿只停在 config.SMOOTHING_RADII，
+# 這些半徑的地圖都由 penghu/warm.py 預先產生。
+
+THREADS = int(os.environ.get("PENGHU_LOCAL_THREADS", 0)) or os.cpu_count() or 1
+FFT_BANDS = int(os.environ.get("PENGHU_FOCAL_FFT_BANDS", 6))
+
+
+def circle_kernel(radius_px):
+    r = int(np.floor(radius_px))
+    y, x = np.ogrid[-r:r + 1, -r:r + 1]
+    return (x * x + y * y <= radius_px * radius_px).astype('uint16')
+
+
+def circle_bands(radius_px):
+    """把圓形核拆成 [(dy 起, dy 迄, 半寬)]，與 circle_kernel 的像素完全相同"""
+    r = int(math.floor(radius_px))
+    bands = []
+    for dy in range(-r, r + 1):
+        w = int(math.floor(math.sqrt(max(radius_px * radius_px - dy * dy, 0))))
+        if bands and bands[-1][2] == w:
+            bands[-1][1] = dy
+        else:
+            bands.append([dy, dy, w])
+    return [tuple(b) for b in bands]
+
+
+def _integral(mask, pad):
+    """補 pad 圈 0 之後的積分圖，多一列一行 0 方便查表"""
+    h, w = mask.shape
+    table = np.zeros((h + 2 * pad + 1, w + 2 * pad + 1), dtype='int32')
+    table[pad + 1:pad + 1 + h, pad + 1:pad + 1 + w] = mask
+    np.cumsum(table, axis=0, out=table)
+    np.cumsum(table, axis=1, out=table)
+    return table
+
+
+def _band_counts(classes, radius_px, n_classes):
+    """依序產生每個類別的鄰域計數 (積分圖 + 水平帶)"""
+    h, w = classes.shape
+    pad = int(math.floor(radius_px))
+    bands = circle_bands(radius_px)
+    count = np.empty(classes.shape, dtype='int32')
+    for c in range(n_classes):
+        table = _integral(classes == c, pad)
+        count.fill(0)
+        for dy0, dy1, half in bands:
+            top, bottom = pad + dy0, pad + dy1 + 1
+            left, right = pad - half, pad + half + 1
+            count += table[bottom:bottom + h, right:right + w]
+            count -= table[top:top + h, right:right + w]
+            count -= table[bottom:bottom + h, left:left + w]
+            count += table[top:top + h, left:left + w]
+        yield count
+
+
+def _fft_counts(classes, radius_px, n_classes):
+    """依序產生每個類別的鄰域計數 (FFT 卷積，核的頻譜只算一次)"""
+    from scipy import fft
+
+    h, w = classes.shape
+    kernel = circle_kernel(radius_px).astype('float64')
+    pad = kernel.shape[0] // 2
+    shape = (fft.next_fast_len(h + 2 * pad, real=True), fft.next_fast_len(w + 2 * pad, real=True))
+    kernel_spectrum = fft.rfft2(kernel, shape)
+    for c in range(n_classes):
+        mask = classes == c
+        if not mask.any():
+            yield np.zeros(classes.shape, dtype='int32')
+            continue
+        full = fft.irfft2(fft.rfft2(mask.astype('float64'), shape) * kernel_spectrum, shape)
+        yield np.rint(full[pad:pad + h, pad:pad + w]).astype('int32')
+
+
+def focal_mode(classes, radius_px, n_classes=7, nodata=NODATA_CLASS):
+    """
+    classes: uint8 類別圖 (0 ~ n_classes-1，nodata 為遮罩)。
+    與 GEE 相同，遮罩像素不參與計數；只要鄰域內有有效像素，輸出就有值。
+    票數相同時取代碼較小的類別。
+    """
+    if radius_px < 1:
+        return classes
+    counts = _fft_counts if len(circle_bands(radius_px)) > FFT_BANDS else _band_counts
+    best = np.zeros(classes.shape, dtype='uint8')
+    best_count = np.zeros(classes.shape, dtype='int32')
+    for c, count in enumerate(counts(classes, radius_px, n_classes)):
+        better = count > best_count
+        best[better] = c
+        best_count[better] = count[better]
+    best[best_count == 0] = nodata
+    return best
+
+
+def focal_mode_tiled(classes, radius_px, n_classes=7, nodata=NODATA_CLASS, threads=THREADS, tile_rows=512):
+    """同 focal_mode，但切成橫條平行計算 (每條上下多讀半徑大小的 halo，結果沒有接縫)"""
+    height = classes.shape[0]
+    if radius_px < 1 or threads <= 1 or height <= tile_rows:
+        return focal_mode(classes, radius_px, n_classes, nodata)
+    halo = int(math.ceil(radius_px))
+    out = np.empty_like(classes)
+
+    def run(row):
+        n = min(tile_rows, height - row)
+        top, bottom = max(row - halo, 0), min(row + n + halo, height)
+        result = focal_mode(classes[top:bottom], radius_px, n_classes, nodata)
+        out[row:row + n] = result[row - top:row - top + n]
+
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(run, range(0, height, tile_rows)))
+    return out
@@ -0,0 +1,303 @@
+"""
+本機版的棲地分類 / SST / NDCI 流程 (對應 penghu/maps.py 在 GEE 上做的事)。
+
+    python -m penghu.local.pipeline benthic 2020 --period 夏季平均 --radius 30
+    python -m penghu.local.pipeline benthic $(seq 2016 2025) --workers 8
+    python -m penghu.local.pipeline sst 2020 --type 夏季均溫
+    python -m penghu.local.pipeline ndci 2020
+
+結果是對齊 catalog 網格的 GeoTIFF，存在 .cache/local，已存在就直接使用。
+"""
+import argparse
+import hashlib
+import json
+import math
+import sys
+import threading
+from contextlib import ExitStack
+
+import numpy as np
+import rasterio
+
+from penghu import depth
+from penghu.config import ACA_CLASSES, CACHE_DIR, S2_BANDS, SYSTEM_CLASSES, period_dates, s2_collection_id
+from penghu.local import focal
+from penghu.local.classify import WORKERS, classify_raster
+from penghu.local.catalog import Catalog, band_indexes, read_float
+from penghu.local.raster import (MEMORY_MB, nanmedian_stack, normalized_difference,
+                                 open_output, remap, strips)
+
+OUT_DIR = CACHE_DIR / "local"
+SEED = 42
+
+_classifiers = {}
+_lock = threading.Lock()
+
+
+# ==========================================
+# 1. 影像合成 (ImageCollection.median)
+# ==========================================
+def _scene_stack(scenes, names, window, stack_out, scene_mask=None):
+    """把每張影像在 window 內的指定波段讀進 stack_out[i]，scene_mask 回傳 False 的像素設為 NaN"""
+    for i, (scene, src) in enumerate(scenes):
+        all_names = list(names)
+        extra = [n for n in (scene_mask.bands if scene_mask else []) if n not in all_names]
+        data = read_float(src, band_indexes(src, all_names + extra, scene.get("bands")), window)
+        if scene_mask is not None:
+            valid = scene_mask(dict(zip(all_names + extra, data)))
+            data[:, ~valid] = np.nan
+        stack_out[i] = data[:len(names)]
+
+
+def composite_strips(catalog, collection_id, start_date, end_date, cloud_max, bands,
+                     memory_mb=MEMORY_MB, halo=0, scene_mask=None, scale=1.0, offset=0.0):
+    """
+    逐條產生 (讀取視窗, 輸出視窗, keep slice, 中位數合成 [band, rows, cols])。
+    記憶體：每條 = 影像數 x 波段數 x 列數 x 寬 x 4 bytes，不超過 memory_mb。
+    """
+    scenes = catalog.scenes(collection_id, start_date, end_date, cloud_max)
+    if not scenes:
+        raise ValueError(f"{collection_id} 在 {start_date} ~ {end_date} 沒有符合條件的影像")
+    grid = catalog.grid
+    bytes_per_pixel = 4 * (len(scenes) + 1) * len(bands)
+
+    with ExitStack() as stack:
+        opened = [(scene, stack.enter_context(catalog.open(scene["path"]))) for scene in scenes]
+        for read, write, keep in strips(grid["height"], grid["width"], bytes_per_pixel, memory_mb, halo):
+            data = np.empty((len(scenes), len(bands), read.height, read.width), dtype='float32')
+            _scene_stack(opened, bands, read, data, scene_mask)
+            median = nanmedian_stack(data)
+            if scale != 1.0 or offset != 0.0:
+                median = median * scale + offset
+            yield read, write, keep, median
+
+
+class SceneMask:
+    """依影像本身的波段決定有效像素 (例如 SCL == 6 水體)"""
+    def __init__(self, bands, func):
+        self.bands = bands
+        self.func = func
+
+    def __call__(self, data):
+        return self.func(data)
+
+
+WATER_SCL = SceneMask(["SCL"], lambda d: d["SCL"] == 6)
+
+
+def write_composite(catalog, out_path, collection_id, start_date, end_date, cloud_max, bands, memory_mb=MEMORY_MB, **kwargs):
+    if out_path.exists():
+        return out_path
+    tmp_path = out_path.with_suffix('.tmp.tif')
+    with open_output(tmp_path, catalog.grid, count=len(bands), dtype='float32', nodata=float('nan')) as dst:
+        for i, name in enumerate(bands):
+            dst.set_band_description(i + 1, name)
+        for read, write, keep, median in composite_strips(catalog, collection_id, start_date, end_date,
+                                                          cloud_max, bands, memory_mb, **kwargs):
+            dst.write(median[:, keep, :], window=write)
+    tmp_path.replace(out_path)
+    return out_path
+
+
+# ==========================================
+# 2. 遮罩 (NDWI 水體 + 水深，見 penghu/depth.py)
+# ==========================================
+def depth_mask(catalog, window, lo=None, hi=None):
+    """
+    對應 depth.lt(hi).And(depth.gt(lo))，讀 depth.local_mask 預先算好的 uint8 遮罩；
+    catalog 沒有水深圖 (也沒有下載的 GEE 遮罩) 時全部有效 (同 GEE 的 ee.Image(1))
+    """
+    path = depth.local_mask(catalog, lo, hi)
+    if path is None:
+        return np.ones((window.height, window.width), dtype=bool)
+    with rasterio.open(path) as src:
+        return src.read(1, window=window) == 1
+
+
+def water_mask(features, catalog, window):
+    """features 的波段順序為 S2_BANDS (B2, B3, B4, B8)"""
+    ndwi = normalized_difference(features[1], features[3])
+    return (ndwi > 0.1) & depth_mask(catalog, window)
+
+
+def aca_labels(catalog, window):
+    with catalog.open(catalog.meta["aca"]) as src:
+        raw = src.read(1, window=window, masked=True)
+    values = np.ma.filled(raw, 0).astype('int64')
+    return remap(values, ACA_CLASSES, SYSTEM_CLASSES, default=0, nodata=None)
+
+
+# ==========================================
+# 3. 訓練樣本與分類器 (stratifiedSample + smileRandomForest)
+# ==========================================
+def stratified_sample(catalog, collection_id, num_points=1000, train_dates=('2018-01-01', '2018-12-31'),
+                      cloud_max=20, memory_mb=MEMORY_MB, seed=SEED):
+    """
+    每個類別最多抽 num_points 個像素 (逐條以 reservoir sampling 進行，記憶體固定)。
+    回傳 (features [n, 4], labels [n])。
+    """
+    rng = np.random.default_rng(seed)
+    radius_px = max(1, round(10 / catalog.grid["res"]))
+    pools = {}
+    for read, write, keep, median in composite_strips(catalog, collection_id, train_dates[0], train_dates[1],
+                                                      cloud_max, S2_BANDS, memory_mb, halo=radius_px):
+        mask = water_mask(median, catalog, read).astype('uint8')
+        mask = focal.focal_mode(mask, radius_px, n_classes=2) == 1
+        mask &= ~np.isnan(median).any(axis=0)
+        mask, features = mask[keep], median[:, keep, :]
+        labels = aca_labels(catalog, write)
+        for c in np.unique(labels[mask]):
+            idx = np.flatnonzero(mask & (labels == c))
+            keys = rng.random(idx.size)
+            pool_keys, pool_x = pools.get(int(c), (np.empty(0), np.empty((0, len(S2_BANDS)), 'float32')))
+            x = features[:, idx // features.shape[2], idx % features.shape[2]].T
+            all_keys = np.concatenate([pool_keys, keys])
+            all_x = np.concatenate([pool_x, x])
+            top = np.argsort(all_keys)[:num_points]
+            pools[int(c)] = (all_keys[top], all_x[top])
+
+    features = np.concatenate([x for _, x in pools.values()]) if pools else np.empty((0, len(S2_BANDS)))
+    labels = np.concatenate([np.full(len(x), c, 'uint8') for c, (_, x) in pools.items()]) if pools else np.empty(0, 'uint8')
+    return features, labels
+
+
+def _samples_path(key):
+    digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()[:16]
+    return CACHE_DIR / "training" / f"local_{digest}.npz"
+
+
+def get_classifier(catalog, collection_id, n_trees=50, num_points=1000,
+                   train_dates=('2018-01-01', '2018-12-31'), cloud_max=20, seed=SEED):
+    """本機版的共用分類器 (與 penghu/classifier.py 相同的 key 概念)，樣本存成 .npz"""
+    from sklearn.ensemble import RandomForestClassifier
+
+    key = (str(catalog.root), collection_id, n_trees, num_points, list(train_dates), cloud_max, seed)
+    cache_key = json.dumps(key)
+    with _lock:
+        if cache_key in _classifiers:
+            return _classifiers[cache_key]
+
+        path = _samples_path(key)
+        if path.exists():
+            saved = np.load(path)
+            features, labels = saved["features"], saved["labels"]
+        else:
+            features, labels = stratified_sample(catalog, collection_id, num_points, train_dates, cloud_max, seed=seed)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            np.savez(path, features=features, labels=labels)
+        if len(labels) == 0:
+            raise ValueError("訓練樣本為空 (檢查 2018 影像與 ACA 圖層是否重疊)")
+
+        classifier = RandomForestClassifier(n_estimators=n_trees, random_state=seed, n_jobs=1)
+        classifier.fit(features, labels)
+        _classifiers[cache_key] = classifier
+        return classifier
+
+
+# ==========================================
+# 4. 分類與平滑
+# ==========================================
+def smooth_raster(catalog, in_path, out_path, radius_m, memory_mb=MEMORY_MB):
+    """focal_mode(radius, 'circle', 'meters')，分條處理並保留 halo 避免接縫"""
+    import rasterio
+
+    radius_px = radius_m / catalog.grid["res"]
+    halo = int(math.ceil(radius_px))
+    grid = catalog.grid
+    with rasterio.open(in_path) as src, open_output(out_path, grid) as dst:
+        # 每像素約需積分圖與計數 (int32) + 輸入輸出，每個執行緒各一份
+        bytes_per_pixel = 16 * max(focal.THREADS, 1)
+        for read, write, keep in strips(grid["height"], grid["width"], bytes_per_pixel, memory_mb, halo):
+            classes = src.read(1, window=read)
+            dst.write(focal.focal_mode_tiled(classes, radius_px)[keep], 1, window=write)
+    return out_path
+
+
+def benthic_path(year, start_date, end_date, radius):
+    return OUT_DIR / f"benthic_{year}_{start_date}_{end_date}_r{radius}.tif"
+
+
+def benthic_classification(year, start_date, end_date, radius, catalog=None, memory_mb=MEMORY_MB, workers=WORKERS):
+    """回傳分類結果 GeoTIFF 路徑 (uint8，0~6，255 為遮罩)"""
+    catalog = catalog or Catalog()
+    collection_id = s2_collection_id(year)
+    out_path = benthic_path(year, start_date, end_date, radius)
+    if out_path.exists():
+        return out_path
+
+    raw_path = benthic_path(year, start_date, end_date, 0)
+    if not raw_path.exists():
+        classifier = get_classifier(catalog, collection_id)
+        composite_path = write_composite(catalog, OUT_DIR / f"s2_{year}_{start_date}_{end_date}.tif",
+                                         collection_id, start_date, end_date, 20, S2_BANDS, memory_mb)
+        tmp_path = raw_path.with_suffix('.tmp.tif')
+        classify_raster(classifier, composite_path, tmp_path, catalog.grid,
+                        mask_fn=lambda features, window: water_mask(features, catalog, window),
+                        workers=workers, memory_mb=memory_mb)
+        tmp_path.replace(raw_path)
+
+    if radius <= 0:
+        return raw_path
+    tmp_path = out_path.with_suffix('.tmp.tif')
+    smooth_raster(catalog, raw_path, tmp_path, radius, memory_mb)
+    tmp_path.replace(out_path)
+    return out_path
+
+
+# ==========================================
+# 5. SST 與 NDCI
+# ==========================================
+def sst_composite(year, period_type, catalog=None, memory_mb=MEMORY_MB):
+    catalog = catalog or Catalog()
+    start, end = (f'{year}-06-01', f'{year}-09-30') if period_type == "夏季均溫" else (f'{year}-01-01', f'{year}-12-31')
+    out_path = OUT_DIR / f"sst_{year}_{start}_{end}.tif"
+    if year < 2018:
+        return write_composite(catalog, out_path, "NASA/OCEANDATA/MODIS-Aqua/L3SMI", start, end, None, ['sst'], memory_mb)
+    # GCOM-C SST_AVE 的 scale / offset 與 GEE 版相同
+    return write_composite(catalog, out_path, "JAXA/GCOM-C/L3/OCEAN/SST/V3", start, end, None, ['SST_AVE'],
+                           memory_mb, scale=0.0012, offset=-10)
+
+
+def ndci_composite(year, catalog=None, memory_mb=MEMORY_MB):
+    catalog = catalog or Catalog()
+    start, end = f'{year}-05-01', f'{year}-09-30'
+    out_path = OUT_DIR / f"ndci_{year}.tif"
+    if out_path.exists():
+        return out_path
+    tmp_path = out_path.with_suffix('.tmp.tif')
+    scene_mask = WATER_SCL if year >= 2019 else None
+    with open_output(tmp_path, catalog.grid, dtype='float32', nodata=float('nan')) as dst:
+        dst.set_band_description(1, 'NDCI')
+        for read, write, keep, median in composite_strips(catalog, s2_collection_id(year), start, end, 20,
+                                                          ['B5', 'B4'], memory_mb, scene_mask=scene_mask, scale=1 / 10000):
+            dst.write(normalized_difference(median[0], median[1]).astype('float32'), 1, window=write)
+    tmp_path.replace(out_path)
+    return out_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本機 (離線) 版棲地分類 / SST / NDCI")
+    parser.add_argument("product", choices=["benthic", "sst", "ndci"])
+    parser.add_argument("years", type=int, nargs="+", help="可一次指定多個年份，例如 $(seq 2016 2025)")
+    parser.add_argument("--period", default="夏季平均", help="benthic：夏季平均 / 全年平均")
+    parser.add_argument("--radius", type=int, default=30, help="benthic：平滑半徑 (m)")
+    parser.add_argument("--type", default="夏季均溫", help="sst：夏季均溫 / 全年平均")
+    parser.add_argument("--memory-mb", type=float, default=MEMORY_MB)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="benthic：分類用的 process 數")
+    args = parser.parse_args(argv)
+
+    catalog = Catalog()
+    for year in args.years:
+        if args.product == "benthic":
+            start, end = period_dates(year, args.period)
+            path = benthic_classification(year, start, end, args.radius, catalog, args.memory_mb, args.workers)
+        elif args.product == "sst":
+            path = sst_composite(year, args.type, catalog, args.memory_mb)
+        else:
+            path = ndci_composite(year, catalog, args.memory_mb)
+        print(f"✅ {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+# ==========================================
+# 分塊讀寫與基本波段運算
+# ==========================================
+# 預設每個運算步驟最多用 PENGHU_LOCAL_MEMORY_MB 的記憶體 (依此決定每塊的列數)
+
+MEMORY_MB = float(os.environ.get("PENGHU_LOCAL_MEMORY_MB", 256))
+NODATA_CLASS = 255
+
+
+def strips(height, width, bytes_per_pixel, memory_mb=MEMORY_MB, halo=0, min_rows=16):
+    """
+    把 height x width 的網格切成整列寬的橫條，每條 (含上下 halo) 不超過 memory_mb。
+    產生 (讀取視窗, 輸出視窗, 裁掉 halo 用的 slice)。
+    """
+    budget = memory_mb * 1024 * 1024
+    rows = int(budget // max(bytes_per_pixel * width, 1)) - 2 * halo
+    rows = max(min_rows, min(rows, height))
+    for row in range(0, height, rows):
+        n = min(rows, height - row)
+        top = max(row - halo, 0)
+        bottom = min(row + n + halo, height)
+        read = Window(0, top, width, bottom - top)
+        write = Window(0, row, width, n)
+        yield read, write, slice(row - top, row - top + n)
+
+
+def profile(grid, count=1, dtype='uint8', nodata=NODATA_CLASS):
+    return {
+        "driver": "GTiff",
+        "crs": grid["crs"],
+        "transform": grid["transform"],
+        "width": grid["width"],
+        "height": grid["height"],
+        "count": count,
+        "dtype": dtype,
+        "nodata": nodata,
+        "tiled": True,
+        "blockxsize": 256,
+        "blockysize": 256,
+        "compress": "deflate",
+    }
+
+
+def open_output(path, grid, **kwargs):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return rasterio.open(path, "w", **profile(grid, **kwargs))
+
+
+def normalized_difference(a, b):
+    """(a - b) / (a + b)，對應 ee.Image.normalizedDifference"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (a - b) / (a + b)
+
+
+def remap(values, from_values, to_values, default=0, nodata=NODATA_CLASS):
+    """查表 remap (對應 ee.Image.remap)，values 必須是非負整數"""
+    lut = np.full(max(max(from_values), int(values.max(initial=0))) + 1, default, dtype='uint8')
+    lut[list(from_values)] = to_values
+    if nodata is not None and nodata < len(lut):
+        lut[nodata] = nodata
+    return lut[values]
+
+
+def nanmedian_stack(stack):
+    """時間方向的中位數 (對應 ImageCollection.median)，全部是 NaN 的像素結果為 NaN"""
+    if stack.shape[0] == 0:
+        raise ValueError("沒有符合條件的影像")
+    if stack.shape[0] == 1:
+        return stack[0]
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmedian(stack, axis=0)
+
+
+def open_dataarray(path, chunks=1024):
+    """用 rioxarray 以 dask 分塊方式開啟輸出結果 (統計或分析用)"""
+    import rioxarray
+
+    return rioxarray.open_rasterio(path, chunks={"x": chunks, "y": chunks}, masked=True)
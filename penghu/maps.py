@@ -0,0 +1,211 @@
+import folium
+import geemap.foliumap as geemap
+
+from penghu import gee, mapstore, metrics, scheduler, zones
+from penghu.classifier import get_classifier
+from penghu.config import CLASS_LABELS, CLASS_LEGEND, CLASS_PALETTE, HYBRID_URL, ROI_CENTER, S2_BANDS, period_dates, s2_collection_id
+from penghu.htmlcache import MapCache
+from penghu.render import map_to_html
+
+# ==========================================
+# 地圖產生 (頁面組件與預先渲染 warm 共用)
+# ==========================================
+# *_tiles() 只回傳各圖層的 GEE 圖磚網址 {圖層名稱: 網址} (依加入地圖的順序)，
+# 給即時圖磚模式 (penghu/livemap.py) 使用；*_map_html() 用同樣的網址組成完整的 folium 地圖，
+# 傳入 tiles={} 時會順便記下這些網址 (warm 存檔用)。
+
+CLASS_VIS = {'min': 0, 'max': 6, 'palette': CLASS_PALETTE}
+SST_VIS = {"min": 25, "max": 33, "palette": ['000000', '005aff', '43c8c8', 'fff700', 'ff0000']}
+NDCI_VIS = {'min': -0.05, 'max': 0.15, 'palette': ['#0011ff', '#00ffff', '#00ff00', '#ffff00', '#ff0000']}
+
+RGB_VIS = {'min': 0, 'max': 3000, 'bands': ['B4', 'B3', 'B2']}
+
+
+def tile_url(ee_object, vis):
+    # getMapId 要等 GEE 回應，是畫地圖最慢的一步 (經過共用排程，見 penghu/scheduler.py)
+    with metrics.span("tile_url"):
+        return scheduler.call(lambda: geemap.ee_tile_layer(ee_object, vis).url_format, name="getMapId")
+
+
+def _tile_layer(name, url):
+    # 與 geemap.ee_tile_layer 相同的設定，只是直接使用已經取得的網址
+    return folium.raster_layers.TileLayer(
+        tiles=url, attr="Google Earth Engine", name=name,
+        overlay=True, control=True, max_zoom=24
+    )
+
+
+def _add_layers(m, layer_urls, tiles=None):
+    for name, url in layer_urls.items():
+        _tile_layer(name, url).add_to(m)
+    if tiles is not None:
+        tiles.update(layer_urls)
+
+
+def _split_layers(m, layer_urls, tiles=None):
+    (left_name, left_url), (right_name, right_url) = layer_urls.items()
+    m.split_map(_tile_layer(left_name, left_url), _tile_layer(right_name, right_url))
+    if tiles is not None:
+        tiles.update(layer_urls)
+
+
+# ==========================================
+# 1. 底棲棲地分類 (01_benthic)
+# ==========================================
+def classify_benthic(year, start_date, end_date, radius):
+    """回傳 (目標年份中位數影像, 分類結果)"""
+    with metrics.span("ee_graph", product="benthic", year=year, start=start_date, end=end_date, radius=radius):
+        region = gee.roi()
+        collection_id = s2_collection_id(year)
+        depth_mask = gee.depth_mask(region)
+
+        # 2018 訓練資料固定，整個程序共用同一個分類器，不必每次重新訓練
+        classifier = get_classifier(collection_id, n_trees=50)
+
+        target_img = gee.s2_median(collection_id, start_date, end_date, 20, region)
+        target_ndwi_mask = target_img.normalizedDifference(['B3', 'B8']).gt(0.1).And(depth_mask)
+        classified = target_img.updateMask(target_ndwi_mask).classify(classifier)
+
+        if radius > 0:
+            classified = classified.focal_mode(radius=radius, kernelType='circle', units='meters')
+    return target_img, classified
+
+
+def benthic_tiles(year, period, radius):
+    # 資料源說明 (解決 2016-2018 No bands 問題)
+    if year >= 2019:
+        dataset_label = "Sentinel-2 SR (大氣校正)"
+    else:
+        dataset_label = "Sentinel-2 TOA (頂層大氣)"
+
+    start_date, end_date = period_dates(year, period)
+    target_img, classified = classify_benthic(year, start_date, end_date, radius)
+    return {
+        f"{year} 衛星影像 ({dataset_label})": tile_url(target_img, RGB_VIS),
+        f"{year} AI分類結果": tile_url(classified, CLASS_VIS),
+    }
+
+
+def benthic_map_html(year, period, radius, tiles=None):
+    m = geemap.Map(center=ROI_CENTER, zoom=11)
+    m.add_basemap("HYBRID")
+
+    if not gee.is_initialized():
+        return map_to_html(m)
+
+    try:
+        # 時間設定、水深遮罩、共用分類器、平滑，再以 ACA 圖片配色顯示
+        _add_layers(m, benthic_tiles(year, period, radius), tiles)
+
+        # Legend 順序對應 CLASS_PALETTE
+        m.add_legend(title="棲地類別", labels=CLASS_LABELS, colors=CLASS_PALETTE)
+
+    except Exception as e:
+        return f"<div style='color:red'>分類運算錯誤: {str(e)}<br>建議：請切換至其他年份試試。</div>"
+
+    return map_to_html(m)
+
+
+# ==========================================
+# 2. 危害因子 (02_crisis)
+# ==========================================
+# 每年的棲地分類圖層網址 (SST 與 NDCI 兩張分割地圖的右半邊共用)：
+# 同一年只分類、取 map id 一次，同時要求時等待同一次運算；網址會過期，與 warm 相同以 MAX_AGE 為限
+benthic_layers = MapCache(max_bytes=1024 * 1024, ttl=mapstore.MAX_AGE)
+
+
+def benthic_layer_url(year):
+    # 夏季、平滑半徑 30 m
+    def compute():
+        _, classified = classify_benthic(year, f'{year}-06-01', f'{year}-09-30', 30)
+        return tile_url(classified, CLASS_VIS)
+
+    return benthic_layers.get_or_compute(year, compute, cache_if=bool)
+
+
+@metrics.timed("ee_graph")
+def sst_image(year, period_type):
+    start, end = (f'{year}-06-01', f'{year}-09-30') if period_type == "夏季均溫" else (f'{year}-01-01', f'{year}-12-31')
+    return gee.sst_image(year, start, end)
+
+
+@metrics.timed("ee_graph")
+def ndci_image(year):
+    return gee.ndci_image(year, f'{year}-05-01', f'{year}-09-30')
+
+
+def sst_tiles(year, period_type):
+    return {
+        f'{year} 海溫': tile_url(sst_image(year, period_type), SST_VIS),
+        f'{year} 棲地分類': benthic_layer_url(year),
+    }
+
+
+def ndci_tiles(year):
+    return {
+        f'{year} NDCI': tile_url(ndci_image(year), NDCI_VIS),
+        f'{year} 棲地分類': benthic_layer_url(year),
+    }
+
+
+def sst_map_html(year, period_type, tiles=None):
+    m = geemap.Map(center=ROI_CENTER, zoom=10)
+    if not gee.is_initialized():
+        return map_to_html(m)
+
+    try:
+        _split_layers(m, sst_tiles(year, period_type), tiles)
+        m.add_colorbar(SST_VIS, label="海面溫度 (°C)", layer_name="SST")
+        m.add_legend(title="棲地類別", labels=CLASS_LABELS[1:], colors=CLASS_PALETTE[1:])
+    except Exception as e:
+        return f"<div>SST 地圖載入失敗: {e}</div>"
+    return map_to_html(m)
+
+
+def ndci_map_html(year, tiles=None):
+    m = geemap.Map(center=ROI_CENTER, zoom=11)
+    if not gee.is_initialized():
+        return map_to_html(m)
+
+    try:
+        _split_layers(m, ndci_tiles(year), tiles)
+        m.add_colorbar(NDCI_VIS, label="NDCI (優養化)", layer_name="NDCI")
+        m.add_legend(title="棲地類別", labels=CLASS_LABELS[1:], colors=CLASS_PALETTE[1:])
+    except Exception:
+        pass
+    return map_to_html(m)
+
+
+def starfish_map_html(tiles=None):
+    m = geemap.Map(center=[23.25, 119.55], zoom=11)
+    m.add_basemap("HYBRID")
+    # 外框直接用預先簡化的 GeoJSON 畫 (見 penghu/zones.py)，GEE 還沒連上也能顯示
+    folium.GeoJson(zones.geojson(zones.ALERT_KIND, 11), name="海星爆發警戒區",
+                   style_function=lambda _: zones.STYLES[zones.ALERT_KIND],
+                   tooltip=folium.GeoJsonTooltip(["name"], labels=False)).add_to(m)
+    if not gee.is_initialized():
+        return map_to_html(m)
+
+    outbreak_fc = zones.ee_collection()
+
+    try:
+        s2 = gee.s2_median("COPERNICUS/S2_SR_HARMONIZED", '2024-05-01', '2024-09-30', 10, bands=None)
+
+        # 以 2024 影像本身訓練 (不套水深遮罩)，同樣放進共用分類器快取
+        classifier = get_classifier("COPERNICUS/S2_SR_HARMONIZED", n_trees=30,
+                                    train_dates=('2024-05-01', '2024-09-30'), cloud_max=10, water_mask=False)
+        classified = s2.select(S2_BANDS).classify(classifier)
+
+        # 只顯示「珊瑚/藻類 (Class 5)」
+        coral_mask = classified.eq(5)
+        zone_coral = classified.updateMask(coral_mask).clipToCollection(outbreak_fc)
+
+        _add_layers(m, {
+            "警戒區內珊瑚/藻類": tile_url(zone_coral, {'palette': ['#ff6161']}),
+        }, tiles)
+        m.add_legend(title="圖層說明", labels=["海星警戒區", "珊瑚/藻類 (食物來源)"], colors=["#FF0000", "#FF6161"])
+
+    except Exception:
+        pass
+
+    return map_to_html(m)
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from penghu.config import CACHE_DIR
+
+# ==========================================
+# 預先渲染的地圖 (硬碟)
+# ==========================================
+# warm 工作把每個滑桿狀態的地圖 HTML 與圖磚網址存在這裡，
+# 伺服器在記憶體快取沒有時先來這裡找，第一位訪客就不必等 GEE。
+# GEE 的圖磚網址 (map id) 會過期，所以超過 MAX_AGE 的項目視為過期。
+
+MAPS_DIR = CACHE_DIR / "maps"
+MAX_AGE = float(os.environ.get("PENGHU_WARM_MAX_AGE_H", 12)) * 3600
+
+_lock = threading.Lock()
+
+
+def key_name(key):
+    return hashlib.sha1(json.dumps(list(key), ensure_ascii=False).encode('utf-8')).hexdigest()[:20]
+
+
+def _manifest_path(root):
+    return root / "manifest.json"
+
+
+def read_manifest(root=MAPS_DIR):
+    try:
+        return json.loads(_manifest_path(root).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def is_fresh(entry, root=MAPS_DIR, max_age=MAX_AGE):
+    if not entry or time.time() - entry.get("rendered_at", 0) > max_age:
+        return False
+    return (root / entry["file"]).exists()
+
+
+def save(key, html, tiles=None, seconds=None, root=MAPS_DIR):
+    """存一張地圖並更新 manifest (先寫暫存檔再 replace，中斷也不會留下半個檔案)"""
+    name = key_name(key)
+    root.mkdir(parents=True, exist_ok=True)
+    tmp_path = root / f"{name}.html.tmp"
+    tmp_path.write_text(html, encoding='utf-8')
+    tmp_path.replace(root / f"{name}.html")
+
+    with _lock:
+        manifest = read_manifest(root)
+        manifest[name] = {
+            "key": list(key),
+            "file": f"{name}.html",
+            "tiles": tiles or {},
+            "rendered_at": time.time(),
+            "seconds": seconds,
+        }
+        tmp_manifest = root / "manifest.json.tmp"
+        tmp_manifest.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding='utf-8')
+        tmp_manifest.replace(_manifest_path(root))
+
+
+def load(key, root=MAPS_DIR, max_age=MAX_AGE):
+    """回傳仍在有效期限內的地圖 HTML，沒有就回傳 None"""
+    entry = read_manifest(root).get(key_name(key))
+    if not is_fresh(entry, root, max_age):
+        return None
+    try:
+        return (root / entry["file"]).read_text(encoding='utf-8')
+    except OSError:
+        return None
+
+
+def tiles(key, root=MAPS_DIR, max_age=MAX_AGE):
+    entry = read_manifest(root).get(key_name(key))
+    return entry["tiles"] if is_fresh(entry, root, max_age) else None
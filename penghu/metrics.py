@@ -0,0 +1,226 @@
+"""
+熱點計時與 Prometheus 格式的 /metrics。
+
+    with metrics.span("ee_graph", product="sst", year=2024):
+        ...
+
+每個 span 依 (名稱, 頁面) 累計到固定分桶的直方圖；參數 (年份、半徑…) 不放進標籤
+(組合太多)，只寫進選用的逐筆追蹤紀錄 PENGHU_TRACE_LOG (JSON lines)。
+巢狀的 span 沿用外層的頁面 (contextvars)，例如地圖快取的 span 標了頁面，
+裡面的 GEE 運算、分類器訓練、HTML 輸出都算在同一頁。
+
+頁面 import 時呼叫 install()，在 Solara 的 Starlette app 上加一條 /metrics；
+另外設定 PENGHU_METRICS_PORT 時也在獨立的埠提供同樣內容。
+PENGHU_METRICS=0 時 span() 直接回傳共用的空 context，幾乎沒有額外開銷。
+"""
+import bisect
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from penghu.config import env_flag
+
+ENABLED = env_flag("PENGHU_METRICS", True)
+TRACE_LOG = os.environ.get("PENGHU_TRACE_LOG")
+PORT = int(os.environ.get("PENGHU_METRICS_PORT", 0))
+PATH = "/metrics"
+
+# 直方圖分桶上限 (秒)：GEE 圖層幾秒到幾十秒，HTML 輸出與 plotly 圖表在毫秒等級
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_page = contextvars.ContextVar("penghu_metrics_page", default=None)
+_lock = threading.Lock()
+# {(名稱, 頁面): [各分桶次數..., +Inf 次數, 總秒數, 錯誤次數]}
+_histograms = {}
+_collectors = []
+_trace_lock = threading.Lock()
+_installed = False
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def observe(name, seconds, page=None, error=False):
+    """直接記一筆耗時 (不經 span)"""
+    key = (name, page or "")
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0, 0]
+        counts[index] += 1
+        counts[-2] += seconds
+        if error:
+            counts[-1] += 1
+
+
+def _trace(record):
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _trace_lock:
+        with open(TRACE_LOG, "a", encoding='utf-8') as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def _span(name, page, params):
+    token = _page.set(page) if page else None
+    page = page or _page.get()
+    error = None
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        if token is not None:
+            _page.reset(token)
+        observe(name, seconds, page, error is not None)
+        if TRACE_LOG:
+            _trace({"ts": time.time(), "span": name, "page": page, "params": params, "seconds": round(seconds, 6),
+                    "thread": threading.current_thread().name, "error": error})
+
+
+def span(name, page=None, **params):
+    """計時區塊；page 不給時沿用外層 span 的頁面"""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _span(name, page, params)
+
+
+def timed(name, page=None):
+    """裝飾器版的 span；呼叫參數記進追蹤紀錄 (位置參數放在 args)"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _span(name, page, dict(kwargs, args=args) if args else kwargs):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register(collector):
+    """登記額外的量測值來源：collector() 回傳 [(名稱, 類型, {標籤}, 數值), ...]"""
+    _collectors.append(collector)
+    return collector
+
+
+def snapshot():
+    with _lock:
+        return {key: list(counts) for key, counts in _histograms.items()}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+# ==========================================
+# Prometheus 文字格式
+# ==========================================
+def _labels(labels):
+    if not labels:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels.items())
+    return "{" + body + "}"
+
+
+def render_prometheus():
+    lines = [
+        "# HELP penghu_span_seconds 熱點耗時 (GEE 運算、圖磚網址、分類器訓練、地圖 HTML、plotly 圖表)",
+        "# TYPE penghu_span_seconds histogram",
+    ]
+    errors = []
+    for (name, page), counts in sorted(snapshot().items()):
+        labels = {"span": name, "page": page}
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), counts[:len(BUCKETS) + 1]):
+            cumulative += count
+            lines.append(f"penghu_span_seconds_bucket{_labels(dict(labels, le=bound))} {cumulative}")
+        lines.append(f"penghu_span_seconds_sum{_labels(labels)} {counts[-2]:.6f}")
+        lines.append(f"penghu_span_seconds_count{_labels(labels)} {cumulative}")
+        errors.append(f"penghu_span_errors_total{_labels(labels)} {counts[-1]}")
+    lines.append("# TYPE penghu_span_errors_total counter")
+    lines.extend(errors)
+
+    seen = set()
+    for collector in list(_collectors):
+        try:
+            samples = collector()
+        except Exception as e:
+            lines.append(f"# 量測來源 {getattr(collector, '__name__', collector)} 失敗: {e}")
+            continue
+        for name, kind, labels, value in samples:
+            if name not in seen:
+                lines.append(f"# TYPE {name} {kind}")
+                seen.add(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ==========================================
+# 端點
+# ==========================================
+def _endpoint(request):
+    from starlette.responses import PlainTextResponse
+
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _serve_port(port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != PATH:
+                self.send_error(404)
+                return
+            body = render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="penghu-metrics", daemon=True).start()
+    print(f"📈 /metrics 另外在埠 {port} 提供")
+
+
+def install():
+    """在 Solara 的 Starlette app 加上 /metrics (只有在 solara 伺服器內執行時；重複呼叫無作用)"""
+    global _installed
+    if not ENABLED:
+        return
+    with _lock:
+        if _installed:
+            return
+        _installed = True
+    server = sys.modules.get("solara.server.starlette")
+    if server is not None:
+        from starlette.routing import Route
+
+        # 要放在 solara 的 /{fullpath} 之前才會比對到
+        server.app.router.routes.insert(0, Route(PATH, _endpoint, methods=["GET"]))
+    if PORT:
+        _serve_port(PORT)
@@ -0,0 +1,140 @@
+import hashlib
+import html as html_lib
+import json
+import os
+import re
+import threading
+import zlib
+
+from penghu import metrics
+from penghu.config import HYBRID_URL, ROOT_DIR, env_flag
+
+# ==========================================
+# 地圖 HTML 產生 (完全在記憶體內，不經過暫存檔)
+# ==========================================
+# 舊做法是 m.to_html(filename=暫存檔) 再讀回來，每次滑桿變動都有一次硬碟讀寫，
+# 多個 session 同時操作時還有暫存檔競爭的問題。folium 本身就能直接 render 成字串。
+#
+# 另外，每張地圖裡都會內嵌同樣的 <style>/<script> 區塊 (圖例、色階、版面 CSS…)，
+# 這些與地圖無關的固定內容抽出成 public/maps/<hash>.css|js，
+# 由 Solara 的 /static/public 路由提供 (?v=<hash> 會帶長效快取標頭)，
+# iframe srcDoc 只剩下地圖本身的設定。
+
+PUBLIC_DIR = ROOT_DIR / "public"
+ASSET_DIR = PUBLIC_DIR / "maps"
+STATIC_URL = os.environ.get("PENGHU_STATIC_URL", "/static/public").rstrip("/")
+SPLIT_ASSETS = env_flag("PENGHU_SPLIT_MAP_ASSETS", True)
+
+# 內嵌區塊小於這個大小就不值得另外抽成檔案
+MIN_ASSET_BYTES = 256
+
+_BLOCK_RE = re.compile(r'<(style|script)>(.*?)</\1>', re.S)
+# folium 每個元素都有隨機 id (map_<32 位 hex>)，含有這種 id 的區塊是該地圖專屬的
+_ELEMENT_ID_RE = re.compile(r'_[0-9a-f]{32}\b')
+_INDENT_RE = re.compile(r'\n[ \t]+')
+
+_written = set()
+_lock = threading.Lock()
+
+
+def _asset_url(kind, content):
+    digest = hashlib.md5(content.encode('utf-8')).hexdigest()
+    name = f"{digest[:16]}.{'css' if kind == 'style' else 'js'}"
+    with _lock:
+        if name not in _written:
+            path = ASSET_DIR / name
+            if not path.exists():
+                ASSET_DIR.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix('.tmp')
+                tmp_path.write_text(content, encoding='utf-8')
+                tmp_path.replace(path)
+            _written.add(name)
+    return f"{STATIC_URL}/maps/{name}?v={digest[:12]}"
+
+
+def _externalize(match):
+    kind, content = match.group(1), match.group(2)
+    if len(content) < MIN_ASSET_BYTES or _ELEMENT_ID_RE.search(content):
+        return match.group(0)
+    try:
+        url = _asset_url(kind, content)
+    except OSError:
+        return match.group(0)
+    if kind == 'style':
+        return f'<link rel="stylesheet" href="{url}"/>'
+    return f'<script src="{url}"></script>'
+
+
+def split_static_assets(html):
+    return _BLOCK_RE.sub(_externalize, html)
+
+
+def map_to_html(m, split_assets=SPLIT_ASSETS):
+    """把 folium / geemap 地圖直接 render 成 HTML 字串"""
+    try:
+        with metrics.span("map_html", split_assets=split_assets):
+            if getattr(m, "options", {}).get("layersControl") and hasattr(m, "add_layer_control"):
+                m.add_layer_control()
+            html = m.get_root().render()
+            # 去掉縮排 (folium 的 JSON 設定都有大量縮排)
+            html = _INDENT_RE.sub('\n', html)
+            if split_assets:
+                html = split_static_assets(html)
+        return html
+    except Exception as e:
+        return f"<div style='color:red; border:1px solid red; padding:10px;'>Map Error: {str(e)}</div>"
+
+
+def leaflet_html(center, zoom, legend=None, legend_title="棲地類別", overlays=(), vectors=()):
+    """
+    只有底圖、圖例、圖片疊圖與向量圖層的 Leaflet 頁面 (不經過 folium / geemap，立即可用)。
+    overlays: [(圖片網址, [[south, west], [north, east]]), ...]
+    vectors: [(GeoJSON 網址樣板 (含 {z}), 樣式, (最小, 最大縮放等級)), ...] (見 zones.vector_layer)，
+             縮放時改取該等級預先簡化的檔案
+    """
+    items = "".join(
+        f"<div><span style='background:{color}'></span>{html_lib.escape(label)}</div>"
+        for label, color in (legend or {}).items())
+    legend_block = f"<div class='legend'><b>{html_lib.escape(legend_title)}</b>{items}</div>" if legend else ""
+    layers = "".join(f"L.imageOverlay({json.dumps(url)}, {json.dumps(bounds)}).addTo(map);\n"
+                     for url, bounds in overlays)
+    layers += "".join(f"vectorLayer({json.dumps(url)}, {json.dumps(style)}, {int(lo)}, {int(hi)});\n"
+                      for url, style, (lo, hi) in vectors)
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"/>
+<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css"/>
+<script src="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js"></script>
+<style>
+html, body, #map {{height: 100%; margin: 0;}}
+.legend {{position: absolute; right: 10px; bottom: 20px; z-index: 1000; background: white; padding: 6px 10px;
+  border-radius: 4px; font: 12px sans-serif; box-shadow: 0 0 4px rgba(0,0,0,.3);}}
+.legend span {{display: inline-block; width: 12px; height: 12px; margin-right: 6px; vertical-align: middle;}}
+</style></head>
+<body><div id="map"></div>{legend_block}
+<script>
+var map = L.map('map').setView({json.dumps(list(center))}, {int(zoom)});
+L.tileLayer({json.dumps(HYBRID_URL)}, {{attribution: 'Google', maxZoom: 24}}).addTo(map);
+function vectorLayer(url, style, minZoom, maxZoom) {{
+  var layer = null, shown = null;
+  function show() {{
+    var z = Math.min(Math.max(map.getZoom(), minZoom), maxZoom);
+    if (z === shown) return;
+    shown = z;
+    fetch(url.replace('{{z}}', z)).then(function (r) {{ return r.json(); }}).then(function (data) {{
+      if (z !== shown) return;
+      if (layer) map.removeLayer(layer);
+      layer = L.geoJSON(data, {{style: style}}).bindTooltip(function (l) {{ return l.feature.properties.name; }}).addTo(map);
+    }});
+  }}
+  map.on('zoomend', show);
+  show();
+}}
+{layers}</script></body></html>"""
+
+
+def compress(html, level=6):
+    return zlib.compress(html.encode('utf-8'), level)
+
+
+def decompress(data):
+    return zlib.decompress(data).decode('utf-8')
@@ -0,0 +1,274 @@
+"""
+Earth Engine 請求排程 (整個程序共用)。
+
+    tile = scheduler.call(lambda: geemap.ee_tile_layer(img, vis).url_format, name="getMapId")
+
+    with scheduler.priority(scheduler.WARM):   # 背景預先產生的工作
+        ...
+
+所有真的會等 GEE 回應的呼叫 (getMapId、getInfo) 都經過這裡：
+  - 同時進行的請求最多 MAX_INFLIGHT 個，超過的排隊
+  - 排隊依優先順序：使用者正在等的 (INTERACTIVE) 先於預先產生的 (WARM)，同優先順序先來先做
+  - 遇到 429 / 配額 / 同時請求過多的錯誤時，讓出位置、隨機退避 (full jitter) 後重試，
+    並把同時請求上限減半；之後每連續成功 (目前上限) 次再加回 1，直到 MAX_INFLIGHT
+  - 排隊長度、執行中數量、重試次數由 /metrics 提供 (見 penghu/metrics.py)
+巢狀呼叫 (已經在排程內的執行緒再呼叫 call) 直接執行，不會自己卡住自己。
+
+    python -m penghu.scheduler --requests 60 --limit 4
+
+以本機的 FakeService (同時請求超過上限就丟配額錯誤) 檢查上限、優先順序與重試；
+同樣的檢查也在 tests/test_scheduler.py (python -m unittest discover)。
+"""
+import argparse
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from penghu import metrics
+
+INTERACTIVE = 0
+WARM = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", WARM: "warm"}
+
+MAX_INFLIGHT = int(os.environ.get("PENGHU_EE_MAX_INFLIGHT", 8))
+MAX_RETRIES = int(os.environ.get("PENGHU_EE_RETRIES", 5))
+BASE_DELAY = float(os.environ.get("PENGHU_EE_BACKOFF_S", 1))
+MAX_DELAY = 32
+
+# 視為「稍後再試就會好」的錯誤訊息 (小寫比對)
+QUOTA_MARKERS = ("429", "too many requests", "too many concurrent", "rate limit", "quota", "resource_exhausted",
+                 "resource exhausted")
+
+_priority = contextvars.ContextVar("penghu_ee_priority", default=None)
+_default_priority = INTERACTIVE
+_inside = threading.local()
+
+
+def is_quota_error(error):
+    status = getattr(getattr(error, "resp", None), "status", None) or getattr(error, "status_code", None)
+    if status == 429:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in QUOTA_MARKERS)
+
+
+@contextmanager
+def priority(level):
+    """區塊內 (同一個執行緒 / context) 的 GEE 請求使用 level 優先順序"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def set_default_priority(level):
+    """整個程序的預設優先順序 (例如 python -m penghu.warm 全部是 WARM)"""
+    global _default_priority
+    _default_priority = level
+
+
+def current_priority():
+    level = _priority.get()
+    return _default_priority if level is None else level
+
+
+class Scheduler:
+    def __init__(self, max_inflight=MAX_INFLIGHT, retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY,
+                 sleep=time.sleep):
+        self.max_inflight = max_inflight
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._inflight = 0
+        # 目前實際使用的上限 (遇到配額錯誤時降低)
+        self.limit = max_inflight
+        self._streak = 0
+        self.peak_inflight = 0
+        self.requests = 0
+        self.retried = 0
+        self.quota_errors = 0
+        self.failures = 0
+
+    def _acquire(self, level):
+        ticket = (level, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            self._cond.wait_for(lambda: self._inflight < self.limit and self._waiting[0] == ticket)
+            heapq.heappop(self._waiting)
+            self._inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self._inflight)
+            # 下一個排隊的也許還有位置
+            self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify_all()
+
+    def backoff(self, attempt):
+        """第 attempt 次重試前等待的秒數：0 ~ min(max_delay, base_delay * 2^attempt) 之間隨機"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn, *args, priority=None, name="ee", **kwargs):
+        """排隊取得位置後呼叫 fn(*args, **kwargs)；配額錯誤會重試，其他錯誤直接往外丟"""
+        if getattr(_inside, "active", False):
+            return fn(*args, **kwargs)
+        level = current_priority() if priority is None else priority
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            self._acquire(level)
+            metrics.observe(f"ee_queue_wait_{PRIORITY_NAMES.get(level, level)}", time.perf_counter() - start)
+            _inside.active = True
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_quota_error(e):
+                    with self._cond:
+                        self.failures += 1
+                    raise
+                with self._cond:
+                    self.quota_errors += 1
+                    self.limit = max(1, self.limit // 2)
+                    self._streak = 0
+                    if attempt >= self.retries:
+                        self.failures += 1
+                        raise
+                    self.retried += 1
+            else:
+                with self._cond:
+                    self.requests += 1
+                    self._streak += 1
+                    if self._streak >= self.limit and self.limit < self.max_inflight:
+                        self.limit += 1
+                        self._streak = 0
+                return result
+            finally:
+                _inside.active = False
+                self._release()
+            delay = self.backoff(attempt)
+            attempt += 1
+            print(f"⏳ GEE 配額限制 ({name})，{delay:.1f} 秒後第 {attempt} 次重試")
+            self._sleep(delay)
+
+    def stats(self):
+        with self._cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for level, _ in self._waiting:
+                depth[PRIORITY_NAMES.get(level, str(level))] += 1
+            return {
+                "inflight": self._inflight,
+                "max_inflight": self.max_inflight,
+                "limit": self.limit,
+                "peak_inflight": self.peak_inflight,
+                "queued": depth,
+                "requests": self.requests,
+                "retries": self.retried,
+                "quota_errors": self.quota_errors,
+                "failures": self.failures,
+            }
+
+
+default = Scheduler()
+
+
+def call(fn, *args, priority=None, name="ee", **kwargs):
+    return default.call(fn, *args, priority=priority, name=name, **kwargs)
+
+
+@metrics.register
+def _scheduler_metrics():
+    stats = default.stats()
+    samples = [("penghu_ee_queue_depth", "gauge", {"priority": name}, count)
+               for name, count in stats["queued"].items()]
+    samples.append(("penghu_ee_inflight", "gauge", {}, stats["inflight"]))
+    samples.append(("penghu_ee_max_inflight", "gauge", {}, stats["max_inflight"]))
+    samples.append(("penghu_ee_limit", "gauge", {}, stats["limit"]))
+    for field in ("requests", "retries", "quota_errors", "failures"):
+        samples.append((f"penghu_ee_{field}_total", "counter", {}, stats[field]))
+    return samples
+
+
+# ==========================================
+# 本機替身 (測試排程用，不必連 GEE)
+# ==========================================
+class QuotaExceeded(Exception):
+    """與 ee.EEException 的配額訊息相同"""
+
+
+class FakeService:
+    """同時請求超過 limit 就丟配額錯誤；每個請求花 latency 秒，依完成順序記錄 (名稱, 優先順序)"""
+
+    def __init__(self, limit=4, latency=0.02):
+        self.limit = limit
+        self.latency = latency
+        self.active = 0
+        self.peak = 0
+        self.rejected = 0
+        self.completed = []
+        self._lock = threading.Lock()
+
+    def request(self, name):
+        with self._lock:
+            if self.active >= self.limit:
+                self.rejected += 1
+                raise QuotaExceeded("Too many concurrent aggregations.")
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.latency)
+            return name
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed.append((name, current_priority()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以本機 FakeService 檢查 GEE 請求排程")
+    parser.add_argument("--requests", type=int, default=60, help="同時送出的請求數 (一半 interactive、一半 warm)")
+    parser.add_argument("--limit", type=int, default=4, help="FakeService 可同時處理的請求數")
+    parser.add_argument("--inflight", type=int, default=None, help="排程的同時請求上限 (預設比 limit 多 2，會觸發重試)")
+    args = parser.parse_args(argv)
+
+    service = FakeService(limit=args.limit)
+    sched = Scheduler(max_inflight=args.inflight or args.limit + 2, base_delay=0.01, max_delay=0.1)
+
+    def worker(i):
+        level = WARM if i % 2 else INTERACTIVE
+        with priority(level):
+            sched.call(service.request, f"r{i}", name=f"r{i}")
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.requests)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - start
+
+    order = [level for _, level in service.completed]
+    half = len(order) // 2
+    early_interactive = sum(1 for level in order[:half] if level == INTERACTIVE)
+    stats = sched.stats()
+    print(f"⏱️ {args.requests} 個請求 {seconds:.2f}s，排程同時最多 {stats['peak_inflight']}，服務端同時最多 {service.peak}")
+    print(f"🔁 配額錯誤 {stats['quota_errors']} 次、重試 {stats['retries']} 次、失敗 {stats['failures']} 次")
+    print(f"🥇 前一半完成的請求中 interactive 佔 {early_interactive}/{half}")
+    ok = stats["failures"] == 0 and len(service.completed) == args.requests
+    print("✅ 通過" if ok else "❌ 有請求失敗")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
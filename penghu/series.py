@@ -0,0 +1,203 @@
+"""
+歷年海溫 (SST) 與 NDCI 序列 (取代 02_crisis 頁面上手打的數值)。
+
+    python -m penghu.series --years 2016 2017 ... 2025
+
+每個資料集 (MODIS / GCOM-C / Sentinel-2 TOA / SR) 把所有 (年份, 季節) 的影像放進同一個
+ImageCollection，map 一次 reduceRegions (全區 + 各島分區) 後 flatten，只 getInfo 一次，
+不必每年、每個分區各跑一次請求。
+結果存成 .cache/series/env_series.parquet (長表格)；之後只補缺少的年份，並重算最新的一年
+(當年的資料還在增加，超過 REFRESH_H 小時才重算)。頁面只讀這裡的結果，年份不齊時用手打的數值。
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from penghu import scheduler, session, zones
+from penghu.config import CACHE_DIR, env_flag, period_dates, s2_collection_id
+from penghu.stats import TOTAL_ZONE
+
+SERIES_PATH = CACHE_DIR / "series" / "env_series.parquet"
+COLUMNS = ["year", "period", "zone", "metric", "value", "updated"]
+METRICS = ("sst", "ndci")
+PERIODS = ("夏季平均", "全年平均")
+# reduceRegions 的解析度 (m)：海溫資料約 4.6 km，Sentinel-2 的 B4 / B5 用 20 m
+SCALES = {"sst": 1000, "ndci": 20}
+# 最新一年多久重算一次 (小時)
+REFRESH_H = float(os.environ.get("PENGHU_SERIES_REFRESH_H", 24))
+# 頁面開啟時在背景補齊序列 (需要 GEE 連線)
+AUTO_REFRESH = env_flag("PENGHU_SERIES_AUTO_REFRESH", True)
+
+_lock = threading.Lock()
+_memo = {}
+_refreshing = set()
+
+
+def window(metric, year, period):
+    """與地圖相同的時間範圍：NDCI 的夏季從 5 月開始 (見 maps.ndci_image)"""
+    start, end = period_dates(year, period)
+    if metric == "ndci" and period == "夏季平均":
+        start = f'{year}-05-01'
+    return start, end
+
+
+def source(metric, year):
+    """同一個資料集的年份放在同一次請求 (2018 起海溫改用 GCOM-C，2019 起 Sentinel-2 改用 SR)"""
+    if metric == "sst":
+        return "MODIS-Aqua/L3SMI" if year < 2018 else "GCOM-C/SST"
+    return s2_collection_id(year)
+
+
+# ==========================================
+# 1. GEE 批次計算 (每個資料集一次 getInfo)
+# ==========================================
+def compute(metric, combos):
+    """[(年份, 季節), ...] (同一個資料集) -> 長表格；整批只有一次 GEE 請求"""
+    import ee
+
+    from penghu import gee
+
+    image_fn = gee.sst_image if metric == "sst" else gee.ndci_image
+    # 全區 (zones.geojson 的 roi 即名為「全區」) + 各警戒區
+    regions = zones.ee_collection((zones.ROI_KIND, zones.ALERT_KIND), 'zone')
+    images = []
+    for year, period in combos:
+        img = image_fn(year, *window(metric, year, period))
+        images.append(img.rename('value').set({'year': year, 'period': period}))
+
+    def reduce(img):
+        stats = img.reduceRegions(collection=regions, reducer=ee.Reducer.mean().setOutputs(['value']),
+                                  scale=SCALES[metric], tileScale=4)
+        return stats.map(lambda f: f.set({'year': img.get('year'), 'period': img.get('period')}))
+
+    stats = ee.FeatureCollection(ee.ImageCollection.fromImages(images).map(reduce)).flatten()
+    features = scheduler.call(stats.getInfo, name="reduceRegions")["features"]
+    now = time.time()
+    rows = []
+    for feature in features:
+        props = feature["properties"]
+        value = props.get("value")
+        rows.append((int(props["year"]), props["period"], props["zone"], metric,
+                     float("nan") if value is None else float(value), now))
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+# ==========================================
+# 2. Parquet 快取 (增量更新)
+# ==========================================
+def load():
+    if not SERIES_PATH.exists():
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.read_parquet(SERIES_PATH)
+
+
+def _save(df):
+    SERIES_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = SERIES_PATH.with_suffix('.tmp')
+    df.to_parquet(tmp_path, index=False)
+    tmp_path.replace(SERIES_PATH)
+
+
+def update(years, metrics=METRICS, periods=PERIODS, refresh_latest=True):
+    """
+    補齊缺少的 (指標, 年份, 季節) 後回傳整張長表格；refresh_latest 時最新一年超過 REFRESH_H 小時就重算。
+    需要 GEE 連線 (呼叫端先確認 session.is_online())。
+    """
+    with _lock:
+        df = load()
+        latest = max(years)
+        todo = {}
+        for metric in metrics:
+            for year in sorted(set(years)):
+                for period in periods:
+                    done = df[(df["metric"] == metric) & (df["year"] == year) & (df["period"] == period)] \
+                        if len(df) else df
+                    stale = refresh_latest and year == latest and len(done) \
+                        and time.time() - done["updated"].min() > REFRESH_H * 3600
+                    if len(done) == 0 or stale:
+                        todo.setdefault((metric, source(metric, year)), []).append((year, period))
+        if not todo:
+            return df
+
+        added = []
+        for (metric, name), combos in todo.items():
+            print(f"🌡️ 序列 {metric} {name}: {len(combos)} 組 (年份, 季節)")
+            added.append(compute(metric, combos))
+        redo = pd.concat(added, ignore_index=True)
+        if len(df):
+            keys = set(zip(redo["metric"], redo["year"], redo["period"]))
+            df = df[[k not in keys for k in zip(df["metric"], df["year"], df["period"])]]
+            df = pd.concat([df, redo], ignore_index=True)
+        else:
+            df = redo
+        _save(df)
+        _memo.clear()
+        return df
+
+
+def refresh_async(years):
+    """頁面使用：GEE 可用時在背景補齊序列 (每個程序、每組年份只跑一次)，下次開啟頁面時生效"""
+    key = tuple(years)
+    if not AUTO_REFRESH or key in _refreshing:
+        return
+    _refreshing.add(key)
+
+    def run():
+        if not (session.wait() and session.is_online()):
+            return
+        try:
+            # 背景工作，讓使用者正在等的地圖先用 GEE
+            with scheduler.priority(scheduler.WARM):
+                update(years)
+        except Exception as e:
+            print(f"⚠️ 歷年序列更新失敗: {e}")
+
+    threading.Thread(target=run, name="penghu-series", daemon=True).start()
+
+
+# ==========================================
+# 3. 檢查用的寬表格 (頁面透過 penghu/timeseries.py 讀取)
+# ==========================================
+def _table():
+    if "table" not in _memo:
+        try:
+            _memo["table"] = load()
+        except (ImportError, OSError) as e:
+            print(f"⚠️ 無法讀取歷年序列: {e}")
+            _memo["table"] = pd.DataFrame(columns=COLUMNS)
+    return _memo["table"]
+
+
+def series_table(years, zone=TOTAL_ZONE):
+    """寬表格：Year + 各 (指標, 季節) 欄位 (例如 sst_夏季平均)，給 CLI 檢查用"""
+    df = _table()
+    df = df[(df["zone"] == zone) & df["year"].isin(list(years))] if len(df) else df
+    if len(df) == 0:
+        return df
+    wide = df.pivot_table(index="year", columns=["metric", "period"], values="value", aggfunc="last")
+    wide.columns = [f"{metric}_{period}" for metric, period in wide.columns]
+    return wide.round(4).reset_index().rename(columns={"year": "Year"})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以 GEE 批次計算歷年海溫與 NDCI (全區與各分區)")
+    parser.add_argument("--years", type=int, nargs="+", default=list(range(2016, 2026)))
+    parser.add_argument("--metrics", nargs="+", default=list(METRICS), choices=METRICS)
+    parser.add_argument("--no-refresh", action="store_true", help="最新一年已有結果時不重算")
+    args = parser.parse_args(argv)
+
+    if not session.wait() or not session.is_online():
+        print("❌ 無法連線 Earth Engine")
+        return 1
+    df = update(args.years, args.metrics, refresh_latest=not args.no_refresh)
+    print(series_table(args.years))
+    print(f"✅ {SERIES_PATH} ({len(df)} 列)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import json
+import os
+import pathlib
+import threading
+import time
+
+from penghu import mapstore, metrics
+from penghu.config import ROOT_DIR
+
+# ==========================================
+# GEE 連線 (整個程序共用一個 session)
+# ==========================================
+# 驗證在背景執行緒進行，頁面 import 與伺服器啟動都不必等網路。
+# 失敗時以指數退避 (1, 2, 4 … 秒) 重試；需要 GEE 的地方用 wait() 等待結果。
+# 後端可以替換：預設是真正的 Earth Engine，PENGHU_BACKEND=offline 時改用本機
+# fixture (warm 產生的地圖目錄格式)，測試與離線開發不必連網。
+
+MAX_ATTEMPTS = int(os.environ.get("PENGHU_EE_MAX_ATTEMPTS", 5))
+MAX_BACKOFF = 60
+FIXTURES_DIR = os.environ.get("PENGHU_FIXTURES_DIR", str(ROOT_DIR / "fixtures" / "maps"))
+
+
+class EarthEngineBackend:
+    name = "earthengine"
+    online = True
+
+    def initialize(self):
+        import ee
+
+        key_content = os.environ.get('EARTHENGINE_TOKEN')
+        if key_content and key_content.strip():
+            try:
+                from google.oauth2.service_account import Credentials
+
+                clean_content = key_content.replace("'", '"')
+                service_account_info = json.loads(clean_content)
+                my_project_id = service_account_info.get("project_id")
+                creds = Credentials.from_service_account_info(
+                    service_account_info,
+                    scopes=['https://www.googleapis.com/auth/earthengine']
+                )
+                ee.Initialize(credentials=creds, project=my_project_id)
+                print(f"✅ 雲端環境：GEE 驗證成功！(Project: {my_project_id})")
+                return
+            except Exception as e:
+                print(f"⚠️ Token 驗證失敗: {e}，嘗試本機驗證...")
+        else:
+            print("⚠️ 無 Token，嘗試本機驗證...")
+        ee.Initialize()
+        print("✅ 本機環境：GEE 驗證成功！")
+
+    def produce(self, kind, key, compute):
+        return compute()
+
+
+class OfflineBackend:
+    """離線替身：從 fixture 目錄 (mapstore 格式) 讀地圖與圖磚網址，沒有的就只畫底圖"""
+    name = "offline"
+    online = False
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR):
+        self.fixtures_dir = pathlib.Path(fixtures_dir)
+
+    def initialize(self):
+        print(f"🧪 離線模式：使用本機 fixture ({self.fixtures_dir})")
+
+    def produce(self, kind, key, compute):
+        if kind == "tiles":
+            found = mapstore.tiles(key, self.fixtures_dir, max_age=float("inf"))
+        else:
+            found = mapstore.load(key, self.fixtures_dir, max_age=float("inf"))
+        return found if found is not None else compute()
+
+
+BACKENDS = {"earthengine": EarthEngineBackend, "offline": OfflineBackend}
+
+_backend = BACKENDS.get(os.environ.get("PENGHU_BACKEND", "earthengine"), EarthEngineBackend)()
+_state = {"status": "idle", "attempts": 0, "error": None, "since": None}
+_done = threading.Event()
+_lock = threading.Lock()
+_thread = None
+
+
+def set_backend(backend):
+    """換掉後端 (例如測試時換成 OfflineBackend)，並重設連線狀態"""
+    global _backend, _thread
+    with _lock:
+        _backend = backend
+        _thread = None
+        _state.update(status="idle", attempts=0, error=None, since=None)
+        _done.clear()
+
+
+def get_backend():
+    return _backend
+
+
+def _run(backend):
+    delay = 1
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        _state.update(status="connecting" if attempt == 1 else "retrying", attempts=attempt)
+        try:
+            backend.initialize()
+            _state.update(status="ready", error=None, since=time.time())
+            break
+        except Exception as e:
+            _state["error"] = str(e)
+            print(f"⚠️ GEE 初始化遭遇問題 (第 {attempt}/{MAX_ATTEMPTS} 次): {e}")
+            if attempt < MAX_ATTEMPTS:
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_BACKOFF)
+    else:
+        _state.update(status="failed", since=time.time())
+    _done.set()
+
+
+def start():
+    """在背景開始驗證 (只會啟動一次)，立即返回"""
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, args=(_backend,), name="penghu-ee-session", daemon=True)
+            _thread.start()
+
+
+def wait(timeout=None):
+    """等待驗證完成，回傳是否可用 (逾時視為尚未可用)"""
+    start()
+    _done.wait(timeout)
+    return is_ready()
+
+
+def is_ready():
+    return _state["status"] == "ready"
+
+
+def is_online():
+    """可以真的呼叫 Earth Engine (離線後端雖然 ready，但不能呼叫 ee)"""
+    return is_ready() and _backend.online
+
+
+def status():
+    return dict(_state, backend=_backend.name)
+
+
+def produce(kind, key, compute):
+    return _backend.produce(kind, key, compute)
+
+
+@metrics.register
+def _session_metrics():
+    return [("penghu_ee_session_ready", "gauge", {"backend": _backend.name}, int(is_ready())),
+            ("penghu_ee_session_attempts", "gauge", {"backend": _backend.name}, _state["attempts"])]
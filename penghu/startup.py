@@ -0,0 +1,96 @@
+"""
+啟動時間檢查。
+
+    python -m penghu.startup [--budget 1.0]
+
+依序執行 pages/ 底下每個頁面的模組 (跟 solara run 一樣只 import、不 render)，
+期間禁止所有對外連線。任何一頁超過時間預算、嘗試連網或 import 失敗時回傳 1，
+可以放在部署前檢查，確保冷啟動時首頁能馬上回應。
+"""
+import argparse
+import importlib.util
+import os
+import pathlib
+import socket
+import sys
+import time
+from contextlib import contextmanager
+
+from penghu.config import ROOT_DIR
+
+BUDGET_S = float(os.environ.get("PENGHU_STARTUP_BUDGET_S", 1.0))
+PAGES_DIR = ROOT_DIR / "pages"
+
+
+@contextmanager
+def block_network():
+    """把對外連線改成立即失敗，並記下嘗試連線的目標"""
+    attempts = []
+    original_connect = socket.socket.connect
+    original_getaddrinfo = socket.getaddrinfo
+
+    def connect(self, address):
+        attempts.append(str(address))
+        raise OSError(f"啟動檢查期間禁止連線: {address}")
+
+    def getaddrinfo(host, *args, **kwargs):
+        if host not in (None, "localhost", "127.0.0.1", "::1"):
+            attempts.append(str(host))
+            raise socket.gaierror(f"啟動檢查期間禁止連線: {host}")
+        return original_getaddrinfo(host, *args, **kwargs)
+
+    socket.socket.connect = connect
+    socket.getaddrinfo = getaddrinfo
+    try:
+        yield attempts
+    finally:
+        socket.socket.connect = original_connect
+        socket.getaddrinfo = original_getaddrinfo
+
+
+def import_page(path):
+    spec = importlib.util.spec_from_file_location(f"_startup_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def check(pages_dir=PAGES_DIR, budget=BUDGET_S):
+    """回傳每頁的 {page, seconds, connections, error, ok}；solara 本身的 import 時間另列一筆"""
+    results = []
+    with block_network() as attempts:
+        start = time.perf_counter()
+        import solara  # noqa: F401  (每頁都會用到，單獨計時)
+        results.append({"page": "(solara)", "seconds": time.perf_counter() - start,
+                        "connections": [], "error": None, "ok": True})
+        for path in sorted(pages_dir.glob("[!_]*.py")):
+            seen = len(attempts)
+            start = time.perf_counter()
+            error = None
+            try:
+                import_page(path)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            seconds = time.perf_counter() - start
+            connections = attempts[seen:]
+            results.append({"page": path.name, "seconds": seconds, "connections": connections, "error": error,
+                            "ok": error is None and not connections and seconds <= budget})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="檢查各頁面的 import 時間與是否連網")
+    parser.add_argument("--budget", type=float, default=BUDGET_S, help="每頁 import 的時間上限 (秒)")
+    parser.add_argument("--pages", default=str(PAGES_DIR))
+    args = parser.parse_args(argv)
+
+    results = check(pathlib.Path(args.pages), args.budget)
+    for r in results:
+        mark = "✅" if r["ok"] else "❌"
+        note = r["error"] or (f"嘗試連線 {r['connections']}" if r["connections"] else "")
+        print(f"{mark} {r['page']:<20} {r['seconds'] * 1000:8.1f} ms  {note}")
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
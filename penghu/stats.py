@@ -0,0 +1,209 @@
+"""
+棲地面積統計 (取代頁面上手打的面積表)。
+
+    python -m penghu.stats --years 2016 2017 ... 2025 --period 夏季平均 --radius 30 --classify
+
+讀取本機分類結果 (penghu/local/pipeline.py) 的 GeoTIFF，每個 (年份, 季節, 半徑) 只掃一次：
+分區代碼 x 類別數 + 類別 組成一個索引，一次 np.bincount 就得到所有分區、所有類別的像素數；同一次掃描也畫出研究範圍 (ROI) 的遮罩，
+全區只算 ROI 內的像素 (與原本 clip 到 ROI 的 GEE 匯出數值可以比較)。
+結果存成 .cache/stats/habitat_area.parquet (長表格)，新增年份只會多算那一年。
+"""
+import argparse
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from penghu import zones
+from penghu.config import CACHE_DIR, CLASS_LABELS, period_dates
+
+STATS_PATH = CACHE_DIR / "stats" / "habitat_area.parquet"
+TOTAL_ZONE = "全區"
+COLUMNS = ["year", "period", "radius", "zone", "class", "label", "pixels", "area_m2", "zones_version"]
+# 統計方式的版本 (2：全區只算研究範圍 (ROI) 內的像素，與 GEE 匯出的數值相同)
+STATS_FORMAT = 2
+
+_lock = threading.Lock()
+_memo = {}
+_refreshing = set()
+
+
+def zones_version():
+    """分區定義 (data/zones.geojson) 或統計方式 (STATS_FORMAT) 改變時，舊的分區統計自動失效"""
+    return f"{zones.version()}-{STATS_FORMAT}"
+
+
+# ==========================================
+# 1. 單次掃描的分區直方圖
+# ==========================================
+def row_area(transform, window, crs):
+    """每一列像素的面積 (m²)；地理座標系依緯度換算"""
+    width, height = abs(transform.a), abs(transform.e)
+    if not crs.is_geographic:
+        return np.full(window.height, width * height)
+    rows = np.arange(window.row_off, window.row_off + window.height) + 0.5
+    lat = np.radians(transform.f + rows * transform.e)
+    return (width * 111320.0 * np.cos(lat)) * (height * 110574.0)
+
+
+def zone_histogram(path, n_classes=len(CLASS_LABELS), memory_mb=None):
+    """
+    回傳 (pixels, area)，形狀都是 [分區數 + 2, n_classes]；第 0 列是不屬於任何分區的像素，
+    1..n 列依 zones.names() 順序，最後一列是研究範圍 (ROI) 內的像素 (全區，同 GEE 端 clip 到 ROI)。
+    重疊時以後面的分區為準；只有與分類圖相交的分區會被畫進網格 (空間索引)。
+    """
+    import rasterio
+    from rasterio.features import rasterize
+    from rasterio.warp import transform_bounds
+    from rasterio.windows import transform as window_transform
+
+    from penghu.local.raster import MEMORY_MB, NODATA_CLASS, strips
+
+    size = (len(zones.names()) + 1) * n_classes
+    pixels = np.zeros(size + n_classes, dtype='int64')
+    area = np.zeros(size + n_classes, dtype='float64')
+    with rasterio.open(path) as src:
+        box = transform_bounds(src.crs, "EPSG:4326", *src.bounds)
+        shapes = zones.shapes(src.crs, box)
+        roi_shapes = [(geom, 1) for geom, _ in zones.shapes(src.crs, box, kind=zones.ROI_KIND)]
+        for _, window, _ in strips(src.height, src.width, 16, memory_mb or MEMORY_MB):
+            classes = src.read(1, window=window)
+            transform = window_transform(window, src.transform)
+            zone_ids = rasterize(shapes, out_shape=classes.shape, transform=transform,
+                                 fill=0, dtype='uint16') if shapes else np.zeros(classes.shape, 'uint16')
+            in_roi = rasterize(roi_shapes, out_shape=classes.shape, transform=transform,
+                               fill=0, dtype='uint8') if roi_shapes else np.zeros(classes.shape, 'uint8')
+            valid = classes != NODATA_CLASS
+            weights = np.broadcast_to(row_area(src.transform, window, src.crs)[:, None], classes.shape)
+            # 同一次掃描：分區編號 * n_classes + 類別，ROI 內的像素另外加在最後 n_classes 格
+            inside = valid & (in_roi == 1)
+            index = np.concatenate([zone_ids[valid].astype('int64') * n_classes + classes[valid],
+                                    size + classes[inside].astype('int64')])
+            pixels += np.bincount(index, minlength=size + n_classes)
+            area += np.bincount(index, weights=np.concatenate([weights[valid], weights[inside]]),
+                                minlength=size + n_classes)
+    return pixels.reshape(-1, n_classes), area.reshape(-1, n_classes)
+
+
+def compute(year, period, radius, path):
+    """一張分類圖 -> 長表格 (每個分區 + 全區，每個類別一列)；全區只算研究範圍 (ROI) 內的像素"""
+    pixels, area = zone_histogram(path)
+    totals = [(TOTAL_ZONE, pixels[-1], area[-1])]
+    totals += [(name, pixels[z], area[z]) for z, name in enumerate(zones.names(), start=1)]
+    rows = []
+    for name, zone_pixels, zone_area in totals:
+        for c, label in enumerate(CLASS_LABELS):
+            rows.append((year, period, radius, name, c, label, int(zone_pixels[c]), float(zone_area[c]),
+                         zones_version()))
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+# ==========================================
+# 2. Parquet 快取 (增量更新)
+# ==========================================
+def load():
+    if not STATS_PATH.exists():
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.read_parquet(STATS_PATH)
+
+
+def _save(df):
+    STATS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = STATS_PATH.with_suffix('.tmp')
+    df.to_parquet(tmp_path, index=False)
+    tmp_path.replace(STATS_PATH)
+
+
+def update(years, period, radius, classify=False, catalog=None):
+    """
+    補齊缺少的年份後回傳整張長表格。
+    classify=False 時只統計已存在的分類圖 (頁面使用，不會觸發分類)；True 時缺的分類圖會先跑本機分類。
+    """
+    from penghu.local import pipeline
+
+    with _lock:
+        df = load()
+        version = zones_version()
+        df = df[df["zones_version"] == version] if len(df) else df
+        done = set(df.loc[(df["period"] == period) & (df["radius"] == radius), "year"]) if len(df) else set()
+        added = []
+        for year in years:
+            if year in done:
+                continue
+            start, end = period_dates(year, period)
+            path = pipeline.benthic_path(year, start, end, radius)
+            if not path.exists():
+                if not classify:
+                    continue
+                path = pipeline.benthic_classification(year, start, end, radius, catalog)
+            print(f"📊 統計 {year} {period} r{radius}")
+            added.append(compute(year, period, radius, path))
+        if added:
+            df = pd.concat([df] + added, ignore_index=True) if len(df) else pd.concat(added, ignore_index=True)
+            _save(df)
+            _memo.clear()
+        return df
+
+
+def refresh_async(years, period, radius):
+    """頁面使用：在背景補齊已存在的分類圖的統計 (每個程序、每組參數只跑一次)，下次讀取時生效"""
+    key = (tuple(years), period, radius)
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            update(years, period, radius)
+        except (ImportError, OSError) as e:
+            print(f"⚠️ 棲地面積統計更新失敗: {e}")
+
+    threading.Thread(target=run, name="penghu-stats", daemon=True).start()
+
+
+def _table(years, period, radius):
+    key = (tuple(years), period, radius)
+    if key not in _memo:
+        try:
+            df = update(years, period, radius)
+        except (ImportError, OSError) as e:
+            print(f"⚠️ 無法讀取本機統計: {e}")
+            df = pd.DataFrame(columns=COLUMNS)
+        if len(df):
+            df = df[(df["period"] == period) & (df["radius"] == radius) & df["year"].isin(list(years))]
+        _memo[key] = df
+    return _memo[key]
+
+
+# ==========================================
+# 3. 檢查用的寬表格 (頁面透過 penghu/timeseries.py 讀取)
+# ==========================================
+def habitat_table(years, period="夏季平均", radius=30, zone=TOTAL_ZONE, fallback=None):
+    """寬表格：Year + 各棲地面積 (ha)，欄位順序同 CLASS_LABELS[1:]"""
+    df = _table(years, period, radius)
+    df = df[df["zone"] == zone] if len(df) else df
+    if len(df) == 0 or set(df["year"]) != set(years):
+        return fallback
+    wide = df.pivot_table(index="year", columns="label", values="area_m2", aggfunc="sum") / 10000
+    wide = wide.reindex(columns=CLASS_LABELS[1:], fill_value=0).round(2)
+    return wide.rename_axis(None, axis=1).reset_index().rename(columns={"year": "Year"})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="由本機分類結果計算各分區棲地面積")
+    parser.add_argument("--years", type=int, nargs="+", default=list(range(2016, 2026)))
+    parser.add_argument("--period", default="夏季平均")
+    parser.add_argument("--radius", type=int, default=30)
+    parser.add_argument("--classify", action="store_true", help="缺少的分類圖先跑本機分類")
+    args = parser.parse_args(argv)
+
+    df = update(args.years, args.period, args.radius, classify=args.classify)
+    print(habitat_table(args.years, args.period, args.radius))
+    print(f"✅ {STATS_PATH} ({len(df)} 列)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+儀表板共用的歷年數據 (取代各頁面各自的 list dict / 每個分區一個 DataFrame)。
+
+    python -m penghu.timeseries --years 2018 2019 ... 2025
+
+所有數值放在一個 [指標, 區域, 類別, 年份] 的 float64 NumPy 陣列 (缺值為 NaN)，
+各軸的名稱 -> 位置先建好對照表，取單一序列 / 單一區域的寬表格都是 O(1) 的切片 (不複製)；
+長表格 (給 plotly 的 color=) 與相關係數表第一次使用時算一次後沿用，不在每次 render 時 melt。
+年份軸只要是可排序的整數即可 (例如月資料用 202407)；陣列是唯讀的，可以在各 session 之間共用。
+
+資料來源：penghu/stats.py 的棲地面積 (area_m2 / area_ha，類別 = 棲地) 與
+penghu/series.py 的海溫 / NDCI (sst / ndci，類別 = ALL_CLASS)；
+頁面用 fill() 補上手打的匯出數值 (某條序列年份不齊時整條改用匯出數值，同原本的 fallback)。
+"""
+import argparse
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from penghu import series, stats
+from penghu.stats import TOTAL_ZONE
+
+# 沒有類別之分的指標 (海溫、NDCI) 放在這個類別
+ALL_CLASS = "全部"
+AXES = ("metric", "region", "class", "year")
+
+_lock = threading.Lock()
+_memo = {}
+
+
+class SeriesStore:
+    """values[指標, 區域, 類別, 年份]；series() / wide() 回傳的是 values 的唯讀 view"""
+
+    def __init__(self, years, regions, classes, metrics, values=None):
+        self.years = np.asarray(years, dtype='int32')
+        self.regions = tuple(regions)
+        self.classes = tuple(classes)
+        self.metrics = tuple(metrics)
+        shape = (len(self.metrics), len(self.regions), len(self.classes), len(self.years))
+        if values is None:
+            values = np.full(shape, np.nan)
+        self.values = np.ascontiguousarray(values, dtype='float64')
+        if self.values.shape != shape:
+            raise ValueError(f"values 的形狀 {self.values.shape} 與各軸長度 {shape} 不符")
+        self.values.flags.writeable = False
+        self._index = {axis: {key: i for i, key in enumerate(keys)}
+                       for axis, keys in zip(AXES, (self.metrics, self.regions, self.classes, self.years.tolist()))}
+        self._views = {}
+        self._lock = threading.RLock()
+
+    # ------------------------------------------
+    # 建立
+    # ------------------------------------------
+    @classmethod
+    def from_series(cls, years, items):
+        """{(指標, 區域, 類別): 依 years 順序的數值, ...} -> SeriesStore (各軸順序同 items 的出現順序)"""
+        metrics, regions, classes = (list(dict.fromkeys(key[i] for key in items)) for i in range(3))
+        store = cls(years, regions, classes, metrics)
+        values = store.values.copy()
+        for (metric, region, class_), data in items.items():
+            values[store._index["metric"][metric], store._index["region"][region],
+                   store._index["class"][class_]] = np.asarray(data, dtype='float64')
+        return cls(years, regions, classes, metrics, values)
+
+    @classmethod
+    def from_long(cls, df, years=None):
+        """長表格 (year, region, class, metric, value) -> SeriesStore；同一個鍵有多列時以最後一列為準"""
+        years = sorted(set(df["year"].astype(int))) if years is None else list(years)
+        axes = [list(dict.fromkeys(df[axis])) for axis in AXES[:3]]
+        codes = [pd.Index(keys).get_indexer(df[axis]) for keys, axis in zip(axes, AXES[:3])]
+        codes.append(pd.Index(years).get_indexer(df["year"].astype(int)))
+        keep = np.all([c >= 0 for c in codes], axis=0)
+        values = np.full([len(keys) for keys in axes] + [len(years)], np.nan)
+        values[tuple(c[keep] for c in codes)] = df["value"].to_numpy(dtype='float64')[keep]
+        return cls(years, axes[1], axes[2], axes[0], values)
+
+    def fill(self, fallback):
+        """
+        以 fallback 的年份為準合併：fallback 的每條序列在這裡年份齊全就用這裡的數值，否則整條用 fallback；
+        只有這裡有的序列 (例如新增的監測點) 也保留，缺的年份為 NaN。
+        """
+        metrics = list(dict.fromkeys(fallback.metrics + self.metrics))
+        regions = list(dict.fromkeys(fallback.regions + self.regions))
+        classes = list(dict.fromkeys(fallback.classes + self.classes))
+        result = SeriesStore(fallback.years, regions, classes, metrics)
+        values = result.values.copy()
+        columns = pd.Index(self.years).get_indexer(fallback.years)
+        found = columns >= 0
+        for m, metric in enumerate(metrics):
+            for r, region in enumerate(regions):
+                for c, class_ in enumerate(classes):
+                    own = self.locate(metric, region, class_)
+                    if own is not None:
+                        values[m, r, c, found] = self.values[own][columns[found]]
+                    backup = fallback.locate(metric, region, class_)
+                    if backup is not None and np.isnan(values[m, r, c]).any():
+                        values[m, r, c] = fallback.values[backup]
+        return SeriesStore(fallback.years, regions, classes, metrics, values)
+
+    # ------------------------------------------
+    # 查詢 (O(1) 的 view)
+    # ------------------------------------------
+    def locate(self, metric, region=TOTAL_ZONE, class_=ALL_CLASS):
+        """(指標, 區域, 類別) 在 values 中的位置；沒有這條序列時回傳 None"""
+        try:
+            return self._index["metric"][metric], self._index["region"][region], self._index["class"][class_]
+        except KeyError:
+            return None
+
+    def series(self, metric, region=TOTAL_ZONE, class_=ALL_CLASS):
+        """單一序列 (依 years 順序)，唯讀 view"""
+        index = self.locate(metric, region, class_)
+        if index is None:
+            raise KeyError(f"沒有 {metric} / {region} / {class_} 的序列")
+        return self.values[index]
+
+    def covers(self, metric, region=TOTAL_ZONE, class_=ALL_CLASS):
+        index = self.locate(metric, region, class_)
+        return index is not None and not np.isnan(self.values[index]).any()
+
+    def regions_with(self, metric, class_=ALL_CLASS):
+        """這個 (指標, 類別) 年份齊全的區域，順序同 regions"""
+        return [region for region in self.regions if self.covers(metric, region, class_)]
+
+    def classes_with(self, metric, region=TOTAL_ZONE):
+        """這個 (指標, 區域) 有任何數值的類別，順序同 classes"""
+        m, r = self._index["metric"][metric], self._index["region"][region]
+        return [class_ for c, class_ in enumerate(self.classes) if not np.isnan(self.values[m, r, c]).all()]
+
+    def _view(self, key, build):
+        with self._lock:
+            if key not in self._views:
+                self._views[key] = build()
+            return self._views[key]
+
+    def wide(self, metric, region=TOTAL_ZONE):
+        """寬表格：index 為 Year，欄位為有數值的類別；類別在陣列中相鄰時直接包住 values (不複製)"""
+        def build():
+            m, r = self._index["metric"][metric], self._index["region"][region]
+            positions = [self._index["class"][class_] for class_ in self.classes_with(metric, region)]
+            if positions and positions == list(range(positions[0], positions[-1] + 1)):
+                block = self.values[m, r, positions[0]:positions[-1] + 1]
+            else:
+                block = self.values[m, r, positions]
+            return pd.DataFrame(block.T, index=pd.Index(self.years, name="Year"),
+                                columns=[self.classes[c] for c in positions], copy=False)
+
+        return self._view(("wide", metric, region), build)
+
+    def long(self, metric, region=TOTAL_ZONE, var_name="Habitat", value_name="value"):
+        """長表格 (Year, var_name, value_name)，給 plotly 的 color= 使用；第一次使用時建立"""
+        def build():
+            wide = self.wide(metric, region)
+            return pd.DataFrame({
+                "Year": np.tile(self.years, len(wide.columns)),
+                var_name: np.repeat(np.asarray(wide.columns, dtype=object), len(self.years)),
+                value_name: wide.to_numpy().T.ravel(),
+            })
+
+        return self._view(("long", metric, region, var_name, value_name), build)
+
+    def table(self, columns):
+        """{欄位名稱: (指標, 區域, 類別), ...} -> 以 Year 為 index 的表格 (例如相關係數用)，第一次使用時建立"""
+        key = ("table",) + tuple(columns.items())
+        return self._view(key, lambda: pd.DataFrame(
+            {name: self.series(*spec) for name, spec in columns.items()},
+            index=pd.Index(self.years, name="Year")))
+
+
+# ==========================================
+# 由本機統計與歷年序列建立 (檔案更新後重建)
+# ==========================================
+def _stamp():
+    return tuple(path.stat().st_mtime_ns if path.exists() else None
+                 for path in (stats.STATS_PATH, series.SERIES_PATH))
+
+
+def _long_table(years, period, radius, area):
+    frames = []
+    if len(area):
+        area = area[(area["period"] == period) & (area["radius"] == radius)
+                    & (area["zones_version"] == stats.zones_version())]
+        for metric, scale, digits in (("area_m2", 1, 2), ("area_ha", 10000, 2)):
+            frames.append(pd.DataFrame({"metric": metric, "region": area["zone"], "class": area["label"],
+                                        "year": area["year"], "value": (area["area_m2"] / scale).round(digits)}))
+    env = series.load()
+    if len(env):
+        env = env[env["period"] == period].sort_values("updated")
+        frames.append(pd.DataFrame({"metric": env["metric"], "region": env["zone"], "class": ALL_CLASS,
+                                    "year": env["year"], "value": env["value"].round(6)}))
+    if not frames:
+        return pd.DataFrame(columns=["metric", "region", "class", "year", "value"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def load(years, period="夏季平均", radius=30):
+    """
+    棲地面積 (area_m2 / area_ha) + 海溫 / NDCI (sst / ndci) 的 SeriesStore。
+    只讀兩個 Parquet 檔 (統計由 stats.refresh_async / CLI 在背景補齊)，檔案有更新才重建。
+    """
+    key = (tuple(years), period, radius)
+    with _lock:
+        cached = _memo.get(key)
+        if cached is not None and cached[0] == _stamp():
+            return cached[1]
+        try:
+            df = _long_table(years, period, radius, stats.load())
+        except (ImportError, OSError) as e:
+            print(f"⚠️ 無法讀取本機統計 / 歷年序列: {e}")
+            df = _long_table(years, period, radius, pd.DataFrame())
+        store = SeriesStore.from_long(df, years)
+        _memo[key] = (_stamp(), store)
+        return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="檢查儀表板使用的歷年數據")
+    parser.add_argument("--years", type=int, nargs="+", default=list(range(2018, 2026)))
+    parser.add_argument("--period", default="夏季平均")
+    parser.add_argument("--radius", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    store = load(args.years, args.period, args.radius)
+    print(f"📦 {len(store.metrics)} 指標 x {len(store.regions)} 區域 x {len(store.classes)} 類別 x "
+          f"{len(store.years)} 年 ({store.values.nbytes / 1024:.1f} KB)")
+    for metric in store.metrics:
+        if TOTAL_ZONE in store.regions:
+            print(f"✅ {metric}")
+            print(store.wide(metric))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
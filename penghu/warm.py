@@ -0,0 +1,140 @@
+"""
+預先渲染所有滑桿狀態的地圖 (warm-up)。
+
+    python -m penghu.warm                 # 全部頁面
+    python -m penghu.warm --pages benthic --radii 0,30 --workers 2
+
+結果存在 .cache/maps (見 penghu/mapstore.py)，已經存在且未過期的項目會跳過，
+中斷後重跑會從上次停下的地方繼續。
+伺服器內由頁面第一次顯示時呼叫 start() 在背景執行 (PENGHU_WARM=0 可關閉)：與使用者的地圖
+在同一個程序、同一個 GEE 請求排程 (penghu/scheduler.py) 排隊，全部以 WARM 優先順序讓路。
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from penghu import mapstore, scheduler, session
+from penghu.config import SMOOTHING_RADII, env_flag
+
+BENTHIC_YEARS = range(2016, 2026)
+BENTHIC_PERIODS = ["夏季平均", "全年平均"]
+BENTHIC_RADII = SMOOTHING_RADII
+CRISIS_YEARS = range(2018, 2026)
+SST_TYPES = ["全年平均", "夏季均溫"]
+
+
+def job_keys(pages=("benthic", "crisis"), radii=BENTHIC_RADII):
+    """所有滑桿狀態的快取 key (與頁面組件相同，不含 GEE 可用旗標)"""
+    keys = []
+    if "benthic" in pages:
+        for year in BENTHIC_YEARS:
+            for period in BENTHIC_PERIODS:
+                for radius in radii:
+                    keys.append(("benthic", year, period, radius))
+    if "crisis" in pages:
+        for year in CRISIS_YEARS:
+            for sst_type in SST_TYPES:
+                keys.append(("sst", year, sst_type))
+            keys.append(("ndci", year))
+        keys.append(("starfish",))
+    return keys
+
+
+def build_jobs(pages, radii):
+    """回傳 [(key, render 函式)]，key 與頁面組件使用的快取 key 相同 (再加上 GEE 可用旗標 True)"""
+    from penghu import maps
+
+    renders = {
+        "benthic": lambda key: lambda tiles: maps.benthic_map_html(*key[1:], tiles),
+        "sst": lambda key: lambda tiles: maps.sst_map_html(*key[1:], tiles),
+        "ndci": lambda key: lambda tiles: maps.ndci_map_html(*key[1:], tiles),
+        "starfish": lambda key: lambda tiles: maps.starfish_map_html(tiles),
+    }
+    return [(key, renders[key[0]](key)) for key in job_keys(pages, radii)]
+
+
+def warm(pages=("benthic", "crisis"), radii=BENTHIC_RADII, workers=4, force=False, root=mapstore.MAPS_DIR):
+    from penghu.htmlcache import is_map_document
+
+    jobs = [(tuple(key) + (True,), render) for key, render in build_jobs(pages, radii)]
+    manifest = mapstore.read_manifest(root)
+    todo = [(key, render) for key, render in jobs
+            if force or not mapstore.is_fresh(manifest.get(mapstore.key_name(key)), root)]
+    print(f"🔥 預先渲染：共 {len(jobs)} 張地圖，{len(jobs) - len(todo)} 張仍有效已跳過，需渲染 {len(todo)} 張")
+
+    done = 0
+    failed = 0
+
+    def run(key, render):
+        tiles = {}
+        start = time.time()
+        # 執行緒池的執行緒不會繼承呼叫端的 context，在這裡設定優先順序
+        with scheduler.priority(scheduler.WARM):
+            html = render(tiles)
+        seconds = time.time() - start
+        if not is_map_document(html):
+            raise RuntimeError(html[:200])
+        mapstore.save(key, html, tiles, seconds, root)
+        return seconds
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, key, render): key for key, render in todo}
+        for future in as_completed(futures):
+            key = futures[future]
+            label = " ".join(str(k) for k in key[:-1])
+            done += 1
+            try:
+                print(f"[{done}/{len(todo)}] ✅ {label} ({future.result():.1f}s)")
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(todo)}] ❌ {label}: {e}")
+    print(f"🔥 預先渲染完成：成功 {done - failed} 張，失敗 {failed} 張")
+    return failed
+
+
+AUTO_WARM = env_flag("PENGHU_WARM", True)
+# 伺服器內預先渲染使用的執行緒數 (使用者的地圖另有 htmlcache 的執行緒)
+SERVER_WORKERS = 2
+_started = threading.Event()
+
+
+def start(pages=("benthic", "crisis"), workers=SERVER_WORKERS):
+    """頁面使用：GEE 可用時在伺服器程序內背景預先渲染 (每個程序只跑一次)，立即返回"""
+    if not AUTO_WARM or _started.is_set():
+        return
+    _started.set()
+
+    def run():
+        if not (session.wait() and session.is_online()):
+            return
+        try:
+            warm(pages, BENTHIC_RADII, workers)
+        except Exception as e:
+            print(f"⚠️ 預先渲染失敗: {e}")
+
+    threading.Thread(target=run, name="penghu-warm", daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="預先渲染澎湖珊瑚礁儀表板的所有地圖狀態")
+    parser.add_argument("--pages", default="benthic,crisis", help="要渲染的頁面 (benthic,crisis)")
+    parser.add_argument("--radii", default=",".join(str(r) for r in BENTHIC_RADII), help="平滑半徑 (m)，以逗號分隔")
+    parser.add_argument("--workers", type=int, default=4, help="同時進行的 GEE 請求數")
+    parser.add_argument("--force", action="store_true", help="忽略有效期限，全部重新渲染")
+    args = parser.parse_args(argv)
+
+    from penghu import gee
+
+    if not gee.initialize():
+        print("❌ GEE 無法連線，略過預先渲染")
+        return 1
+    scheduler.set_default_priority(scheduler.WARM)
+    pages = [p.strip() for p in args.pages.split(",") if p.strip()]
+    radii = [int(r) for r in args.radii.split(",") if r.strip()]
+    return 1 if warm(pages, radii, args.workers, args.force) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+研究範圍與各警戒區的向量圖層 (取代散在各處的經緯度數字)。
+
+    python -m penghu.zones [--export data/zones.parquet]
+
+幾何只定義在 data/zones.geojson 一個檔案 (可用 PENGHU_ZONES_PATH 改成 GeoParquet / GeoPackage)：
+  - kind = roi：研究範圍 (GEE 的 ROI、首頁的範圍框、全區統計)
+  - kind = alert：棘冠海星警戒區 (海星地圖、分區統計、各島趨勢圖)
+讀進來之後建立空間索引 (STRtree)，分區統計只處理與分類圖相交的分區；
+給地圖的 GeoJSON 依縮放等級先簡化好並寫進 public/zones/ (由 Solara 的 /static/public 提供)，
+瀏覽器依目前的縮放等級取用，新增監測點不會增加每次 render 的成本。
+"""
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import threading
+
+from penghu.config import ROOT_DIR
+from penghu.render import PUBLIC_DIR, STATIC_URL
+
+ZONES_PATH = pathlib.Path(os.environ.get("PENGHU_ZONES_PATH", ROOT_DIR / "data" / "zones.geojson"))
+VECTOR_DIR = PUBLIC_DIR / "zones"
+ROI_KIND = "roi"
+ALERT_KIND = "alert"
+# 預先簡化的縮放等級範圍；超出範圍時用最接近的等級
+MIN_ZOOM, MAX_ZOOM = 8, 16
+# 地圖上的外框樣式 (Leaflet path options)
+STYLES = {
+    ROI_KIND: {'color': '#FF0000', 'weight': 3, 'opacity': 0.8, 'fill': False},
+    ALERT_KIND: {'color': '#FF0000', 'weight': 3, 'fill': False},
+}
+
+_lock = threading.Lock()
+_memo = {}
+_versions = {}
+
+
+# ==========================================
+# 1. 讀取 (檔案修改後自動重讀)
+# ==========================================
+def load():
+    """GeoDataFrame (EPSG:4326)：name、kind、geometry，順序同檔案"""
+    import geopandas as gpd
+
+    stamp = ZONES_PATH.stat().st_mtime_ns
+    with _lock:
+        if _memo.get("stamp") != stamp:
+            if ZONES_PATH.suffix == ".parquet":
+                gdf = gpd.read_parquet(ZONES_PATH)
+            else:
+                gdf = gpd.read_file(ZONES_PATH)
+            gdf = gdf.to_crs("EPSG:4326") if gdf.crs else gdf.set_crs("EPSG:4326")
+            _memo.clear()
+            _memo.update(stamp=stamp, frame=gdf[["name", "kind", "geometry"]].reset_index(drop=True))
+        return _memo["frame"]
+
+
+def version():
+    """幾何定義的版本 (檔案內容雜湊)；分區統計與 GeoJSON 檔名都以此判斷是否過期 (不必載入 geopandas)"""
+    stamp = ZONES_PATH.stat().st_mtime_ns
+    with _lock:
+        if _versions.get("stamp") != stamp:
+            _versions.update(stamp=stamp, version=hashlib.sha1(ZONES_PATH.read_bytes()).hexdigest()[:8])
+        return _versions["version"]
+
+
+def frame(kind=ALERT_KIND):
+    """單一種類的分區 (空間索引建在這個子集上，第一次查詢時建立後沿用)"""
+    gdf = load()
+    with _lock:
+        key = ("frame", kind)
+        if key not in _memo:
+            _memo[key] = gdf[gdf["kind"] == kind].reset_index(drop=True)
+        return _memo[key]
+
+
+def names(kind=ALERT_KIND):
+    return list(frame(kind)["name"])
+
+
+def bounds(kind=ROI_KIND):
+    """[west, south, east, north]"""
+    return [float(v) for v in frame(kind).total_bounds]
+
+
+def query(box, kind=ALERT_KIND):
+    """與 [west, south, east, north] 相交的分區 (以空間索引篩選)；index 為在 names(kind) 中的位置"""
+    from shapely.geometry import box as make_box
+
+    gdf = frame(kind)
+    hits = gdf.sindex.query(make_box(*box), predicate="intersects")
+    return gdf.iloc[sorted(hits)]
+
+
+# ==========================================
+# 2. 給統計與 GEE 使用
+# ==========================================
+def shapes(crs, box=None, kind=ALERT_KIND):
+    """[(幾何 (crs 座標), 分區編號 1..n), ...]；給 box (EPSG:4326) 時只回傳相交的分區"""
+    from rasterio.warp import transform_geom
+
+    gdf = frame(kind) if box is None else query(box, kind)
+    return [(transform_geom("EPSG:4326", crs, geom.__geo_interface__), int(i) + 1)
+            for i, geom in zip(gdf.index, gdf.geometry)]
+
+
+def ee_geometry(kind=ROI_KIND):
+    """研究範圍的 ee.Geometry (矩形範圍時維持 ee.Geometry.Rectangle，與原本的 ROI 相同)"""
+    import ee
+
+    gdf = frame(kind)
+    geom = gdf.geometry.union_all()
+    if geom.equals(geom.envelope):
+        return ee.Geometry.Rectangle(bounds(kind))
+    return ee.Geometry(geom.__geo_interface__)
+
+
+def ee_collection(kinds=(ALERT_KIND,), property_name="name"):
+    """ee.FeatureCollection，分區名稱放在 property_name (邊維持直線，與 ee.Geometry.Rectangle 相同)"""
+    import ee
+
+    features = []
+    for kind in kinds:
+        gdf = frame(kind)
+        for name, geom in zip(gdf["name"], gdf.geometry):
+            features.append(ee.Feature(ee.Geometry(geom.__geo_interface__, None, False), {property_name: name}))
+    return ee.FeatureCollection(features)
+
+
+# ==========================================
+# 3. 給地圖的 GeoJSON (依縮放等級預先簡化)
+# ==========================================
+def tolerance(zoom):
+    """約半個像素 (度)：zoom 0 時一個圖磚像素約 0.0055 度"""
+    return 360 / 256 / 2 ** zoom / 2
+
+
+def geojson(kind=ALERT_KIND, zoom=MAX_ZOOM):
+    """簡化後的 GeoJSON (dict)，同一版本同一縮放等級只算一次"""
+    zoom = min(max(int(zoom), MIN_ZOOM), MAX_ZOOM)
+    key = ("geojson", kind, zoom)
+    gdf = frame(kind)
+    with _lock:
+        if key not in _memo:
+            simple = gdf.copy()
+            simple["geometry"] = gdf.geometry.simplify(tolerance(zoom), preserve_topology=True)
+            _memo[key] = json.loads(simple.to_json(drop_id=True))
+        return _memo[key]
+
+
+def geojson_url(kind=ALERT_KIND):
+    """
+    各縮放等級的 GeoJSON 檔網址樣板 (含 {z})，檔案不存在時先寫好 MIN_ZOOM..MAX_ZOOM 全部等級。
+    檔名含版本，幾何改變時自動換新網址 (瀏覽器不會用到舊的快取)。
+    """
+    name = f"{kind}_{version()}"
+    if not (VECTOR_DIR / f"{name}_z{MAX_ZOOM}.geojson").exists():
+        VECTOR_DIR.mkdir(parents=True, exist_ok=True)
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            path = VECTOR_DIR / f"{name}_z{zoom}.geojson"
+            tmp_path = path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(geojson(kind, zoom), ensure_ascii=False), encoding='utf-8')
+            tmp_path.replace(path)
+    return f"{STATIC_URL}/zones/{name}_z{{z}}.geojson"
+
+
+def vector_layer(kind=ALERT_KIND):
+    """render.leaflet_html 的 vectors 項目"""
+    return geojson_url(kind), STYLES[kind], (MIN_ZOOM, MAX_ZOOM)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="檢查分區圖層並預先產生各縮放等級的 GeoJSON")
+    parser.add_argument("--export", type=pathlib.Path, help="另存成 GeoParquet (.parquet) 或 GeoPackage (.gpkg)")
+    args = parser.parse_args(argv)
+
+    gdf = load()
+    print(gdf.drop(columns="geometry").assign(bounds=[list(g.bounds) for g in gdf.geometry]))
+    if args.export:
+        if args.export.suffix == ".parquet":
+            gdf.to_parquet(args.export)
+        else:
+            gdf.to_file(args.export)
+        print(f"💾 {args.export}")
+    for kind in sorted(set(gdf["kind"])):
+        print(f"✅ {kind}: {geojson_url(kind)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
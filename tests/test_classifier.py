@@ -0,0 +1,79 @@
+"""penghu/classifier.py：訓練樣本資產的匯出紀錄 (不連 GEE，以 mock 代替 ee.data 的回應)"""
+import json
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+import ee
+
+from penghu import classifier
+
+KEY = classifier.classifier_key("COPERNICUS/S2_SR_HARMONIZED")
+
+
+class ExportTrainingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patch = mock.patch.object(classifier, "TRAINING_DIR", pathlib.Path(self.tmp.name))
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.task = mock.Mock(id="NEW_TASK")
+        patches = [mock.patch.object(ee.data, "createAsset"),
+                   mock.patch.object(ee.batch.Export.table, "toAsset", return_value=self.task)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def write_record(self, task_id):
+        classifier._task_path(KEY).write_text(json.dumps({'key': KEY, 'task': task_id}), encoding='utf-8')
+
+    def record(self):
+        return json.loads(classifier._task_path(KEY).read_text(encoding='utf-8'))['task']
+
+    def export(self, state):
+        with mock.patch.object(ee.data, "getTaskStatus", return_value=[{'state': state}]):
+            classifier._export_training(KEY, sample=None)
+
+    def test_first_export_writes_record(self):
+        classifier._export_training(KEY, sample=None)
+        self.task.start.assert_called_once()
+        self.assertEqual(self.record(), "NEW_TASK")
+
+    def test_running_task_is_not_resubmitted(self):
+        self.write_record("OLD_TASK")
+        self.export('RUNNING')
+        self.task.start.assert_not_called()
+        self.assertEqual(self.record(), "OLD_TASK")
+
+    def test_failed_task_is_resubmitted(self):
+        self.write_record("OLD_TASK")
+        self.export('FAILED')
+        self.task.start.assert_called_once()
+        self.assertEqual(self.record(), "NEW_TASK")
+
+    def test_completed_task_with_missing_asset_is_resubmitted(self):
+        """匯出完成後資產被刪除或改名：刪掉舊紀錄重新匯出，不會每次啟動都改用雲端樣本"""
+        self.write_record("OLD_TASK")
+        self.export('COMPLETED')
+        self.task.start.assert_called_once()
+        self.assertEqual(self.record(), "NEW_TASK")
+
+
+class LoadTrainingTest(unittest.TestCase):
+    def test_missing_asset(self):
+        error = ee.EEException("Asset 'projects/x/assets/samples' not found.")
+        with mock.patch.object(ee.data, "getAsset", side_effect=error):
+            self.assertIsNone(classifier._load_training(KEY))
+
+    def test_other_errors_are_raised(self):
+        """權限或連線錯誤時不確定資產是否存在，交給呼叫端 (不重新匯出)"""
+        error = ee.EEException("Permission denied.")
+        with mock.patch.object(ee.data, "getAsset", side_effect=error):
+            with self.assertRaises(ee.EEException):
+                classifier._load_training(KEY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""penghu/dem.py：點表轉網格、多解析度金字塔與 view() 的層級選擇"""
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from penghu import dem
+
+
+def write_csv(path, nx, ny):
+    """nx * ny 個點的 x, y, VALUE 點表 (z = x + 10 * y)"""
+    xs, ys = np.meshgrid(np.arange(nx, dtype='float64'), np.arange(ny, dtype='float64'))
+    rows = "\n".join(f"{x},{y},{x + 10 * y}" for x, y in zip(xs.ravel(), ys.ravel()))
+    path.write_text(f"x,y,VALUE\n{rows}\n", encoding='utf-8')
+
+
+class PyramidTest(unittest.TestCase):
+    def test_block_mean_keeps_partial_block(self):
+        values = np.arange(5, dtype='float64')
+        np.testing.assert_allclose(dem.block_mean(values, 2, 0), [0.5, 2.5, 4.0])
+
+    def test_levels_halve_until_min_size(self):
+        x, y = np.arange(300.0), np.arange(130.0)
+        z = np.add.outer(y, x).astype('float32')
+        levels = dem.build_pyramid(x, y, z)
+        self.assertEqual(sorted(levels), [2])
+        lx, ly, lz = levels[2]
+        self.assertEqual(lz.shape, (65, 150))
+        self.assertEqual((len(ly), len(lx)), lz.shape)
+        # 區塊平均：左上角 2x2 的平均
+        self.assertAlmostEqual(float(lz[0, 0]), float(z[:2, :2].mean()))
+        self.assertEqual(lz.dtype, np.float32)
+
+    def test_view_picks_finest_level_within_budget(self):
+        x, y = np.arange(512.0), np.arange(512.0)
+        z = np.zeros((512, 512), dtype='float32')
+        grid = dem.DEM(x, y, z, key="test", levels={1: (x, y, z), **dem.build_pyramid(x, y, z)})
+        self.assertEqual(sorted(grid.levels), [1, 2, 4, 8])
+
+        _, _, vz, factor = grid.view(max_vertices=20_000)
+        self.assertEqual(factor, 4)
+        self.assertLessEqual(vz.size, 20_000)
+        # 裁切範圍夠小時用原始解析度
+        vx, vy, vz, factor = grid.view(max_vertices=20_000, bbox=[10, 10, 100, 100])
+        self.assertEqual(factor, 1)
+        self.assertEqual((vx[0], vx[-1], vy[0], vy[-1]), (10, 100, 10, 100))
+        # 預算再小也回傳最粗的一層
+        self.assertEqual(grid.view(max_vertices=1)[3], 8)
+
+    def test_grid_from_points_fills_holes_with_minimum(self):
+        xs, ys, grid = dem.grid_from_points(np.array([0, 1, 0.0]), np.array([0, 0, 1.0]),
+                                            np.array([5, 3, 7], dtype='float32'))
+        np.testing.assert_array_equal(xs, [0, 1])
+        np.testing.assert_array_equal(ys, [0, 1])
+        np.testing.assert_array_equal(grid, [[5, 3], [7, 3]])
+
+
+class IngestTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        root = pathlib.Path(self.tmp.name)
+        patches = [mock.patch.object(dem, "DEM_DIR", root / "dem"), mock.patch.object(dem, "_loaded", {})]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.source = str(root / "penghuDTM.csv")
+
+    def test_load_memory_maps_all_levels(self):
+        write_csv(pathlib.Path(self.source), 140, 130)
+        grid = dem.load(self.source)
+        self.assertEqual(grid.shape, (130, 140))
+        self.assertEqual(sorted(grid.levels), [1, 2])
+        self.assertIsInstance(grid.z, np.memmap)
+        self.assertEqual(grid.levels[2][2].shape, (65, 70))
+        self.assertEqual(float(grid.z[3, 4]), 4 + 10 * 3)
+        # 同一來源只轉檔一次
+        self.assertIs(dem.load(self.source), grid)
+        self.assertEqual(dem.ingest(self.source), grid.key)
+
+    def test_rebuilds_missing_pyramid(self):
+        """舊版轉檔沒有 z_*.npy 時，load() 補建金字塔"""
+        write_csv(pathlib.Path(self.source), 140, 130)
+        folder = dem.DEM_DIR / dem.ingest(self.source)
+        for path in folder.glob("*_*.npy"):
+            path.unlink()
+        self.assertEqual(sorted(dem.load(self.source).levels), [1, 2])
+
+    def test_bad_columns(self):
+        pathlib.Path(self.source).write_text("lon,lat,depth\n0,0,1\n", encoding='utf-8')
+        with self.assertRaises(ValueError):
+            dem.ingest(self.source)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""penghu/htmlcache.py：地圖 HTML 快取 (LRU、單一運算) 與背景產生的請求上限"""
+import threading
+import time
+import unittest
+from unittest import mock
+
+from penghu import htmlcache
+from penghu.htmlcache import MapCache, QueueFull
+
+PAGE = "<!DOCTYPE html><html>" + "地圖" * 100 + "</html>"
+
+
+class MapCacheTest(unittest.TestCase):
+    def test_lru_eviction_by_bytes(self):
+        cache = MapCache(max_bytes=25)
+        cache.put("a", "x" * 10)
+        cache.put("b", "x" * 10)
+        cache.get("a")
+        cache.put("c", "x" * 10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "x" * 10)
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["bytes"], 20)
+
+    def test_oversized_value_is_not_stored(self):
+        cache = MapCache(max_bytes=5)
+        cache.put("a", "x" * 10)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_ttl_expires_entries(self):
+        cache = MapCache(max_bytes=1024, ttl=60)
+        cache.put("a", "value")
+        with mock.patch.object(htmlcache.time, "time", return_value=time.time() + 61):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_compressed_round_trip(self):
+        cache = MapCache(max_bytes=1024 * 1024, compress=True)
+        cache.put("a", PAGE)
+        self.assertEqual(cache.get("a"), PAGE)
+        self.assertLess(cache.stats()["bytes"], len(PAGE.encode('utf-8')))
+
+    def test_error_pages_are_not_cached(self):
+        cache = MapCache(max_bytes=1024)
+        self.assertEqual(cache.get_or_compute("a", lambda: "<div>錯誤</div>"), "<div>錯誤</div>")
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_concurrent_requests_compute_once(self):
+        cache = MapCache(max_bytes=1024 * 1024)
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return PAGE
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("a", compute)))
+                   for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for t in threads[1:]:
+            t.start()
+        while cache.stats()["coalesced"] < 4:
+            time.sleep(0.001)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [PAGE] * 5)
+        stats = cache.stats()
+        self.assertEqual((stats["misses"], stats["coalesced"], stats["inflight"]), (1, 4, 0))
+
+    def test_failed_compute_is_retried(self):
+        cache = MapCache(max_bytes=1024)
+
+        def broken():
+            raise RuntimeError("GEE 錯誤")
+
+        with self.assertRaises(RuntimeError):
+            cache.get_or_compute("a", broken)
+        self.assertEqual(cache.get_or_compute("a", lambda: PAGE), PAGE)
+
+
+class SubmitTest(unittest.TestCase):
+    def test_queue_limit_and_pending_counter(self):
+        release = threading.Event()
+
+        def fetch(key, compute):
+            release.wait()
+            return compute()
+
+        with mock.patch.object(htmlcache, "MAP_QUEUE", 1):
+            limit = htmlcache.MAP_WORKERS + htmlcache.MAP_QUEUE
+            futures = [htmlcache.submit(fetch, ("test", i), lambda: PAGE) for i in range(limit)]
+            self.assertEqual(htmlcache.pending(), limit)
+            with self.assertRaises(QueueFull):
+                htmlcache.submit(fetch, ("test", "extra"), lambda: PAGE)
+            self.assertIsNone(htmlcache.prefetch(("test", "extra"), lambda: PAGE, fetch=fetch))
+            self.assertIsNone(htmlcache.prefetch(("test", "idle"), lambda: PAGE, fetch=fetch, idle_only=True))
+            release.set()
+            self.assertEqual([f.result(timeout=10) for f in futures], [PAGE] * limit)
+
+        deadline = time.time() + 10
+        while htmlcache.pending() and time.time() < deadline:
+            time.sleep(0.001)
+        self.assertEqual(htmlcache.pending(), 0)
+
+    def test_cancelled_request_releases_its_slot(self):
+        release = threading.Event()
+
+        def fetch(key, compute):
+            release.wait()
+            return compute()
+
+        running = [htmlcache.submit(fetch, ("test", i), lambda: PAGE) for i in range(htmlcache.MAP_WORKERS)]
+        queued = htmlcache.submit(fetch, ("test", "queued"), lambda: PAGE)
+        self.assertTrue(queued.cancel())
+        self.assertEqual(htmlcache.pending(), htmlcache.MAP_WORKERS)
+        release.set()
+        for future in running:
+            future.result(timeout=10)
+        deadline = time.time() + 10
+        while htmlcache.pending() and time.time() < deadline:
+            time.sleep(0.001)
+        self.assertEqual(htmlcache.pending(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
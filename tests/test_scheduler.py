@@ -0,0 +1,135 @@
+"""
+penghu/scheduler.py 的排程檢查 (以本機 FakeService 代替 GEE，不必連網)。
+
+    python -m unittest discover
+"""
+import threading
+import time
+import unittest
+
+from penghu import scheduler
+from penghu.scheduler import INTERACTIVE, WARM, FakeService, QuotaExceeded, Scheduler
+
+
+def no_sleep(_):
+    pass
+
+
+class FakeServiceTest(unittest.TestCase):
+    """同 python -m penghu.scheduler 的自我檢查：超過服務上限的請求重試後全部完成"""
+
+    def test_all_requests_complete(self):
+        service = FakeService(limit=4)
+        sched = Scheduler(max_inflight=6, base_delay=0.01, max_delay=0.1)
+
+        def worker(i):
+            with scheduler.priority(WARM if i % 2 else INTERACTIVE):
+                sched.call(service.request, f"r{i}", name=f"r{i}")
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(60)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stats = sched.stats()
+        self.assertEqual(stats["failures"], 0)
+        self.assertEqual(len(service.completed), 60)
+        self.assertEqual(stats["requests"], 60)
+        self.assertLessEqual(stats["peak_inflight"], 6)
+        self.assertEqual(stats["inflight"], 0)
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_interactive_before_warm(self):
+        """佔住唯一的位置時，後排隊的 INTERACTIVE 比先排隊的 WARM 先執行"""
+        sched = Scheduler(max_inflight=1, sleep=no_sleep)
+        release = threading.Event()
+        order = []
+
+        holder = threading.Thread(target=sched.call, args=(release.wait,))
+        holder.start()
+        while sched.stats()["inflight"] == 0:
+            time.sleep(0.001)
+
+        def queue(level, name):
+            thread = threading.Thread(target=sched.call, args=(order.append, name), kwargs={"priority": level})
+            thread.start()
+            while sched.stats()["queued"][scheduler.PRIORITY_NAMES[level]] == 0:
+                time.sleep(0.001)
+            return thread
+
+        threads = [queue(WARM, "warm"), queue(INTERACTIVE, "interactive")]
+        release.set()
+        for t in [holder] + threads:
+            t.join()
+        self.assertEqual(order, ["interactive", "warm"])
+
+    def test_quota_error_retries_and_halves_limit(self):
+        sched = Scheduler(max_inflight=8, sleep=no_sleep)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise QuotaExceeded("Too many concurrent aggregations.")
+            return "ok"
+
+        self.assertEqual(sched.call(flaky), "ok")
+        stats = sched.stats()
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["quota_errors"], 2)
+        self.assertEqual(stats["limit"], 2)
+        self.assertEqual(stats["failures"], 0)
+
+    def test_limit_recovers_after_successes(self):
+        sched = Scheduler(max_inflight=4, sleep=no_sleep)
+        sched.limit = 2
+        for _ in range(2):
+            sched.call(lambda: None)
+        self.assertEqual(sched.limit, 3)
+
+    def test_quota_error_gives_up_after_retries(self):
+        sched = Scheduler(max_inflight=2, retries=2, sleep=no_sleep)
+
+        def always():
+            raise QuotaExceeded("429 Too Many Requests")
+
+        with self.assertRaises(QuotaExceeded):
+            sched.call(always)
+        stats = sched.stats()
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["failures"], 1)
+        self.assertEqual(stats["inflight"], 0)
+
+    def test_other_errors_are_not_retried(self):
+        sched = Scheduler(sleep=no_sleep)
+        attempts = []
+
+        def broken():
+            attempts.append(1)
+            raise ValueError("bad request")
+
+        with self.assertRaises(ValueError):
+            sched.call(broken)
+        self.assertEqual(len(attempts), 1)
+        self.assertEqual(sched.stats()["retries"], 0)
+
+    def test_nested_call_runs_inline(self):
+        """已經在排程內的執行緒再呼叫 call 不會等自己的位置"""
+        sched = Scheduler(max_inflight=1, sleep=no_sleep)
+        self.assertEqual(sched.call(lambda: sched.call(lambda: "inner")), "inner")
+
+    def test_backoff_is_bounded(self):
+        sched = Scheduler(base_delay=1, max_delay=4)
+        for attempt in range(8):
+            self.assertLessEqual(sched.backoff(attempt), min(4, 2 ** attempt))
+
+    def test_is_quota_error(self):
+        self.assertTrue(scheduler.is_quota_error(QuotaExceeded("Too many concurrent aggregations.")))
+        self.assertFalse(scheduler.is_quota_error(ValueError("Image.load: asset not found")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""penghu/stats.py：分類圖的分區統計 (全區只算研究範圍內的像素)"""
+import pathlib
+import tempfile
+import unittest
+
+import numpy as np
+
+from penghu import stats, zones
+
+
+def write_classes(path, classes, west, north, step):
+    import rasterio
+    from rasterio.transform import from_origin
+
+    with rasterio.open(path, "w", driver="GTiff", height=classes.shape[0], width=classes.shape[1], count=1,
+                       dtype='uint8', crs="EPSG:4326", transform=from_origin(west, north, step, step)) as dst:
+        dst.write(classes, 1)
+
+
+class ComputeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = pathlib.Path(self.tmp.name) / "benthic.tif"
+
+    def test_total_is_clipped_to_roi(self):
+        """分類圖的網格超出研究範圍時，超出的像素不算進全區 (同 GEE 匯出的數值)"""
+        west, south, east, north = zones.bounds()
+        step = 0.01
+        # 左邊 10 欄在研究範圍外，右邊 10 欄在範圍內；最後一列是 nodata
+        classes = np.ones((6, 20), dtype='uint8')
+        classes[-1] = 255
+        write_classes(self.path, classes, west - 10 * step, south + 0.2, step)
+
+        df = stats.compute(2024, "夏季平均", 30, self.path)
+        total = df[df["zone"] == stats.TOTAL_ZONE].set_index("class")
+        self.assertEqual(total.loc[1, "pixels"], 5 * 10)
+        self.assertEqual(total["pixels"].sum(), 5 * 10)
+        self.assertTrue((df["zones_version"] == stats.zones_version()).all())
+        self.assertEqual(set(df["zone"]), {stats.TOTAL_ZONE, *zones.names()})
+
+    def test_zone_rows(self):
+        """警戒區的列與全區在同一次掃描中算出"""
+        step = 0.001
+        # 七美嶼的範圍內
+        classes = np.full((10, 10), 5, dtype='uint8')
+        write_classes(self.path, classes, 119.41, 23.21, step)
+
+        pixels, area = stats.zone_histogram(self.path)
+        self.assertEqual(pixels.shape, (len(zones.names()) + 2, len(stats.CLASS_LABELS)))
+        zone = zones.names().index("七美嶼") + 1
+        self.assertEqual(pixels[zone, 5], 100)
+        self.assertEqual(pixels[-1, 5], 100)
+        self.assertAlmostEqual(area[zone, 5], area[-1, 5])
+        self.assertGreater(area[-1, 5], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""penghu/timeseries.py：SeriesStore 的查詢 / 合併，以及 load() 依季節、半徑與檔案更新重建"""
+import os
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from penghu import series, stats, timeseries
+from penghu.timeseries import ALL_CLASS, TOTAL_ZONE, SeriesStore
+
+YEARS = [2018, 2019, 2020]
+
+
+class SeriesStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = SeriesStore.from_series(YEARS, {
+            ("area_ha", TOTAL_ZONE, "沙地"): [1, 2, 3],
+            ("area_ha", TOTAL_ZONE, "岩石"): [4, 5, 6],
+            ("sst", TOTAL_ZONE, ALL_CLASS): [28.1, 28.2, 28.3],
+        })
+
+    def test_series_is_read_only_view(self):
+        values = self.store.series("area_ha", class_="岩石")
+        np.testing.assert_array_equal(values, [4, 5, 6])
+        self.assertTrue(np.shares_memory(values, self.store.values))
+        with self.assertRaises(ValueError):
+            values[0] = 0
+        with self.assertRaises(KeyError):
+            self.store.series("ndci")
+
+    def test_wide_and_long_are_built_once(self):
+        wide = self.store.wide("area_ha")
+        self.assertEqual(list(wide.columns), ["沙地", "岩石"])
+        self.assertTrue(np.shares_memory(wide.to_numpy(), self.store.values))
+        self.assertIs(self.store.wide("area_ha"), wide)
+
+        long = self.store.long("area_ha", value_name="Area (ha)")
+        self.assertIs(self.store.long("area_ha", value_name="Area (ha)"), long)
+        self.assertEqual(len(long), 6)
+        row = long[(long["Year"] == 2019) & (long["Habitat"] == "岩石")]
+        self.assertEqual(row["Area (ha)"].item(), 5)
+
+    def test_table(self):
+        table = self.store.table({"SST": ("sst",), "Sand": ("area_ha", TOTAL_ZONE, "沙地")})
+        self.assertEqual(list(table.index), YEARS)
+        self.assertEqual(table.loc[2020, "Sand"], 3)
+
+    def test_fill_uses_complete_series_only(self):
+        computed = SeriesStore.from_series(YEARS, {
+            ("area_ha", TOTAL_ZONE, "沙地"): [10, 20, 30],
+            ("area_ha", TOTAL_ZONE, "岩石"): [40, np.nan, 60],
+            ("area_ha", "七美嶼", "沙地"): [7, np.nan, 9],
+        })
+        filled = computed.fill(self.store)
+        np.testing.assert_array_equal(filled.series("area_ha", class_="沙地"), [10, 20, 30])
+        # 年份不齊的序列整條改用 fallback
+        np.testing.assert_array_equal(filled.series("area_ha", class_="岩石"), [4, 5, 6])
+        # 只有計算結果有的序列保留，缺的年份為 NaN
+        self.assertEqual(filled.regions_with("area_ha", "沙地"), [TOTAL_ZONE])
+        self.assertTrue(np.isnan(filled.series("area_ha", "七美嶼", "沙地")[1]))
+
+    def test_from_long_last_row_wins(self):
+        df = pd.DataFrame({"metric": ["sst", "sst", "sst"], "region": TOTAL_ZONE, "class": ALL_CLASS,
+                           "year": [2018, 2018, 2021], "value": [1.0, 2.0, 3.0]})
+        store = SeriesStore.from_long(df, YEARS)
+        np.testing.assert_array_equal(store.series("sst")[:1], [2.0])
+        self.assertFalse(store.covers("sst"))
+
+    def test_shape_mismatch(self):
+        with self.assertRaises(ValueError):
+            SeriesStore(YEARS, [TOTAL_ZONE], [ALL_CLASS], ["sst"], values=np.zeros((1, 1, 1, 2)))
+
+
+class LoadTest(unittest.TestCase):
+    """load() 只讀 Parquet：依 (季節, 半徑) 篩選，檔案更新後才重建"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        root = pathlib.Path(self.tmp.name)
+        patches = [mock.patch.object(stats, "STATS_PATH", root / "stats.parquet"),
+                   mock.patch.object(series, "SERIES_PATH", root / "series.parquet"),
+                   mock.patch.object(timeseries, "_memo", {})]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def write_stats(self, area_m2):
+        rows = [{"year": year, "period": period, "radius": radius, "zone": TOTAL_ZONE, "class": 15,
+                 "label": "珊瑚/藻類", "pixels": 1, "area_m2": area_m2 * scale, "zones_version": stats.zones_version()}
+                for year in YEARS for period, scale in (("夏季平均", 1), ("全年平均", 2)) for radius in (0, 30)]
+        stats._save(pd.DataFrame(rows, columns=stats.COLUMNS))
+
+    def test_filters_by_period_and_radius(self):
+        self.write_stats(10000)
+        summer = timeseries.load(YEARS, "夏季平均", 30)
+        annual = timeseries.load(YEARS, "全年平均", 30)
+        np.testing.assert_array_equal(summer.series("area_ha", class_="珊瑚/藻類"), [1, 1, 1])
+        np.testing.assert_array_equal(annual.series("area_ha", class_="珊瑚/藻類"), [2, 2, 2])
+        self.assertNotIn("area_ha", timeseries.load(YEARS, "夏季平均", 50).metrics)
+
+    def test_rebuilds_after_file_changes(self):
+        self.write_stats(10000)
+        first = timeseries.load(YEARS)
+        self.assertIs(timeseries.load(YEARS), first)
+        self.write_stats(20000)
+        # 確保修改時間不同 (部分檔案系統的時間解析度較粗)
+        stamp = stats.STATS_PATH.stat().st_mtime_ns + 10 ** 9
+        os.utime(stats.STATS_PATH, ns=(stamp, stamp))
+        second = timeseries.load(YEARS)
+        self.assertIsNot(second, first)
+        np.testing.assert_array_equal(second.series("area_ha", class_="珊瑚/藻類"), [2, 2, 2])
+
+    def test_missing_files_give_empty_store(self):
+        store = timeseries.load(YEARS)
+        self.assertEqual(store.metrics, ())
+        self.assertEqual(store.years.tolist(), YEARS)
+
+
+if __name__ == "__main__":
+    unittest.main()